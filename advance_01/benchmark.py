@@ -0,0 +1,269 @@
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from threading import Thread
+
+from lrucache import LRUCache, HeapLRUCache, ConcurrentLRUCache
+from priority_queue import PriorityQueue, IndexedPriorityQueue
+
+
+class Timer:
+    def __init__(self, description: str):
+        self._description = description
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter()
+        total_time = str(round(end - self._start, 5))
+        print(f"{self._description}: {total_time}")
+
+
+def generate_operations(n_ops, n_keys, read_ratio, seed=42):
+    rng = random.Random(seed)
+    return [
+        (rng.random() < read_ratio, rng.randrange(n_keys))
+        for _ in range(n_ops)
+    ]
+
+
+def replay(cache, operations):
+    for is_read, key in operations:
+        if is_read:
+            cache.get(key)
+        else:
+            cache.set(key, key)
+
+
+def compare_engines(args):
+    operations = generate_operations(args.N, 2 * args.limit, args.read_ratio)
+    for cls in [LRUCache, HeapLRUCache]:
+        msg = f"|Class: {cls.__name__}|"
+        print(f"{msg:=^100}")
+        cache = cls(args.limit)
+        with Timer(f"Total time for {args.N} operations"):
+            replay(cache, operations)
+        if isinstance(cache, HeapLRUCache):
+            pqueue = cache._priority_queue
+            print(f"Heap size: {len(pqueue._pqueue)}")
+            print(f"Stale entries: {pqueue.n_stale}")
+            print(f"Compactions: {pqueue.n_compactions}")
+        print(f"Cache size: {len(cache)}")
+
+
+def compare_thread_scaling(args):
+    operations = generate_operations(args.N, 2 * args.limit, args.read_ratio)
+    for n_shards in [1, args.shards]:
+        msg = f"|ConcurrentLRUCache, shards: {n_shards}|"
+        print(f"{msg:=^100}")
+        for n_threads in args.threads:
+            cache = ConcurrentLRUCache(args.limit, n_shards)
+            chunk_size = len(operations) // n_threads
+            workers = [
+                Thread(
+                    target=replay,
+                    args=(cache, operations[i * chunk_size:(i + 1) * chunk_size])
+                )
+                for i in range(n_threads)
+            ]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            total_time = time.perf_counter() - start
+            throughput = round(chunk_size * n_threads / total_time)
+            print(f"Threads: {n_threads}; throughput: {throughput} ops/s")
+
+
+def generate_zipf_trace(n_ops, n_keys, alpha, rng):
+    weights = [1 / (rank ** alpha) for rank in range(1, n_keys + 1)]
+    return rng.choices(range(n_keys), weights=weights, k=n_ops)
+
+
+def generate_scan_trace(n_ops, n_keys, alpha, scan_length, rng):
+    trace = []
+    next_scan_key = n_keys
+    while len(trace) < n_ops:
+        trace.extend(generate_zipf_trace(scan_length, n_keys, alpha, rng))
+        trace.extend(range(next_scan_key, next_scan_key + scan_length))
+        next_scan_key += scan_length
+    return trace[:n_ops]
+
+
+def hit_ratio(cache, trace):
+    hits = 0
+    for key in trace:
+        if cache.get(key) is None:
+            cache.set(key, key)
+        else:
+            hits += 1
+    return hits / len(trace)
+
+
+def compare_policies(args):
+    rng = random.Random(42)
+    traces = {
+        'zipf': generate_zipf_trace(args.N, args.keys, args.alpha, rng),
+        'scan': generate_scan_trace(
+            args.N, args.keys, args.alpha, args.scan_length, rng
+        ),
+    }
+    for trace_name, trace in traces.items():
+        msg = f"|Trace: {trace_name}|"
+        print(f"{msg:=^100}")
+        for policy in LRUCache.POLICIES:
+            cache = LRUCache(args.limit, policy=policy)
+            with Timer(f"Policy {policy}, total time"):
+                ratio = hit_ratio(cache, trace)
+            print(f"Policy {policy}, hit ratio: {round(ratio, 4)}")
+
+
+def measure_ns_per_op(func, keys):
+    start = time.perf_counter_ns()
+    for key in keys:
+        func(key)
+    return (time.perf_counter_ns() - start) / len(keys)
+
+
+def compare_logging(args):
+    rng = random.Random(42)
+    keys = [rng.randrange(2 * args.limit) for _ in range(args.N)]
+    logger = logging.getLogger('LRUCache')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler = logging.FileHandler(os.path.join(tmp_dir, 'cache.log'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            for trace in [True, False]:
+                msg = f"|Trace logging: {'on' if trace else 'off'}|"
+                print(f"{msg:=^100}")
+                cache = LRUCache(args.limit, trace=trace)
+                set_ns = measure_ns_per_op(lambda key: cache.set(key, key), keys)
+                get_ns = measure_ns_per_op(cache.get, keys)
+                print(f"set: {round(set_ns)} ns/op")
+                print(f"get: {round(get_ns)} ns/op")
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def compare_snapshot_restore(args):
+    cache = LRUCache(args.N)
+    cache.set_many({key: f'value_{key}' for key in range(args.N)})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'cache.snapshot')
+        with Timer(f"Snapshot of {args.N} keys"):
+            cache.snapshot(filename)
+        print(f"Snapshot size: {os.path.getsize(filename)} bytes")
+
+        restored = LRUCache(args.N)
+        with Timer(f"Restore of {args.N} keys"):
+            restored.restore(filename)
+
+    replayed = LRUCache(args.N)
+    with Timer(f"Replay of {args.N} set calls"):
+        for key, value in cache._storage.items():
+            replayed.set(key, value)
+    assert list(restored._storage) == list(cache._storage)
+
+
+def get_heap_size(pqueue):
+    if isinstance(pqueue, PriorityQueue):
+        return len(pqueue._pqueue)
+    return len(pqueue._heap)
+
+
+def compare_priority_queues(args):
+    rng = random.Random(42)
+    updates = [
+        (rng.randrange(args.values), rng.random()) for _ in range(args.N)
+    ]
+    for cls in [PriorityQueue, IndexedPriorityQueue]:
+        msg = f"|Class: {cls.__name__}|"
+        print(f"{msg:=^100}")
+        pqueue = cls()
+        max_heap_size = 0
+        with Timer(f"Total time for {args.N} priority updates"):
+            for value, priority in updates:
+                pqueue.insert(value, priority)
+                max_heap_size = max(max_heap_size, get_heap_size(pqueue))
+        print(f"Live items: {len(pqueue)}; max heap size: {max_heap_size}")
+        with Timer(f"Total time for pulling {len(pqueue)} items"):
+            while not pqueue.is_empty():
+                pqueue.pull()
+
+    items = [(value, rng.random()) for value in range(args.values)]
+    with Timer(f"Bulk construction of IndexedPriorityQueue from {args.values} items"):
+        IndexedPriorityQueue(items)
+    with Timer(f"Construction of PriorityQueue by {args.values} inserts"):
+        pqueue = PriorityQueue()
+        for value, priority in items:
+            pqueue.insert(value, priority)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='LRUCache benchmark')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    engines_parser = subparsers.add_parser(
+        'engines', help="compare LRUCache and HeapLRUCache"
+    )
+    engines_parser.add_argument("N", type=int, action="store")
+    engines_parser.add_argument("--limit", type=int, default=1000)
+    engines_parser.add_argument("--read-ratio", type=float, default=0.9)
+    engines_parser.set_defaults(func=compare_engines)
+
+    threads_parser = subparsers.add_parser(
+        'threads', help="ConcurrentLRUCache throughput against thread count"
+    )
+    threads_parser.add_argument("N", type=int, action="store")
+    threads_parser.add_argument("--limit", type=int, default=1000)
+    threads_parser.add_argument("--read-ratio", type=float, default=0.9)
+    threads_parser.add_argument("--shards", type=int, default=16)
+    threads_parser.add_argument(
+        "--threads", type=int, nargs='+', default=[1, 2, 4, 8]
+    )
+    threads_parser.set_defaults(func=compare_thread_scaling)
+
+    policies_parser = subparsers.add_parser(
+        'policies', help="hit ratio of eviction policies on replayed traces"
+    )
+    policies_parser.add_argument("N", type=int, action="store")
+    policies_parser.add_argument("--limit", type=int, default=1000)
+    policies_parser.add_argument("--keys", type=int, default=100_000)
+    policies_parser.add_argument("--alpha", type=float, default=0.9)
+    policies_parser.add_argument("--scan-length", type=int, default=5000)
+    policies_parser.set_defaults(func=compare_policies)
+
+    logging_parser = subparsers.add_parser(
+        'logging', help="get/set ns/op with trace logging on and off"
+    )
+    logging_parser.add_argument("N", type=int, action="store")
+    logging_parser.add_argument("--limit", type=int, default=1000)
+    logging_parser.set_defaults(func=compare_logging)
+
+    snapshot_parser = subparsers.add_parser(
+        'snapshot', help="snapshot/restore time against replaying inserts"
+    )
+    snapshot_parser.add_argument("N", type=int, action="store")
+    snapshot_parser.set_defaults(func=compare_snapshot_restore)
+
+    heap_parser = subparsers.add_parser(
+        'heap', help="compare lazy PriorityQueue and IndexedPriorityQueue"
+    )
+    heap_parser.add_argument("N", type=int, action="store")
+    heap_parser.add_argument("--values", type=int, default=10_000)
+    heap_parser.set_defaults(func=compare_priority_queues)
+    return parser
+
+
+if __name__ == "__main__":
+    logging.getLogger('LRUCache').setLevel(logging.ERROR)
+    parser = get_parser()
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,162 @@
+#  W-TinyLFU is described in the paper
+#  https://arxiv.org/abs/1512.00727
+
+from collections import OrderedDict
+
+
+class CountMinSketch:
+    MAX_COUNT = 15
+    HASH_MASK = 0xFFFFFFFFFFFFFFFF
+    SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+    )
+    HALVE_TABLE = bytes(i >> 1 for i in range(256))
+
+    def __init__(self, width: int, sample_factor: int = 10):
+        bits = max(1, (width - 1).bit_length())
+        self._width = 1 << bits
+        self._shift = 64 - bits
+        self._table = bytearray(len(CountMinSketch.SEEDS) * self._width)
+        self._sample_size = sample_factor * self._width
+        self._additions = 0
+
+    def _indexes(self, key):
+        key_hash = hash(key)
+        mask = CountMinSketch.HASH_MASK
+        shift = self._shift
+        width = self._width
+        seed_0, seed_1, seed_2, seed_3 = CountMinSketch.SEEDS
+        return (
+            ((key_hash * seed_0) & mask) >> shift,
+            (((key_hash * seed_1) & mask) >> shift) + width,
+            (((key_hash * seed_2) & mask) >> shift) + 2 * width,
+            (((key_hash * seed_3) & mask) >> shift) + 3 * width,
+        )
+
+    def increment(self, key):
+        table = self._table
+        for index in self._indexes(key):
+            if table[index] < CountMinSketch.MAX_COUNT:
+                table[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    def estimate(self, key) -> int:
+        table = self._table
+        index_0, index_1, index_2, index_3 = self._indexes(key)
+        return min(table[index_0], table[index_1], table[index_2], table[index_3])
+
+    def raise_estimate(self, key, count: int):
+        table = self._table
+        count = min(count, CountMinSketch.MAX_COUNT)
+        for index in self._indexes(key):
+            if table[index] < count:
+                table[index] = count
+
+    def _reset(self):
+        self._table = self._table.translate(CountMinSketch.HALVE_TABLE)
+        self._additions //= 2
+
+
+class TinyLFUPolicy:
+    WINDOW_RATIO = 0.01
+    PROTECTED_RATIO = 0.8
+    HASH_PROBE = 'TinyLFUPolicy'
+
+    def __init__(self, capacity: int):
+        if not isinstance(capacity, int) or capacity <= 0:
+            raise ValueError(
+                f'TinyLFU policy requires positive integer limit, got {capacity}.'
+            )
+        self._window_capacity = max(1, int(capacity * TinyLFUPolicy.WINDOW_RATIO))
+        self._main_capacity = capacity - self._window_capacity
+        self._protected_capacity = int(
+            self._main_capacity * TinyLFUPolicy.PROTECTED_RATIO
+        )
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._sketch = CountMinSketch(capacity)
+
+    def record_access(self, key):
+        self._sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        else:
+            del self._probation[key]
+            self._protected[key] = None
+            if len(self._protected) > self._protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+
+    def record_miss(self, key):
+        self._sketch.increment(key)
+
+    def add(self, key):
+        self._sketch.increment(key)
+        self._window[key] = None
+        if len(self._window) <= self._window_capacity:
+            return None
+        candidate, _ = self._window.popitem(last=False)
+        if len(self._probation) + len(self._protected) < self._main_capacity:
+            self._probation[candidate] = None
+            return None
+        if not self._probation and not self._protected:
+            return candidate
+        victim_segment = self._probation if self._probation else self._protected
+        victim = next(iter(victim_segment))
+        if self._sketch.estimate(candidate) > self._sketch.estimate(victim):
+            del victim_segment[victim]
+            self._probation[candidate] = None
+            return victim
+        return candidate
+
+    def evict(self):
+        for segment in (self._probation, self._protected, self._window):
+            if segment:
+                key, _ = segment.popitem(last=False)
+                return key
+        raise IndexError("TinyLFU policy is empty")
+
+    def remove(self, key):
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                del segment[key]
+                return
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    #  The sketch is indexed by hash(), which is randomized per process for
+    #  str and bytes. A pickled sketch is kept only if hash() is unchanged,
+    #  otherwise it is rebuilt from the estimated frequencies of cached keys.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_hash_probe'] = hash(TinyLFUPolicy.HASH_PROBE)
+        state['_frequencies'] = [
+            self._sketch.estimate(key)
+            for segment in (self._window, self._probation, self._protected)
+            for key in segment
+        ]
+        return state
+
+    def __setstate__(self, state):
+        hash_probe = state.pop('_hash_probe')
+        frequencies = state.pop('_frequencies')
+        self.__dict__.update(state)
+        if hash_probe == hash(TinyLFUPolicy.HASH_PROBE):
+            return
+        self._sketch = CountMinSketch(self._window_capacity + self._main_capacity)
+        keys = (
+            key
+            for segment in (self._window, self._probation, self._protected)
+            for key in segment
+        )
+        for key, count in zip(keys, frequencies):
+            self._sketch.raise_estimate(key, count)
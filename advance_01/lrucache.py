@@ -1,14 +1,406 @@
 import logging
-from priority_queue import PriorityQueue
+import mmap
+import os
+import pickle
+import struct
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from priority_queue import PriorityQueue, IndexedPriorityQueue
+from eviction_policy import TinyLFUPolicy
 
 
 logger = logging.getLogger('LRUCache')
 
+CacheInfo = namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize']
+)
+_MISSING = object()
+SNAPSHOT_MAGIC = b'LRUS'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<4sH')
+
 
 class LRUCache:
-    def __init__(self, limit=42):
+    MAX_EXPIRED_PER_OPERATION = 8
+    POLICIES = {
+        'lru': None,
+        'tinylfu': TinyLFUPolicy,
+    }
+
+    def __init__(self, limit=42, ttl=None, timer=time.monotonic,
+                 weigher=None, max_weight=None, policy='lru',
+                 trace=False, stats_interval=100_000, wall_timer=time.time,
+                 max_item_weight=None):
+        if (weigher is None) != (max_weight is None):
+            raise ValueError('Both weigher and max_weight must be set.')
+        if policy not in LRUCache.POLICIES:
+            raise ValueError(
+                f'Unknown policy {policy}. '
+                f'Expected one of {list(LRUCache.POLICIES)}.'
+            )
+        self._storage = OrderedDict()
+        self._capacity = limit
+        self._ttl = ttl
+        self._timer = timer
+        self._wall_timer = wall_timer
+        self._expire_at = {}
+        self._expiry_queue = IndexedPriorityQueue()
+        self._weigher = weigher
+        self._max_weight = max_weight
+        # An item heavier than max_weight but not than max_item_weight is
+        # kept alone, after evicting everything else.
+        self._max_item_weight = (
+            max_weight if max_item_weight is None else max_item_weight
+        )
+        self._weights = {}
+        self._current_weight = 0
+        policy_cls = LRUCache.POLICIES[policy]
+        self._policy = policy_cls(limit) if policy_cls is not None else None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._trace = trace
+        self._stats_interval = stats_interval
+        self._operations = 0
+        self._next_stats_flush = stats_interval
+        logger.info("LRUCache created.")
+
+    @property
+    def current_weight(self):
+        return self._current_weight
+
+    def _drop_expiry(self, key):
+        if key in self._expire_at:
+            del self._expire_at[key]
+            self._expiry_queue.remove(key)
+
+    def _drop_weight(self, key):
+        if key in self._weights:
+            self._current_weight -= self._weights.pop(key)
+
+    def _discard(self, key):
+        del self._storage[key]
+        if key in self._expire_at:
+            self._drop_expiry(key)
+        if key in self._weights:
+            self._drop_weight(key)
+        if self._policy is not None:
+            self._policy.remove(key)
+
+    def _evict(self):
+        if self._policy is None:
+            key = next(iter(self._storage))
+        else:
+            key = self._policy.evict()
+        self._discard(key)
+        self._evictions += 1
+
+    def _evict_expired(self):
+        now = self._timer()
+        for _ in range(LRUCache.MAX_EXPIRED_PER_OPERATION):
+            if self._expiry_queue.is_empty():
+                return
+            key, expire_at = self._expiry_queue.peek()
+            if expire_at > now:
+                return
+            self._expiry_queue.pull()
+            del self._expire_at[key]
+            self._discard(key)
+            if self._trace:
+                logger.info("Key %s is expired.", key)
+
+    def _reserve_weight(self, key, value):
+        weight = self._weigher(value)
+        if key in self._storage:
+            self._discard(key)
+        if weight > self._max_item_weight:
+            logger.warning(
+                "Key %s is rejected: weight %d exceeds max weight %d.",
+                key, weight, self._max_item_weight
+            )
+            return None
+        while self._storage and self._current_weight + weight > self._max_weight:
+            self._evict()
+        return weight
+
+    def _expiration_time(self, ttl):
+        if ttl is None:
+            ttl = self._ttl
+        if ttl is None:
+            return None
+        return self._timer() + ttl
+
+    def _lookup(self, key, now, default):
+        if now is not None and self._expire_at.get(key, now + 1) <= now:
+            self._discard(key)
+        elif key in self._storage:
+            if self._policy is None:
+                self._storage.move_to_end(key)
+            else:
+                self._policy.record_access(key)
+            self._hits += 1
+            return self._storage[key]
+        elif self._policy is not None:
+            self._policy.record_miss(key)
+        self._misses += 1
+        return default
+
+    def _store(self, key, value, expire_at) -> bool:
+        if self._weigher is not None:
+            weight = self._reserve_weight(key, value)
+            if weight is None:
+                return False
+            self._weights[key] = weight
+            self._current_weight += weight
+        if self._policy is None:
+            if key in self._storage:
+                self._storage.move_to_end(key)
+            elif len(self._storage) == self._capacity:
+                self._evict()
+            self._storage[key] = value
+        elif key in self._storage:
+            self._storage[key] = value
+            self._policy.record_access(key)
+        else:
+            self._storage[key] = value
+            victim = self._policy.add(key)
+            if victim is not None:
+                self._discard(victim)
+                self._evictions += 1
+        if expire_at is not None:
+            self._expire_at[key] = expire_at
+            self._expiry_queue.insert(key, expire_at)
+        elif key in self._expire_at:
+            self._drop_expiry(key)
+        return True
+
+    def _flush_stats(self):
+        logger.info(
+            "Stats: operations=%d; hits=%d; misses=%d; evictions=%d; size=%d.",
+            self._operations, self._hits, self._misses,
+            self._evictions, len(self._storage)
+        )
+        self._next_stats_flush = self._operations + self._stats_interval
+
+    def get(self, key, default=None):
+        now = None
+        if self._expire_at:
+            self._evict_expired()
+            now = self._timer()
+        value = self._lookup(key, now, _MISSING)
+        self._operations += 1
+        if self._operations >= self._next_stats_flush:
+            self._flush_stats()
+        if value is _MISSING:
+            if self._trace:
+                logger.warning("Key %s is not exist.", key)
+            return default
+        if self._trace:
+            logger.info("Key=%s; value=%s.", key, value)
+        return value
+
+    def get_many(self, keys):
+        now = None
+        if self._expire_at:
+            self._evict_expired()
+            now = self._timer()
+        found = {}
+        n_keys = 0
+        for key in keys:
+            value = self._lookup(key, now, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+            n_keys += 1
+        self._operations += n_keys
+        if self._operations >= self._next_stats_flush:
+            self._flush_stats()
+        if self._trace:
+            logger.info("%d of %d keys are found.", len(found), n_keys)
+        return found
+
+    def set(self, key, value, ttl=None):
+        if self._expire_at:
+            self._evict_expired()
+        stored = self._store(key, value, self._expiration_time(ttl))
+        self._operations += 1
+        if self._operations >= self._next_stats_flush:
+            self._flush_stats()
+        if stored and self._trace:
+            logger.info("Key %s is set.", key)
+
+    def set_many(self, mapping, ttl=None):
+        if self._expire_at:
+            self._evict_expired()
+        expire_at = self._expiration_time(ttl)
+        n_stored = 0
+        for key, value in mapping.items():
+            n_stored += self._store(key, value, expire_at)
+        self._operations += len(mapping)
+        if self._operations >= self._next_stats_flush:
+            self._flush_stats()
+        if self._trace:
+            logger.info("%d of %d keys are set.", n_stored, len(mapping))
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self._hits, self._misses, self._evictions,
+            self._capacity, len(self._storage)
+        )
+
+    def clear(self):
+        self._storage.clear()
+        self._expire_at.clear()
+        self._expiry_queue = IndexedPriorityQueue()
+        self._weights.clear()
+        self._current_weight = 0
+        if self._policy is not None:
+            self._policy = type(self._policy)(self._capacity)
+        self._hits = self._misses = self._evictions = 0
+        self._operations = 0
+        self._next_stats_flush = self._stats_interval
+
+    def snapshot(self, filename):
+        now = self._timer()
+        state = {
+            'keys': list(self._storage),
+            'values': list(self._storage.values()),
+            'ttl_left': {
+                key: expire_at - now for key, expire_at in self._expire_at.items()
+            },
+            # timer is monotonic and restarts with the process, the time the
+            # process was down is counted by the wall clock.
+            'saved_at': self._wall_timer(),
+            'weights': self._weights,
+            'limit': self._capacity,
+            'policy': self._policy,
+        }
+        tmp_filename = f'{filename}.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+        logger.info("Snapshot with %d keys is saved to %s.", len(self), filename)
+
+    def restore(self, filename):
+        # Unpickling may run arbitrary code, so only snapshots written by a
+        # trusted process can be restored. The objects are still built by
+        # pickle, mmap only spares reading the whole file into memory first.
+        with open(filename, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                memoryview(mm) as view:
+            magic, version = SNAPSHOT_HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError(f'File {filename} is not an LRUCache snapshot.')
+            with view[SNAPSHOT_HEADER.size:] as payload:
+                state = pickle.loads(payload)
+        if (
+                type(state['policy']) is not type(self._policy)
+                or (self._policy is not None and state['limit'] != self._capacity)
+        ):
+            raise ValueError('Snapshot was taken with a different policy.')
+        if self._capacity is not None and len(state['keys']) > self._capacity:
+            raise ValueError(
+                f'Snapshot has {len(state["keys"])} keys, '
+                f'cache limit is {self._capacity}.'
+            )
+        self.clear()
+        self._storage = OrderedDict(zip(state['keys'], state['values']))
+        self._policy = state['policy']
+        now = self._timer()
+        elapsed = max(0.0, self._wall_timer() - state['saved_at'])
+        expired = []
+        for key, ttl_left in state['ttl_left'].items():
+            if ttl_left > elapsed:
+                self._expire_at[key] = now + ttl_left - elapsed
+            else:
+                expired.append(key)
+        self._expiry_queue = IndexedPriorityQueue(self._expire_at.items())
+        if self._weigher is not None:
+            weights = state['weights']
+            self._weights = {
+                key: weights[key] if key in weights else self._weigher(value)
+                for key, value in self._storage.items()
+            }
+            self._current_weight = sum(self._weights.values())
+        for key in expired:
+            self._discard(key)
+        if self._weigher is not None:
+            while self._current_weight > self._max_weight:
+                self._evict()
+        logger.info("Snapshot with %d keys is restored from %s.", len(self), filename)
+
+    def __len__(self):
+        return len(self._storage)
+
+
+def _split(total, n_parts, index):
+    if total is None:
+        return None
+    base, remainder = divmod(total, n_parts)
+    return base + (1 if index < remainder else 0)
+
+
+class ConcurrentLRUCache:
+    def __init__(self, limit=42, n_shards=16, max_weight=None, **cache_kwargs):
+        if n_shards <= 0:
+            raise ValueError(f'Expected positive number of shards, got {n_shards}.')
+        for total in (limit, max_weight):
+            if total is not None:
+                n_shards = max(1, min(n_shards, total))
+        self._shards = [
+            LRUCache(
+                _split(limit, n_shards, i),
+                max_weight=_split(max_weight, n_shards, i),
+                max_item_weight=max_weight,
+                **cache_kwargs
+            )
+            for i in range(n_shards)
+        ]
+        self._locks = [Lock() for _ in range(n_shards)]
+        self._n_shards = n_shards
+        self._limit = limit
+
+    def _shard_index(self, key) -> int:
+        return hash(key) % self._n_shards
+
+    def get(self, key, default=None):
+        index = self._shard_index(key)
+        with self._locks[index]:
+            return self._shards[index].get(key, default)
+
+    def set(self, key, value, ttl=None):
+        index = self._shard_index(key)
+        with self._locks[index]:
+            self._shards[index].set(key, value, ttl)
+
+    def cache_info(self) -> CacheInfo:
+        infos = []
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                infos.append(shard.cache_info())
+        return CacheInfo(
+            sum(info.hits for info in infos),
+            sum(info.misses for info in infos),
+            sum(info.evictions for info in infos),
+            self._limit,
+            sum(info.currsize for info in infos),
+        )
+
+    def clear(self):
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                shard.clear()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+
+class HeapLRUCache:
+    def __init__(self, limit=42, compaction_threshold=1.0):
         self._storage = {}
-        self._priority_queue = PriorityQueue()
+        self._priority_queue = PriorityQueue(compaction_threshold)
         self._capacity = limit
         self._current_max_priority = -1
         logger.info("LRUCache created.")
@@ -33,3 +425,6 @@ class LRUCache:
         self._current_max_priority += 1
         self._priority_queue.insert(key, self._current_max_priority)
         logger.info("Key %s is set.", key)
+
+    def __len__(self):
+        return len(self._storage)
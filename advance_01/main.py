@@ -41,11 +41,17 @@ if __name__ == "__main__":
         action="store_true",
         help="verbose output"
     )
+    parser.add_argument(
+        '-t',
+        '--trace',
+        action="store_true",
+        help="log every cache operation"
+    )
     args = parser.parse_args()
 
     logger = get_configured_logger(args.stdout)
 
-    cache = LRUCache(2)
+    cache = LRUCache(2, trace=args.trace)
 
     cache.set("k1", "val1")
     cache.set("k2", "val2")
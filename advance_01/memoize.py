@@ -0,0 +1,37 @@
+from functools import wraps
+
+from lrucache import LRUCache, ConcurrentLRUCache
+
+
+_KWARGS_MARK = object()
+_MISSING = object()
+
+
+def make_key(args, kwargs):
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(kwargs.items())
+    return key
+
+
+def memoize(limit=128, thread_safe=False, **cache_kwargs):
+    def decorator(func):
+        if thread_safe:
+            cache = ConcurrentLRUCache(limit, **cache_kwargs)
+        else:
+            cache = LRUCache(limit, **cache_kwargs)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = func(*args, **kwargs)
+                cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.cache_info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
@@ -7,15 +7,45 @@ import heapq
 class PriorityQueue:
     STATUS_FRESH = 1
     STATUS_STALE = 0
+    MIN_COMPACTION_SIZE = 64
 
-    def __init__(self):
+    def __init__(self, compaction_threshold: float = 1.0):
+        if compaction_threshold <= 0:
+            raise ValueError(
+                f'Expected positive compaction threshold, '
+                f'got {compaction_threshold}.'
+            )
         self._pqueue = []
         self._entry_finder = {}
+        self._compaction_threshold = compaction_threshold
+        self._n_stale = 0
+        self._n_compactions = 0
+
+    @property
+    def n_stale(self) -> int:
+        return self._n_stale
+
+    @property
+    def n_compactions(self) -> int:
+        return self._n_compactions
 
     def _mark_stale(self, value):
         elem = self._entry_finder.pop(value)
         status = PriorityQueue.STATUS_STALE
         elem[-1] = status
+        self._n_stale += 1
+
+    def _need_compaction(self) -> bool:
+        return (
+            len(self._pqueue) >= PriorityQueue.MIN_COMPACTION_SIZE
+            and self._n_stale > self._compaction_threshold * len(self)
+        )
+
+    def compact(self):
+        self._pqueue = list(self._entry_finder.values())
+        heapq.heapify(self._pqueue)
+        self._n_stale = 0
+        self._n_compactions += 1
 
     def is_empty(self) -> bool:
         return len(self._entry_finder) == 0
@@ -27,6 +57,25 @@ class PriorityQueue:
         elem = [priority, value, status]
         self._entry_finder[value] = elem
         heapq.heappush(self._pqueue, elem)
+        if self._need_compaction():
+            self.compact()
+
+    def remove(self, value):
+        self._mark_stale(value)
+        if self._need_compaction():
+            self.compact()
+
+    def get_priority(self, value):
+        return self._entry_finder[value][0]
+
+    def peek(self):
+        while len(self._pqueue) > 0:
+            priority, value, status = self._pqueue[0]
+            if status:
+                return value, priority
+            heapq.heappop(self._pqueue)
+            self._n_stale -= 1
+        raise IndexError("PriorityQueue is empty")
 
     def pull(self):
         while len(self._pqueue) > 0:
@@ -34,7 +83,106 @@ class PriorityQueue:
             if status:
                 self._entry_finder.pop(value)
                 return value
+            self._n_stale -= 1
         raise IndexError("PriorityQueue is empty")
 
+    def __contains__(self, value):
+        return value in self._entry_finder
+
     def __len__(self):
         return len(self._entry_finder)
+
+
+class IndexedPriorityQueue:
+    def __init__(self, items=None):
+        self._heap = []
+        self._index = {}
+        if items is not None:
+            for value, priority in items:
+                if value in self._index:
+                    self._heap[self._index[value]][0] = priority
+                else:
+                    self._index[value] = len(self._heap)
+                    self._heap.append([priority, value])
+            for pos in reversed(range(len(self._heap) // 2)):
+                self._sift_down(pos)
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][1]] = i
+        self._index[heap[j][1]] = j
+
+    def _sift_up(self, pos):
+        heap = self._heap
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if heap[pos][0] >= heap[parent][0]:
+                return
+            self._swap(pos, parent)
+            pos = parent
+
+    def _sift_down(self, pos):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                return
+            if child + 1 < size and heap[child + 1][0] < heap[child][0]:
+                child += 1
+            if heap[pos][0] <= heap[child][0]:
+                return
+            self._swap(pos, child)
+            pos = child
+
+    def _remove_at(self, pos):
+        last = len(self._heap) - 1
+        if pos != last:
+            self._swap(pos, last)
+        _, value = self._heap.pop()
+        del self._index[value]
+        if pos < len(self._heap):
+            self._sift_down(pos)
+            self._sift_up(pos)
+        return value
+
+    def is_empty(self) -> bool:
+        return len(self._heap) == 0
+
+    def insert(self, value, priority):
+        if value in self._index:
+            pos = self._index[value]
+            old_priority = self._heap[pos][0]
+            self._heap[pos][0] = priority
+            if priority < old_priority:
+                self._sift_up(pos)
+            else:
+                self._sift_down(pos)
+            return
+        self._index[value] = len(self._heap)
+        self._heap.append([priority, value])
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self, value):
+        self._remove_at(self._index[value])
+
+    def get_priority(self, value):
+        return self._heap[self._index[value]][0]
+
+    def peek(self):
+        if not self._heap:
+            raise IndexError("PriorityQueue is empty")
+        priority, value = self._heap[0]
+        return value, priority
+
+    def pull(self):
+        if not self._heap:
+            raise IndexError("PriorityQueue is empty")
+        return self._remove_at(0)
+
+    def __contains__(self, value):
+        return value in self._index
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,80 @@
+import pytest
+
+from eviction_policy import CountMinSketch, TinyLFUPolicy
+from lrucache import LRUCache
+
+
+def test_sketch_estimate():
+    sketch = CountMinSketch(64)
+    for _ in range(5):
+        sketch.increment("hot")
+    sketch.increment("cold")
+
+    assert sketch.estimate("hot") >= 5
+    assert sketch.estimate("cold") >= 1
+    assert sketch.estimate("hot") > sketch.estimate("cold")
+
+
+def test_sketch_saturation_and_aging():
+    sketch = CountMinSketch(16, sample_factor=10)
+    for _ in range(100):
+        sketch.increment("hot")
+    assert sketch.estimate("hot") <= CountMinSketch.MAX_COUNT
+
+    for _ in range(1000):
+        sketch.increment("other")
+    assert sketch.estimate("hot") < CountMinSketch.MAX_COUNT
+
+
+def test_policy_wrong_limit():
+    with pytest.raises(ValueError):
+        TinyLFUPolicy(0)
+    with pytest.raises(ValueError):
+        LRUCache(None, policy='tinylfu')
+    with pytest.raises(ValueError):
+        LRUCache(10, policy='fifo')
+
+
+@pytest.mark.parametrize("limit", [1, 2, 10, 100])
+def test_tinylfu_respects_limit(limit):
+    cache = LRUCache(limit, policy='tinylfu')
+    for i in range(10 * limit):
+        cache.set(i, i)
+        cache.get(i // 2)
+        assert len(cache) <= limit
+        assert len(cache._policy) == len(cache)
+
+
+def test_tinylfu_is_scan_resistant():
+    limit = 100
+    hot_keys = list(range(50))
+    caches = {
+        policy: LRUCache(limit, policy=policy) for policy in LRUCache.POLICIES
+    }
+    for cache in caches.values():
+        for _ in range(5):
+            for key in hot_keys:
+                if cache.get(key) is None:
+                    cache.set(key, key)
+        for i in range(10 * limit):
+            cache.set(limit + i, i)
+
+    hot_left = {
+        policy: sum(cache.get(key) is not None for key in hot_keys)
+        for policy, cache in caches.items()
+    }
+    assert hot_left['lru'] == 0
+    assert hot_left['tinylfu'] >= 0.9 * len(hot_keys)
+
+
+def test_tinylfu_with_ttl_and_weight():
+    cache = LRUCache(
+        10, ttl=100, weigher=len, max_weight=10, policy='tinylfu'
+    )
+    cache.set("k1", "aaaa")
+    cache.set("k2", "bbbb")
+    cache.set("k3", "cccc")
+
+    assert cache.current_weight <= 10
+    assert len(cache._policy) == len(cache)
+    assert len(cache._expiry_queue) == len(cache)
@@ -0,0 +1,420 @@
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+from threading import Thread
+import pytest
+
+from lrucache import LRUCache, HeapLRUCache, ConcurrentLRUCache, CacheInfo
+
+
+@pytest.mark.parametrize("cls", [LRUCache, HeapLRUCache])
+def test_get_set(cls):
+    cache = cls(2)
+
+    cache.set("k1", "val1")
+    cache.set("k2", "val2")
+
+    assert cache.get("k3") is None
+    assert cache.get("k2") == "val2"
+    assert cache.get("k1") == "val1"
+
+    cache.set("k3", "val3")
+
+    assert cache.get("k3") == "val3"
+    assert cache.get("k2") is None
+    assert cache.get("k1") == "val1"
+
+
+@pytest.mark.parametrize("cls", [LRUCache, HeapLRUCache])
+def test_update_existing_key(cls):
+    cache = cls(2)
+
+    cache.set("k1", "val1")
+    cache.set("k2", "val2")
+    cache.set("k1", "val1_new")
+    cache.set("k3", "val3")
+
+    assert len(cache) == 2
+    assert cache.get("k1") == "val1_new"
+    assert cache.get("k2") is None
+    assert cache.get("k3") == "val3"
+
+
+def test_memory_does_not_grow_with_reads():
+    cache = LRUCache(3)
+    for i in range(3):
+        cache.set(i, i)
+    for _ in range(1000):
+        for i in range(3):
+            cache.get(i)
+    assert len(cache._storage) == 3
+
+
+def test_concurrent_capacity_split():
+    cache = ConcurrentLRUCache(10, n_shards=4)
+    assert sorted(shard._capacity for shard in cache._shards) == [2, 2, 3, 3]
+
+    cache = ConcurrentLRUCache(2, n_shards=16)
+    assert len(cache._shards) == 2
+
+    with pytest.raises(ValueError):
+        ConcurrentLRUCache(10, n_shards=0)
+
+
+def test_concurrent_weight_split():
+    cache = ConcurrentLRUCache(None, n_shards=4, weigher=len, max_weight=10)
+    assert sorted(shard._max_weight for shard in cache._shards) == [2, 2, 3, 3]
+    assert all(shard._capacity is None for shard in cache._shards)
+    for i in range(100):
+        cache.set(i, 'a')
+    assert sum(shard.current_weight for shard in cache._shards) <= 10
+    assert cache.cache_info().maxsize is None
+
+    cache = ConcurrentLRUCache(None, n_shards=16, weigher=len, max_weight=2)
+    assert len(cache._shards) == 2
+
+
+def test_concurrent_item_heavier_than_shard():
+    cache = ConcurrentLRUCache(None, n_shards=16, weigher=len, max_weight=1600)
+    cache.set('small', 'a' * 10)
+    cache.set('page', 'a' * 200)
+    assert cache.get('page') == 'a' * 200
+    cache.set('huge', 'a' * 1601)
+    assert cache.get('huge') is None
+    shard = cache._shards[cache._shard_index('page')]
+    assert list(shard._storage) == ['page']
+
+
+def test_concurrent_get_set():
+    cache = ConcurrentLRUCache(100, n_shards=4)
+
+    def worker(offset):
+        for i in range(1000):
+            key = (offset, i % 50)
+            cache.set(key, i)
+            cache.get(key)
+
+    workers = [Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for th in workers:
+        th.start()
+    for th in workers:
+        th.join()
+
+    assert len(cache) == 100
+    for shard in cache._shards:
+        assert len(shard) <= shard._capacity
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_default_ttl():
+    timer = FakeTimer()
+    cache = LRUCache(10, ttl=5, timer=timer)
+    cache.set("k1", "val1")
+    timer.now = 3
+    cache.set("k2", "val2")
+
+    assert cache.get("k1") == "val1"
+    timer.now = 5
+    assert cache.get("k1") is None
+    assert cache.get("k2") == "val2"
+    timer.now = 8
+    assert cache.get("k2") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl():
+    timer = FakeTimer()
+    cache = LRUCache(10, ttl=5, timer=timer)
+    cache.set("short", 1, ttl=1)
+    cache.set("default", 2)
+    cache.set("long", 3, ttl=100)
+
+    timer.now = 2
+    assert cache.get("short") is None
+    assert cache.get("default") == 2
+    timer.now = 50
+    assert cache.get("default") is None
+    assert cache.get("long") == 3
+
+
+def test_reset_ttl_on_set():
+    timer = FakeTimer()
+    cache = LRUCache(10, timer=timer)
+    cache.set("k1", "val1", ttl=1)
+    cache.set("k1", "val2")
+
+    timer.now = 10
+    assert cache.get("k1") == "val2"
+    assert len(cache._expiry_queue) == 0
+
+
+def test_expired_entries_reclaimed_in_bounded_steps():
+    timer = FakeTimer()
+    cache = LRUCache(100, ttl=1, timer=timer)
+    for i in range(50):
+        cache.set(i, i)
+    timer.now = 2
+
+    cache.get("missing")
+    assert len(cache) == 50 - LRUCache.MAX_EXPIRED_PER_OPERATION
+    while len(cache) > 0:
+        cache.get("missing")
+    assert cache._expiry_queue.is_empty()
+
+
+def test_capacity_eviction_drops_expiry():
+    timer = FakeTimer()
+    cache = LRUCache(2, ttl=5, timer=timer)
+    cache.set("k1", 1)
+    cache.set("k2", 2)
+    cache.set("k3", 3)
+
+    assert "k1" not in cache._expiry_queue
+    assert len(cache._expiry_queue) == 2
+
+
+def test_weighted_eviction():
+    cache = LRUCache(limit=None, weigher=len, max_weight=10)
+    cache.set("k1", "aaaa")
+    cache.set("k2", "bbbb")
+    assert cache.current_weight == 8
+
+    cache.get("k1")
+    cache.set("k3", "cccccc")
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") == "aaaa"
+    assert cache.get("k3") == "cccccc"
+    assert cache.current_weight == 10
+
+    cache.set("k4", "d" * 9)
+    assert len(cache) == 1
+    assert cache.current_weight == 9
+
+
+def test_weighted_update_existing_key():
+    cache = LRUCache(limit=None, weigher=len, max_weight=10)
+    cache.set("k1", "aaaa")
+    cache.set("k2", "bbbb")
+    cache.set("k2", "bb")
+
+    assert cache.current_weight == 6
+    assert cache.get("k1") == "aaaa"
+
+    cache.set("k1", "a" * 8)
+    assert cache.get("k2") == "bb"
+    assert cache.current_weight == 10
+
+
+def test_weighted_rejects_too_big():
+    cache = LRUCache(limit=None, weigher=len, max_weight=10)
+    cache.set("k1", "aaaa")
+    cache.set("k2", "b" * 11)
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") == "aaaa"
+    assert cache.current_weight == 4
+
+    cache.set("k1", "a" * 11)
+    assert cache.get("k1") is None
+    assert cache.current_weight == 0
+
+
+def test_weighted_respects_limit_and_ttl():
+    timer = FakeTimer()
+    cache = LRUCache(limit=2, ttl=1, timer=timer, weigher=len, max_weight=100)
+    cache.set("k1", "a")
+    cache.set("k2", "bb")
+    cache.set("k3", "ccc")
+    assert cache.current_weight == 5
+
+    timer.now = 2
+    assert cache.get("k3") is None
+    assert cache.get("k2") is None
+    assert cache.current_weight == 0
+
+
+def test_weigher_requires_max_weight():
+    with pytest.raises(ValueError):
+        LRUCache(weigher=len)
+    with pytest.raises(ValueError):
+        LRUCache(max_weight=10)
+
+
+def test_get_default():
+    cache = LRUCache(2)
+    cache.set("k1", None)
+    missing = object()
+
+    assert cache.get("k1", missing) is None
+    assert cache.get("k2", missing) is missing
+
+
+def test_get_many_set_many():
+    timer = FakeTimer()
+    cache = LRUCache(3, timer=timer)
+    cache.set_many({"k1": 1, "k2": 2})
+    cache.set_many({"k3": 3, "k4": 4}, ttl=5)
+
+    assert len(cache) == 3
+    assert cache.get_many(["k1", "k2", "k3", "k4"]) == {"k2": 2, "k3": 3, "k4": 4}
+
+    timer.now = 5
+    assert cache.get_many(key for key in ["k2", "k3"]) == {"k2": 2}
+    assert len(cache) == 1
+
+
+def test_cache_info():
+    cache = LRUCache(2)
+    cache.set("k1", 1)
+    cache.set("k2", 2)
+    cache.get("k1")
+    cache.get("k3")
+    cache.set("k3", 3)
+
+    assert cache.cache_info() == CacheInfo(1, 1, 1, 2, 2)
+
+    cache.clear()
+    assert cache.cache_info() == CacheInfo(0, 0, 0, 2, 0)
+    assert cache.get("k1") is None
+
+
+def test_no_per_operation_logging_by_default(caplog):
+    caplog.set_level(logging.INFO, logger='LRUCache')
+    cache = LRUCache(2, stats_interval=4)
+    cache.set("k1", 1)
+    cache.get("k1")
+    cache.get("k2")
+    assert caplog.messages == ["LRUCache created."]
+
+    cache.set("k2", 2)
+    assert caplog.messages[-1] == (
+        "Stats: operations=4; hits=1; misses=1; evictions=0; size=2."
+    )
+
+    cache.set_many({"k3": 3, "k4": 4, "k5": 5, "k6": 6})
+    assert len(caplog.messages) == 3
+
+
+def test_trace_logging(caplog):
+    caplog.set_level(logging.INFO, logger='LRUCache')
+    cache = LRUCache(2, trace=True)
+    cache.set("k1", 1)
+    cache.get("k1")
+    cache.get("k2")
+    assert caplog.messages == [
+        "LRUCache created.",
+        "Key k1 is set.",
+        "Key=k1; value=1.",
+        "Key k2 is not exist.",
+    ]
+
+
+@pytest.mark.parametrize("policy", list(LRUCache.POLICIES))
+def test_snapshot_restore_preserves_eviction_order(policy, tmp_path):
+    filename = tmp_path / "cache.snapshot"
+    cache = LRUCache(100, policy=policy)
+    for i in range(300):
+        cache.set(i, str(i))
+        cache.get(i // 3)
+    cache.snapshot(filename)
+
+    restored = LRUCache(100, policy=policy)
+    restored.restore(filename)
+    assert list(restored._storage.items()) == list(cache._storage.items())
+
+    for i in range(300, 600):
+        cache.set(i, str(i))
+        restored.set(i, str(i))
+        assert list(restored._storage) == list(cache._storage)
+
+
+def test_snapshot_restore_frequencies_in_new_process(tmp_path):
+    filename = tmp_path / "cache.snapshot"
+    cache = LRUCache(100, policy='tinylfu')
+    for i in range(100):
+        cache.set(f"k{i}", i)
+        for _ in range(i % 5):
+            cache.get(f"k{i}")
+    cache.snapshot(filename)
+    sketch = cache._policy._sketch
+    estimates = [sketch.estimate(key) for key in cache._storage]
+
+    script = (
+        "import sys\n"
+        "from lrucache import LRUCache\n"
+        "cache = LRUCache(100, policy='tinylfu')\n"
+        "cache.restore(sys.argv[1])\n"
+        "print([cache._policy._sketch.estimate(key) for key in cache._storage])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(filename)],
+        cwd=Path(__file__).parent.parent,
+        env=dict(os.environ, PYTHONHASHSEED="12345"),
+        capture_output=True, text=True, check=True,
+    )
+    restored_estimates = [int(count) for count in result.stdout.strip(" []\n").split(",")]
+    assert len(restored_estimates) == len(estimates)
+    assert all(
+        restored >= estimate for restored, estimate in zip(restored_estimates, estimates)
+    )
+
+
+def test_snapshot_restore_ttl_and_weight(tmp_path):
+    filename = tmp_path / "cache.snapshot"
+    timer = FakeTimer()
+    wall_timer = FakeTimer()
+    wall_timer.now = 1_000_000
+    cache = LRUCache(10, timer=timer, wall_timer=wall_timer, weigher=len, max_weight=100)
+    cache.set("k1", "aaaa", ttl=10)
+    cache.set("k2", "bb", ttl=100)
+    cache.set("k3", "c")
+    timer.now = 5
+    cache.snapshot(filename)
+
+    timer.now = 0
+    wall_timer.now += 3
+    restored = LRUCache(10, timer=timer, wall_timer=wall_timer, weigher=len, max_weight=100)
+    restored.restore(filename)
+    assert restored.current_weight == 7
+
+    timer.now = 1.5
+    assert restored.get("k1") == "aaaa"
+    timer.now = 2
+    assert restored.get("k1") is None
+    assert restored.get("k2") == "bb"
+    assert restored.current_weight == 3
+
+    # Entries that expired while the process was down are not restored.
+    wall_timer.now += 3600
+    restored = LRUCache(10, timer=timer, wall_timer=wall_timer, weigher=len, max_weight=100)
+    restored.restore(filename)
+    assert len(restored) == 1
+    assert restored.current_weight == 1
+    assert restored.get("k1") is None
+    assert restored.get("k2") is None
+    assert restored.get("k3") == "c"
+
+
+def test_restore_wrong_snapshot(tmp_path):
+    filename = tmp_path / "cache.snapshot"
+    filename.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        LRUCache(10).restore(filename)
+
+    cache = LRUCache(10)
+    cache.set_many({i: i for i in range(10)})
+    cache.snapshot(filename)
+    with pytest.raises(ValueError):
+        LRUCache(5).restore(filename)
+    with pytest.raises(ValueError):
+        LRUCache(10, policy='tinylfu').restore(filename)
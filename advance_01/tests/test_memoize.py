@@ -0,0 +1,74 @@
+import pytest
+
+from lrucache import CacheInfo
+from memoize import memoize, make_key
+
+
+def test_make_key():
+    assert make_key((1, 2), {}) == (1, 2)
+    assert make_key((1,), {'b': 2}) != make_key((1, 'b', 2), {})
+    assert hash(make_key((1, (2, 3)), {'c': 'd'}))
+
+
+@pytest.mark.parametrize(
+    "cache_kwargs",
+    [
+        {},
+        {'thread_safe': True, 'n_shards': 1},
+    ]
+)
+def test_memoize(cache_kwargs):
+    calls = []
+
+    @memoize(limit=2, **cache_kwargs)
+    def power(base, exp=2):
+        calls.append((base, exp))
+        return base ** exp
+
+    assert power(2) == 4
+    assert power(2) == 4
+    assert power(2, exp=3) == 8
+    assert power(3) == 9
+    assert power(2) == 4
+    assert calls == [(2, 2), (2, 3), (3, 2), (2, 2)]
+    assert power.__name__ == 'power'
+
+    info = power.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (1, 4, 2)
+    assert info.currsize == 2
+
+    power.cache_clear()
+    assert power.cache_info() == CacheInfo(0, 0, 0, 2, 0)
+
+
+def test_memoize_none_result():
+    calls = []
+
+    @memoize()
+    def nothing(x):
+        calls.append(x)
+
+    nothing(1)
+    nothing(1)
+    assert calls == [1]
+    assert nothing.cache_info().hits == 1
+
+
+def test_memoize_unhashable_arguments():
+    @memoize()
+    def length(seq):
+        return len(seq)
+
+    with pytest.raises(TypeError):
+        length([1, 2, 3])
+
+
+def test_memoize_thread_safe_unbounded():
+    @memoize(limit=None, thread_safe=True, weigher=len, max_weight=100)
+    def repeat(text, n):
+        return text * n
+
+    for i in range(100):
+        assert repeat('a', i % 5) == 'a' * (i % 5)
+    assert repeat.cache_info().maxsize is None
+    assert sum(shard.current_weight for shard in repeat.cache._shards) <= 100
@@ -0,0 +1,132 @@
+import random
+import pytest
+
+from priority_queue import PriorityQueue, IndexedPriorityQueue
+
+
+def test_pull_order():
+    pqueue = PriorityQueue()
+    for value, priority in [("a", 3), ("b", 1), ("c", 2)]:
+        pqueue.insert(value, priority)
+    pqueue.insert("a", 0)
+
+    assert len(pqueue) == 3
+    assert [pqueue.pull() for _ in range(3)] == ["a", "b", "c"]
+    assert pqueue.is_empty()
+    with pytest.raises(IndexError):
+        pqueue.pull()
+
+
+def test_stale_counter():
+    pqueue = PriorityQueue()
+    pqueue.insert("a", 1)
+    pqueue.insert("b", 2)
+    pqueue.insert("a", 3)
+    assert pqueue.n_stale == 1
+
+    assert pqueue.pull() == "b"
+    assert pqueue.n_stale == 0
+
+
+@pytest.mark.parametrize("threshold", [0.5, 1.0, 4.0])
+def test_compaction_bounds_heap(threshold):
+    n_values = PriorityQueue.MIN_COMPACTION_SIZE
+    pqueue = PriorityQueue(compaction_threshold=threshold)
+    priority = 0
+    for _ in range(100):
+        for value in range(n_values):
+            pqueue.insert(value, priority)
+            priority += 1
+            assert pqueue.n_stale <= threshold * len(pqueue)
+
+    assert len(pqueue) == n_values
+    assert len(pqueue._pqueue) <= (1 + threshold) * n_values + 1
+    assert pqueue.n_compactions > 0
+    assert [pqueue.pull() for _ in range(n_values)] == list(range(n_values))
+
+
+def test_wrong_threshold():
+    with pytest.raises(ValueError):
+        PriorityQueue(compaction_threshold=0)
+
+
+def test_peek_and_remove():
+    pqueue = PriorityQueue()
+    pqueue.insert("a", 1)
+    pqueue.insert("b", 2)
+    assert pqueue.peek() == ("a", 1)
+    assert pqueue.get_priority("b") == 2
+
+    pqueue.remove("a")
+    assert "a" not in pqueue
+    assert pqueue.peek() == ("b", 2)
+    assert len(pqueue) == 1
+    assert pqueue.n_stale == 0
+
+    pqueue.pull()
+    with pytest.raises(IndexError):
+        pqueue.peek()
+
+
+def check_heap_invariant(pqueue):
+    heap = pqueue._heap
+    for pos in range(1, len(heap)):
+        assert heap[(pos - 1) // 2][0] <= heap[pos][0]
+    for value, pos in pqueue._index.items():
+        assert heap[pos][1] == value
+
+
+def test_indexed_bulk_construction():
+    rng = random.Random(42)
+    items = [(value, rng.random()) for value in range(1000)]
+    pqueue = IndexedPriorityQueue(items)
+    check_heap_invariant(pqueue)
+
+    assert len(pqueue) == 1000
+    expected = [value for value, _ in sorted(items, key=lambda item: item[1])]
+    assert [pqueue.pull() for _ in range(1000)] == expected
+    with pytest.raises(IndexError):
+        pqueue.pull()
+    with pytest.raises(IndexError):
+        pqueue.peek()
+
+
+def test_indexed_bulk_construction_duplicates():
+    pqueue = IndexedPriorityQueue([("a", 3), ("b", 2), ("a", 1)])
+    assert len(pqueue) == 2
+    assert pqueue.peek() == ("a", 1)
+
+
+def test_indexed_update_priority():
+    pqueue = IndexedPriorityQueue([("a", 1), ("b", 2), ("c", 3)])
+    pqueue.insert("c", 0)
+    assert pqueue.peek() == ("c", 0)
+    pqueue.insert("c", 10)
+    assert pqueue.peek() == ("a", 1)
+    assert pqueue.get_priority("c") == 10
+    assert len(pqueue) == 3
+    assert [pqueue.pull() for _ in range(3)] == ["a", "b", "c"]
+
+
+def test_indexed_random_operations():
+    rng = random.Random(7)
+    pqueue = IndexedPriorityQueue()
+    reference = {}
+    for _ in range(5000):
+        op = rng.random()
+        value = rng.randrange(100)
+        if op < 0.6:
+            priority = rng.randrange(1000)
+            pqueue.insert(value, priority)
+            reference[value] = priority
+        elif op < 0.8 and value in reference:
+            pqueue.remove(value)
+            del reference[value]
+        elif reference:
+            value, priority = pqueue.peek()
+            assert priority == min(reference.values())
+            assert pqueue.pull() == value
+            del reference[value]
+        assert len(pqueue) == len(reference)
+        assert ("missing" in pqueue) is False
+    check_heap_invariant(pqueue)
@@ -0,0 +1,828 @@
+import argparse
+import gzip
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import tempfile
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+from string import punctuation
+from threading import Thread, Lock
+
+import requests
+from bs4 import BeautifulSoup
+
+from client import Client
+from html_text import TEXT_BACKENDS
+from protocol import (
+    MessageStream, BUFFER_SIZE, FRAMINGS, NUL_FRAMING, BUSY_STATUS, COMPRESSIONS,
+)
+from server import Server, HTMLParser
+from top_words import count_top_words
+from url_stream import FingerprintSet
+
+
+class Timer:
+    def __init__(self, description: str):
+        self._description = description
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter()
+        total_time = str(round(end - self._start, 5))
+        print(f"{self._description}: {total_time}")
+
+
+def generate_html_page(n_words: int) -> str:
+    words = ' '.join(f'word{i % 100}' for i in range(n_words))
+    return f'<!DOCTYPE html><html><body><p>{words}</p></body></html>'
+
+
+def generate_wiki_page(n_sections: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    vocabulary = [f'word{i}' for i in range(2000)] + ['the', 'of', 'and', 'in']
+
+    def sentence() -> str:
+        words = []
+        for word in rnd.choices(vocabulary, k=rnd.randint(5, 25)):
+            kind = rnd.random()
+            if kind < 0.1:
+                words.append(f'<a href="/wiki/{word}" title="{word}">{word}</a>')
+            elif kind < 0.13:
+                words.append(f'{word}&amp;')
+            elif kind < 0.15:
+                words.append(f'&#8220;{word}&#8221;')
+            elif kind < 0.18:
+                words.append(f'<b>{word}</b>,')
+            else:
+                words.append(word)
+        return ' '.join(words) + '.<sup class="reference"><a href="#cite">[1]</a></sup> '
+
+    sections = []
+    for i in range(n_sections):
+        sections.append(f'<h2><span class="mw-headline" id="s{i}">Section {i}</span></h2>')
+        for _ in range(4):
+            sections.append('<p>' + ''.join(sentence() for _ in range(4)) + '</p>\n')
+        rows = ''.join(
+            f'<tr><td>{rnd.choice(vocabulary)}</td><td>{rnd.randint(0, 999)}</td></tr>'
+            for _ in range(5)
+        )
+        sections.append(
+            f'<table class="wikitable"><tr><th>Key</th><th>Value</th></tr>{rows}</table>\n'
+            '<!-- NewPP limit report -->\n<script>mw.loader.load("ext");</script>'
+        )
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">'
+        '<title>Page - Wikipedia</title><style>.mw-body{margin:0 auto;}</style>'
+        '<script>var RLCONF={"wgTitle":"Page <b>"};</script></head><body>'
+        + ''.join(sections) + '</body></html>'
+    )
+
+
+# Simulates a rate-limited host: requests above `max_concurrent` get 429.
+class ConcurrencyLimit:
+    def __init__(self, max_concurrent: int):
+        self._max_concurrent = max_concurrent
+        self._active = 0
+        self._lock = Lock()
+        self.n_throttled = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._active >= self._max_concurrent:
+                self.n_throttled += 1
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    page = generate_html_page(1000).encode('utf-8')
+    connect_delay = 0.0
+    delay = 0.0
+    limit = None
+    gzip_page = None
+
+    def setup(self):
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        if self.limit is None:
+            self._send_page()
+        elif self.limit.acquire():
+            try:
+                self._send_page()
+            finally:
+                self.limit.release()
+        else:
+            self.send_response(429)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def _send_page(self):
+        time.sleep(self.delay)
+        page = self.page
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if self.gzip_page is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            page = self.gzip_page
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInThreadingHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+
+
+class StandInHTTPServer:
+    def __init__(self, connect_delay: float = 0.0, n_words: int = 1000,
+                 page: str = None, delay: float = 0.0,
+                 limit: ConcurrencyLimit = None, use_gzip: bool = False):
+        if page is None:
+            page = generate_html_page(n_words)
+        page = page.encode('utf-8')
+        handler = type(
+            'Handler',
+            (StandInRequestHandler,),
+            {
+                'connect_delay': connect_delay,
+                'page': page,
+                'delay': delay,
+                'limit': limit,
+                'gzip_page': gzip.compress(page) if use_gzip else None,
+            },
+        )
+        self._http_server = StandInThreadingHTTPServer(('localhost', 0), handler)
+        self._thread = Thread(target=self._http_server.serve_forever)
+
+    @property
+    def port(self) -> int:
+        return self._http_server.server_port
+
+    def get_url(self, i: int) -> str:
+        return f'http://localhost:{self.port}/page_{i}.html'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        self._thread.join()
+
+
+class ThrottledRelay:
+    # Forwards connections to a local port, sending at most `rate` bytes
+    # per second in each direction of every connection.
+    CHUNK_SIZE = 16384
+
+    def __init__(self, target_port: int, rate: float):
+        self._target_port = target_port
+        self._rate = rate
+        self._listener = socket.create_server(('localhost', 0))
+        self._listener.settimeout(0.1)
+        self.port = self._listener.getsockname()[1]
+        self._thread = Thread(target=self._accept, daemon=True)
+        self._stopped = False
+
+    def _accept(self):
+        while not self._stopped:
+            try:
+                sock, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            sock.settimeout(None)
+            target = socket.create_connection(('localhost', self._target_port))
+            for src, dst in ((sock, target), (target, sock)):
+                Thread(target=self._pump, args=(src, dst), daemon=True).start()
+
+    def _pump(self, src: socket.socket, dst: socket.socket):
+        try:
+            while True:
+                data = src.recv(self.CHUNK_SIZE)
+                if not data:
+                    break
+                time.sleep(len(data) / self._rate)
+                dst.sendall(data)
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped = True
+        self._thread.join()
+        self._listener.close()
+
+
+def compare_connection_pooling(args):
+    with StandInHTTPServer(connect_delay=args.connect_delay) as http_server:
+        urls = [http_server.get_url(i) for i in range(args.N)]
+
+        with Timer(f"{args.N} downloads, new connection per url"):
+            for url in urls:
+                response = requests.get(url, timeout=Server.FETCH_TIMEOUT)
+                HTMLParser(response.text).get_top_words(5)
+
+        server = Server(1, 5)
+        with Timer(f"{args.N} downloads, pooled keep-alive session"):
+            for url in urls:
+                server._process_query(url)
+        server._close_http_session()
+
+
+def compare_client_modes(args):
+    modes = [
+        ("one connection per url", dict(persistent=False)),
+        (f"pipelined, depth {args.pipeline_depth}",
+         dict(pipeline_depth=args.pipeline_depth)),
+        (f"batches of {args.batch_size} urls",
+         dict(pipeline_depth=args.pipeline_depth, batch_size=args.batch_size)),
+    ]
+    for name in ('server', 'client'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    with StandInHTTPServer(n_words=args.n_words) as http_server, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        urls_filename = os.path.join(tmp_dir, 'urls.txt')
+        with open(urls_filename, 'w') as f:
+            for i in range(args.N):
+                f.write(f'{http_server.get_url(i)}\n')
+
+        for port, (description, client_kwargs) in enumerate(modes, args.port):
+            server = Server(args.workers, 5, port=port, timeout=0.5)
+            th_server = Thread(target=server.run)
+            th_server.start()
+            time.sleep(0.3)
+            client = Client(args.threads, urls_filename, port=port, **client_kwargs)
+            with Timer(f"{args.N} urls, {description}"):
+                client.run()
+            th_server.join()
+
+
+def receive_by_chunks(sock: socket.socket) -> str:
+    data = []
+    chunk = sock.recv(BUFFER_SIZE).decode('utf-8')
+    while not chunk.endswith('\0'):
+        data.append(chunk)
+        chunk = sock.recv(BUFFER_SIZE).decode('utf-8')
+    data.append(chunk[:-1])
+    return ''.join(data)
+
+
+def send_messages(sock: socket.socket, framing: str, message: str, n_messages: int):
+    stream = MessageStream(sock)
+    stream.set_framing(framing)
+    for _ in range(n_messages):
+        stream.send(message)
+
+
+def receive_messages(framing: str, message: str, n_messages: int,
+                     n_connections: int, receive=None) -> float:
+    elapsed = 0.0
+    for _ in range(n_connections):
+        sock_a, sock_b = socket.socketpair()
+        with sock_a, sock_b:
+            sender = Thread(
+                target=send_messages, args=(sock_a, framing, message, n_messages)
+            )
+            sender.start()
+            start = time.perf_counter()
+            if receive is None:
+                stream = MessageStream(sock_b)
+                stream.set_framing(framing)
+                receive = lambda sock: stream.receive()
+            for _ in range(n_messages):
+                receive(sock_b)
+            elapsed += time.perf_counter() - start
+            sender.join()
+        receive = None if receive is not receive_by_chunks else receive
+    return elapsed
+
+
+def compare_framings(args):
+    message = 'x' * args.size
+    prefix = f"{args.N} messages of {args.size} bytes"
+    elapsed = receive_messages(NUL_FRAMING, message, 1, args.N, receive_by_chunks)
+    print(f"{prefix}, connection per message, decode every chunk: {elapsed:.5f}")
+    for framing in FRAMINGS:
+        elapsed = receive_messages(framing, message, 1, args.N)
+        print(f"{prefix}, connection per message, {framing} framing: {elapsed:.5f}")
+    for framing in FRAMINGS:
+        elapsed = receive_messages(framing, message, args.N, 1)
+        print(f"{prefix}, one connection, {framing} framing: {elapsed:.5f}")
+
+
+def compare_parse_processes(args):
+    for name in ('server', 'client'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    page = generate_wiki_page(args.sections)
+    with StandInHTTPServer(page=page) as http_server, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        urls_filename = os.path.join(tmp_dir, 'urls.txt')
+        with open(urls_filename, 'w') as f:
+            for i in range(args.N):
+                f.write(f'{http_server.get_url(i)}\n')
+
+        prefix = f"{args.N} pages of {len(page)} chars, {args.workers} workers"
+        for port, n_processes in enumerate((0, args.processes), args.port):
+            server = Server(
+                args.workers, 5, port=port, timeout=0.5, n_processes=n_processes
+            )
+            th_server = Thread(target=server.run)
+            th_server.start()
+            time.sleep(0.3)
+            client = Client(args.threads, urls_filename, port=port)
+            description = (
+                f"{n_processes} parsing processes" if n_processes
+                else "parsing in worker threads"
+            )
+            with Timer(f"{prefix}, {description}"):
+                client.run()
+            th_server.join()
+
+
+def compare_result_cache(args):
+    logging.getLogger('server').setLevel(logging.WARNING)
+    page = generate_wiki_page(args.sections)
+    with StandInHTTPServer(page=page) as http_server:
+        urls = [http_server.get_url(i % args.distinct) for i in range(args.N)]
+        for cache_size in (0, args.distinct):
+            server = Server(args.workers, 5, cache_size=cache_size)
+            chunks = [urls[i::args.workers] for i in range(args.workers)]
+            workers = [
+                Thread(target=lambda chunk: [server._process_query(url) for url in chunk],
+                       args=(chunk,))
+                for chunk in chunks
+            ]
+            description = f"cache of {cache_size} urls" if cache_size else "no cache"
+            with Timer(f"{args.N} queries of {args.distinct} urls, {description}"):
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+
+
+def send_legacy_request(port: int, url: str, latencies: list, n_busy: list):
+    start = time.perf_counter()
+    try:
+        with socket.create_connection(('localhost', port)) as sock:
+            stream = MessageStream(sock)
+            stream.send(url)
+            reply = stream.receive()
+    except OSError:
+        reply = None
+    if reply == BUSY_STATUS or reply is None:
+        n_busy.append(1)
+    else:
+        latencies.append(time.perf_counter() - start)
+
+
+def compare_admission_control(args):
+    logging.getLogger('server').setLevel(logging.WARNING)
+    page = generate_wiki_page(args.sections)
+    watermarks = [(Server.MAX_TASKS_IN_QUEUE, "no admission control"),
+                  (args.watermark, f"queue watermark {args.watermark}")]
+    with StandInHTTPServer(page=page) as http_server:
+        for port, (watermark, description) in enumerate(watermarks, args.port):
+            server = Server(
+                args.workers, 5, port=port, timeout=0.5, cache_size=0,
+                queue_watermark=watermark,
+            )
+            # The server runs in its own process so that the parsing threads
+            # do not slow down the load generator.
+            server_process = multiprocessing.Process(target=server.run)
+            server_process.start()
+            time.sleep(0.3)
+            latencies, n_busy = [], []
+            senders = [
+                Thread(target=send_legacy_request,
+                       args=(port, http_server.get_url(i), latencies, n_busy))
+                for i in range(args.N)
+            ]
+            start = time.perf_counter()
+            for sender in senders:
+                sender.start()
+                time.sleep(args.interval)
+            for sender in senders:
+                sender.join()
+            elapsed = time.perf_counter() - start
+            server_process.join()
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] if latencies else 0.0
+            p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+            print(
+                f"{args.N} requests, {description}: {round(elapsed, 5)} s, "
+                f"{len(latencies)} served, {len(n_busy)} busy, "
+                f"p50 {round(p50, 4)} s, p99 {round(p99, 4)} s"
+            )
+
+
+def compare_worker_pools(args):
+    for name in ('server', 'client'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    pools = [(args.workers, "fixed pool"), (args.min_workers, "elastic pool")]
+    with StandInHTTPServer(connect_delay=args.connect_delay) as http_server, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        urls_filename = os.path.join(tmp_dir, 'urls.txt')
+        with open(urls_filename, 'w') as f:
+            for i in range(args.N):
+                f.write(f'{http_server.get_url(i)}\n')
+
+        for port, (min_workers, description) in enumerate(pools, args.port):
+            server = Server(
+                args.workers, 5, port=port, timeout=2 * args.idle_timeout + 1,
+                cache_size=0, min_workers=min_workers, idle_timeout=args.idle_timeout,
+            )
+            th_server = Thread(target=server.run)
+            th_server.start()
+            time.sleep(0.3)
+            # One connection per url keeps the server accepting during the burst.
+            client = Client(args.threads, urls_filename, port=port, persistent=False)
+            n_before = client.get_server_stats()['workers']
+            with Timer(f"{args.N} urls, {description}"):
+                client.run()
+            time.sleep(2 * args.idle_timeout + 0.5)
+            stats = client.get_server_stats()
+            print(
+                f"{description}: {n_before} workers before the burst, "
+                f"{stats['maxima']['workers']} at peak, "
+                f"{stats['workers']} after idle timeout"
+            )
+            th_server.join()
+
+
+def compare_host_limits(args):
+    for name in ('server', 'client'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    limit = ConcurrencyLimit(args.host_limit)
+    modes = [(0, "no per-host limit"),
+             (args.host_limit, f"at most {args.host_limit} urls per host")]
+    with StandInHTTPServer(delay=args.delay, limit=limit) as busy_host, \
+            StandInHTTPServer(delay=args.delay) as other_host, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        urls_filename = os.path.join(tmp_dir, 'urls.txt')
+        with open(urls_filename, 'w') as f:
+            for i in range(args.N):
+                http_server = other_host if i % 5 == 4 else busy_host
+                f.write(f'{http_server.get_url(i)}\n')
+
+        for port, (max_per_host, description) in enumerate(modes, args.port):
+            server = Server(args.workers, 5, port=port, timeout=0.5, cache_size=0)
+            th_server = Thread(target=server.run)
+            th_server.start()
+            time.sleep(0.3)
+            client = Client(args.threads, urls_filename, port=port,
+                            max_per_host=max_per_host)
+            limit.n_throttled = 0
+            start = time.perf_counter()
+            client.run()
+            elapsed = time.perf_counter() - start
+            th_server.join()
+            n_errors = client._stats.get_counter('errors')
+            print(
+                f"{args.N} urls, {description}: {round(elapsed, 5)} s, "
+                f"{round((args.N - n_errors) / elapsed, 1)} pages/s, "
+                f"{n_errors} errors, {limit.n_throttled} throttled requests"
+            )
+
+
+def compare_compression(args):
+    for name in ('server', 'client'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    modes = [(False, None), (True, None)]
+    modes += [(True, compression) for compression in COMPRESSIONS]
+    page = generate_wiki_page(args.sections)
+    with StandInHTTPServer(page=page) as identity_host, \
+            StandInHTTPServer(page=page, use_gzip=True) as gzip_host, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        for port, (use_gzip, compression) in enumerate(modes, args.port):
+            http_server = gzip_host if use_gzip else identity_host
+            with ThrottledRelay(http_server.port, args.rate) as upstream, \
+                    ThrottledRelay(port, args.rate) as relay:
+                urls_filename = os.path.join(tmp_dir, 'urls.txt')
+                with open(urls_filename, 'w') as f:
+                    for i in range(args.N):
+                        f.write(f'http://localhost:{upstream.port}/page_{i}.html\n')
+                server = Server(
+                    args.workers, args.top, port=port, timeout=1, cache_size=0,
+                    compression=compression is not None,
+                )
+                th_server = Thread(target=server.run)
+                th_server.start()
+                time.sleep(0.3)
+                client = Client(args.threads, urls_filename, port=relay.port,
+                                batch_size=args.batch_size)
+                client._compressions = [compression] if compression else None
+                start = time.perf_counter()
+                client.run()
+                elapsed = time.perf_counter() - start
+                th_server.join()
+            description = (
+                f"{'gzip' if use_gzip else 'identity'} upstream, "
+                f"{compression or 'uncompressed'} replies"
+            )
+            print(
+                f"{args.N} pages, top {args.top} words, {description}: "
+                f"{round(elapsed, 5)} s, {round(args.N / elapsed, 1)} pages/s, "
+                f"{server._stats.get_counter('download_bytes')} bytes downloaded, "
+                f"{client._stats.get_counter('bytes_received')} bytes of replies"
+            )
+
+
+def read_lines_into_queue(filename: str):
+    task_queue = queue.Queue(Client.MAX_TASKS_IN_QUEUE + 1)
+
+    def drain():
+        while task_queue.get() != Client.THREAD_KILLER_TASK:
+            pass
+
+    consumer = Thread(target=drain)
+    consumer.start()
+    with open(filename, 'r') as f:
+        for line in f:
+            task_queue.put(line.strip())
+    task_queue.put(Client.THREAD_KILLER_TASK)
+    consumer.join()
+
+
+def stream_urls(filename: str, batch_size: int, dedup: bool):
+    client = Client(1, filename, max_per_host=0, dedup=dedup, progress_interval=0)
+    client._start_task_queue_constructor()
+    task_queue = client._task_queue
+    url = task_queue.get()
+    while url != Client.THREAD_KILLER_TASK:
+        for taken in [url] + task_queue.get_many(batch_size - 1):
+            task_queue.task_done(taken)
+        url = task_queue.get()
+    client._stop_task_queue_constructor()
+
+
+def get_peak_memory(build) -> int:
+    tracemalloc.start()
+    build()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def compare_url_ingestion(args):
+    logging.getLogger('client').setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        urls_filename = os.path.join(tmp_dir, 'urls.txt')
+        with open(urls_filename, 'w') as f:
+            for i in range(args.N):
+                f.write(f'https://host{i % 10}.org/wiki/Page_{i % args.distinct}\n')
+        prefix = f"{args.N} lines, {args.distinct} distinct urls"
+
+        with Timer(f"{prefix}, line by line into a queue"):
+            read_lines_into_queue(urls_filename)
+        with Timer(f"{prefix}, blocks, batches of {args.batch_size}, no dedup"):
+            stream_urls(urls_filename, args.batch_size, dedup=False)
+        with Timer(f"{prefix}, blocks, batches of {args.batch_size}, dedup"):
+            stream_urls(urls_filename, args.batch_size, dedup=True)
+
+    # The urls are created inside the traced function: a set of strings
+    # keeps them alive, the fingerprint set does not.
+    for description, seen_class in (("set of strings", set),
+                                     ("fingerprint set", FingerprintSet)):
+        def build():
+            seen = seen_class()
+            for i in range(args.distinct):
+                seen.add(f'https://host{i % 10}.org/wiki/Page_{i}')
+        peak = get_peak_memory(build)
+        print(f"{args.distinct} distinct urls, {description}: "
+              f"{round(peak / 2 ** 20, 1)} MiB")
+
+
+def get_top_words_bs4(doc: str, n_top: int):
+    text = BeautifulSoup(doc, features="html.parser").get_text()
+    text = text.translate(text.maketrans('', '', punctuation))
+    return dict(Counter(text.split()).most_common(n_top))
+
+
+def compare_html_backends(args):
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            doc = f.read()
+    else:
+        doc = generate_wiki_page(args.sections)
+    prefix = f"{args.N} pages of {len(doc)} chars"
+    with Timer(f"{prefix}, BeautifulSoup"):
+        for _ in range(args.N):
+            expected = get_top_words_bs4(doc, args.n_top)
+    for backend in TEXT_BACKENDS:
+        with Timer(f"{prefix}, {backend}"):
+            for _ in range(args.N):
+                result = HTMLParser(doc, backend).get_top_words(args.n_top)
+        if list(result.items()) != list(expected.items()):
+            print(f"{backend} top words differ from BeautifulSoup: {result}")
+
+
+def iter_zipf_words(n_words: int, cum_weights: list, seed: int = 0):
+    rnd = random.Random(seed)
+    population = range(len(cum_weights))
+    chunk_size = 10_000
+    for start in range(0, n_words, chunk_size):
+        size = min(chunk_size, n_words - start)
+        for i in rnd.choices(population, cum_weights=cum_weights, k=size):
+            yield f'word{i}'
+
+
+def compare_top_words(args):
+    weights = (1 / rank for rank in range(1, args.vocabulary + 1))
+    cum_weights = list(itertools.accumulate(weights))
+    prefix = f"{args.N} words of {args.vocabulary} distinct"
+    expected = None
+    for error_bound in [None] + args.error_bounds:
+        start = time.perf_counter()
+        result = count_top_words(
+            iter_zipf_words(args.N, cum_weights), args.n_top, error_bound
+        )
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        count_top_words(iter_zipf_words(args.N, cum_weights), args.n_top, error_bound)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        mode = "exact" if error_bound is None else f"space-saving, error {error_bound}"
+        print(f"{prefix}, {mode}: {round(elapsed, 5)} s, peak {peak // 1024} KiB")
+        if expected is None:
+            expected = result
+        elif list(result) != list(expected):
+            print(f"top words differ from exact: {result}")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='Server benchmark')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    pooling_parser = subparsers.add_parser(
+        'pooling', help="url downloading with and without connection reuse"
+    )
+    pooling_parser.add_argument("N", type=int, action="store")
+    pooling_parser.add_argument(
+        "--connect-delay", type=float, default=0.005,
+        help="simulated handshake time of the stand-in server in seconds",
+    )
+    pooling_parser.set_defaults(func=compare_connection_pooling)
+
+    throughput_parser = subparsers.add_parser(
+        'throughput', help="client-server throughput of the request modes"
+    )
+    throughput_parser.add_argument("N", type=int, action="store")
+    throughput_parser.add_argument("--workers", type=int, default=10)
+    throughput_parser.add_argument("--threads", type=int, default=4)
+    throughput_parser.add_argument("--pipeline-depth", type=int, default=8)
+    throughput_parser.add_argument("--batch-size", type=int, default=100)
+    throughput_parser.add_argument("--n-words", type=int, default=10)
+    throughput_parser.add_argument("--port", type=int, default=5100)
+    throughput_parser.set_defaults(func=compare_client_modes)
+
+    framing_parser = subparsers.add_parser(
+        'framing', help="message receiving with different framings"
+    )
+    framing_parser.add_argument("N", type=int, action="store")
+    framing_parser.add_argument("--size", type=int, default=2 ** 20)
+    framing_parser.set_defaults(func=compare_framings)
+
+    parsing_parser = subparsers.add_parser(
+        'parsing', help="top words of a large page with different html backends"
+    )
+    parsing_parser.add_argument("N", type=int, action="store")
+    parsing_parser.add_argument(
+        "--file", type=str, default=None,
+        help="saved html page, e.g. a Wikipedia article; generated if not set",
+    )
+    parsing_parser.add_argument("--sections", type=int, default=200)
+    parsing_parser.add_argument("-k", type=int, default=10, dest='n_top')
+    parsing_parser.set_defaults(func=compare_html_backends)
+
+    processes_parser = subparsers.add_parser(
+        'processes', help="server throughput with and without parsing processes"
+    )
+    processes_parser.add_argument("N", type=int, action="store")
+    processes_parser.add_argument("--workers", type=int, default=10)
+    processes_parser.add_argument("--threads", type=int, default=4)
+    processes_parser.add_argument("--processes", type=int, default=os.cpu_count())
+    processes_parser.add_argument("--sections", type=int, default=20)
+    processes_parser.add_argument("--port", type=int, default=5200)
+    processes_parser.set_defaults(func=compare_parse_processes)
+
+    top_words_parser = subparsers.add_parser(
+        'topk', help="exact and approximate top words of a long word stream"
+    )
+    top_words_parser.add_argument("N", type=int, action="store")
+    top_words_parser.add_argument("--vocabulary", type=int, default=1_000_000)
+    top_words_parser.add_argument(
+        "--error-bounds", type=float, nargs='+', default=[0.001, 0.0001],
+    )
+    top_words_parser.add_argument("-k", type=int, default=10, dest='n_top')
+    top_words_parser.set_defaults(func=compare_top_words)
+
+    cache_parser = subparsers.add_parser(
+        'cache', help="repeated urls with and without the result cache"
+    )
+    cache_parser.add_argument("N", type=int, action="store")
+    cache_parser.add_argument("--distinct", type=int, default=50)
+    cache_parser.add_argument("--workers", type=int, default=10)
+    cache_parser.add_argument("--sections", type=int, default=20)
+    cache_parser.set_defaults(func=compare_result_cache)
+
+    overload_parser = subparsers.add_parser(
+        'overload', help="latency under overload with and without admission control"
+    )
+    overload_parser.add_argument("N", type=int, action="store")
+    overload_parser.add_argument("--workers", type=int, default=4)
+    overload_parser.add_argument("--watermark", type=int, default=20)
+    overload_parser.add_argument(
+        "--interval", type=float, default=0.002,
+        help="seconds between new client requests",
+    )
+    overload_parser.add_argument("--sections", type=int, default=20)
+    overload_parser.add_argument("--port", type=int, default=5300)
+    overload_parser.set_defaults(func=compare_admission_control)
+
+    workers_parser = subparsers.add_parser(
+        'workers', help="burst handling of a fixed and an elastic worker pool"
+    )
+    workers_parser.add_argument("N", type=int, action="store")
+    workers_parser.add_argument("--workers", type=int, default=100)
+    workers_parser.add_argument("--min-workers", type=int, default=4)
+    workers_parser.add_argument("--idle-timeout", type=float, default=1.0)
+    workers_parser.add_argument("--threads", type=int, default=20)
+    workers_parser.add_argument(
+        "--connect-delay", type=float, default=0.02,
+        help="simulated handshake time of the stand-in server in seconds",
+    )
+    workers_parser.add_argument("--port", type=int, default=5400)
+    workers_parser.set_defaults(func=compare_worker_pools)
+
+    hosts_parser = subparsers.add_parser(
+        'hosts', help="mixed url list with and without the per-host limit"
+    )
+    hosts_parser.add_argument("N", type=int, action="store")
+    hosts_parser.add_argument(
+        "--host-limit", type=int, default=4,
+        help="concurrent requests the busy host serves before answering 429",
+    )
+    hosts_parser.add_argument("--delay", type=float, default=0.02)
+    hosts_parser.add_argument("--workers", type=int, default=40)
+    hosts_parser.add_argument("--threads", type=int, default=4)
+    hosts_parser.add_argument("--port", type=int, default=5500)
+    hosts_parser.set_defaults(func=compare_host_limits)
+
+    ingest_parser = subparsers.add_parser(
+        'ingest', help="reading a large url file line by line and in blocks"
+    )
+    ingest_parser.add_argument("N", type=int, action="store")
+    ingest_parser.add_argument("--distinct", type=int, default=100000)
+    ingest_parser.add_argument("--batch-size", type=int, default=100)
+    ingest_parser.set_defaults(func=compare_url_ingestion)
+
+    compression_parser = subparsers.add_parser(
+        'compression', help="bytes on the wire with and without compression"
+    )
+    compression_parser.add_argument("N", type=int, action="store")
+    compression_parser.add_argument("--top", type=int, default=500)
+    compression_parser.add_argument(
+        "--rate", type=float, default=1_000_000,
+        help="bytes per second of every throttled loopback connection",
+    )
+    compression_parser.add_argument("--batch-size", type=int, default=10)
+    compression_parser.add_argument("--workers", type=int, default=10)
+    compression_parser.add_argument("--threads", type=int, default=2)
+    compression_parser.add_argument("--sections", type=int, default=20)
+    compression_parser.add_argument("--port", type=int, default=5600)
+    compression_parser.set_defaults(func=compare_compression)
+    return parser
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parser.parse_args()
+    args.func(args)
@@ -1,10 +1,21 @@
 import argparse
+import heapq
 import json
+import os
 import socket
 import queue
-from threading import Thread
+import time
+from threading import Thread, Event
+from typing import Dict, List, Optional, Tuple
 
+from host_scheduler import HostScheduler
 from logger import init_logger
+from metrics import Stats
+from protocol import (
+    MessageStream, encode_hello, decode_hello, choose_framing, choose_compression,
+    FRAMINGS, LENGTH_FRAMING, NUL_FRAMING, BUSY_STATUS, COMPRESSIONS,
+)
+from url_stream import FingerprintSet, read_url_blocks
 
 
 logger = init_logger('logging_conf.yaml', 'client')
@@ -17,6 +28,52 @@ def get_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument('n_threads', type=int, action='store')
     parser.add_argument('filename', type=str, action='store')
+    parser.add_argument(
+        '-p', type=int, action='store', dest='pipeline_depth',
+        default=Client.PIPELINE_DEPTH,
+        help='number of requests sent over one connection before reading replies',
+    )
+    parser.add_argument(
+        '--legacy', action='store_false', dest='persistent',
+        help='open a new connection for every url',
+    )
+    parser.add_argument(
+        '-b', type=int, action='store', dest='batch_size',
+        default=Client.BATCH_SIZE,
+        help='number of urls sent in one request message',
+    )
+    parser.add_argument(
+        '--framing', type=str, action='store', dest='framing',
+        choices=FRAMINGS, default=LENGTH_FRAMING,
+        help='preferred message framing of a persistent connection',
+    )
+    parser.add_argument(
+        '--no-compression', action='store_false', dest='compression',
+        help='do not offer compression of messages to the server',
+    )
+    parser.add_argument(
+        '--max-per-host', type=int, action='store', dest='max_per_host',
+        default=Client.MAX_PER_HOST,
+        help='maximum number of urls of one host in flight, 0 for no limit',
+    )
+    parser.add_argument(
+        '--host-rate', type=float, action='store', dest='host_rate',
+        default=None,
+        help='maximum number of urls of one host sent per second',
+    )
+    parser.add_argument(
+        '--keep-duplicates', action='store_false', dest='dedup',
+        help='send every line of the input file, even repeated urls',
+    )
+    parser.add_argument(
+        '--progress-interval', type=float, action='store', dest='progress_interval',
+        default=Client.PROGRESS_INTERVAL,
+        help='seconds between progress reports, 0 to disable them',
+    )
+    parser.add_argument(
+        '--server-stats', action='store_true', dest='server_stats',
+        help='request and log latency statistics of the server after the run',
+    )
     return parser
 
 
@@ -25,9 +82,22 @@ class Client:
     BUFFER_SIZE = 4096
     MAX_TASKS_IN_QUEUE = 1000
     THREAD_KILLER_TASK = '_STOP'
+    PIPELINE_DEPTH = 8
+    BATCH_SIZE = 1
+    MAX_PER_HOST = 16
+    MAX_PENDING_PER_HOST = MAX_TASKS_IN_QUEUE // 4
+    READ_BLOCK_SIZE = 1 << 20
+    PROGRESS_INTERVAL = 10.0
+    MAX_BUSY_RETRIES = 5
+    BUSY_BACKOFF_FACTOR = 0.1
 
     def __init__(self, n_threads: int, filename: str, host: str = 'localhost',
-                 port: int = 5000):
+                 port: int = 5000, pipeline_depth: int = PIPELINE_DEPTH,
+                 persistent: bool = True, batch_size: int = BATCH_SIZE,
+                 framing: str = LENGTH_FRAMING, max_per_host: int = MAX_PER_HOST,
+                 host_rate: float = None, dedup: bool = True,
+                 progress_interval: float = PROGRESS_INTERVAL,
+                 compression: bool = True):
         logger.info('Start client application.')
         if n_threads > Client.MAX_THREADS:
             msg = (
@@ -45,33 +115,117 @@ class Client:
         self._workers = None
         self._urls = None
         self._task_queue = None
+        self._pipeline_depth = max(1, pipeline_depth)
+        self._persistent = persistent
+        self._batch_size = max(1, batch_size)
+        self._framings = [framing] if framing == NUL_FRAMING else [framing, NUL_FRAMING]
+        self._stats = Stats()
+        self._compressions = list(COMPRESSIONS) if compression else None
+        self._max_per_host = max_per_host or None
+        self._host_rate = host_rate
+        self._dedup = dedup
+        self._progress_interval = progress_interval
+        self._progress_reporter = None
+        self._progress_stop = Event()
+        self._input_size = 0
+        self._bytes_read = 0
+        self._n_urls_read = 0
+        self._n_duplicates = 0
 
     def run(self):
         logger.info('Start workers.')
         self._start_task_queue_constructor()
+        self._start_progress_reporter()
         self._start_workers()
         self._stop_workers()
         self._stop_task_queue_constructor()
+        self._stop_progress_reporter()
+        self._log_progress()
+        self._log_latency()
         logger.info('Stop client application.')
 
+    def _log_latency(self):
+        latency = self._stats.get_histogram('request').summary()
+        logger.info(
+            'Received %d replies, %d errors. '
+            'Latency: p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms',
+            latency['count'], self._stats.get_counter('errors'),
+            latency['p50'] * 1000, latency['p95'] * 1000,
+            latency['p99'] * 1000, latency['max'] * 1000,
+        )
+
+    def get_server_stats(self) -> dict:
+        with socket.create_connection((self._host, self._port)) as sock:
+            stream = MessageStream(sock)
+            stream.send(encode_hello(self._framings))
+            hello = decode_hello(stream.receive() or '')
+            if hello is None:
+                raise ConnectionError('Server does not support stats requests.')
+            stream.set_framing(choose_framing(hello.get('framing', NUL_FRAMING)))
+            stream.send(json.dumps({'id': 0, 'stats': True}))
+            reply = stream.receive()
+        if reply is None:
+            raise ConnectionError('Connection closed by server.')
+        return json.loads(reply)['stats']
+
     def _construct_task_queue(self):
-        self._task_queue = queue.Queue(self.MAX_TASKS_IN_QUEUE + 1)
+        # The file is streamed in blocks: only the bounded queue and the
+        # fingerprints of seen urls are kept in memory.
+        seen = FingerprintSet() if self._dedup else None
         try:
-            with open(self._filename, 'r') as f:
-                for line in f:
-                    self._task_queue.put(line.strip())
+            with open(self._filename, 'rb') as f:
+                self._input_size = os.fstat(f.fileno()).st_size
+                for urls in read_url_blocks(f, self.READ_BLOCK_SIZE):
+                    self._bytes_read = f.tell()
+                    if seen is not None:
+                        n_urls = len(urls)
+                        urls = [url for url in urls if seen.add(url)]
+                        self._n_duplicates += n_urls - len(urls)
+                    self._n_urls_read += len(urls)
+                    self._task_queue.put_many(urls)
         except Exception as e:
             logger.error("Unexpected error occurred during reading file: %s", str(e))
         finally:
             self._task_queue.put(Client.THREAD_KILLER_TASK)
 
     def _start_task_queue_constructor(self):
+        self._task_queue = HostScheduler(
+            Client.THREAD_KILLER_TASK, self.MAX_TASKS_IN_QUEUE,
+            self._max_per_host, self._host_rate,
+            max_pending_per_host=self.MAX_PENDING_PER_HOST,
+        )
         self._task_queue_constructor = Thread(target=self._construct_task_queue)
         self._task_queue_constructor.start()
 
     def _stop_task_queue_constructor(self):
         self._task_queue_constructor.join()
 
+    def _log_progress(self):
+        read_share = self._bytes_read / self._input_size if self._input_size else 1.0
+        logger.info(
+            'Progress: read %.1f%% of input, %d urls queued, %d duplicates skipped, '
+            '%d replies, %d errors.',
+            100 * read_share, self._n_urls_read, self._n_duplicates,
+            self._stats.get_histogram('request').count,
+            self._stats.get_counter('errors'),
+        )
+
+    def _report_progress(self):
+        while not self._progress_stop.wait(self._progress_interval):
+            self._log_progress()
+
+    def _start_progress_reporter(self):
+        self._progress_stop.clear()
+        if self._progress_interval > 0:
+            self._progress_reporter = Thread(target=self._report_progress, daemon=True)
+            self._progress_reporter.start()
+
+    def _stop_progress_reporter(self):
+        self._progress_stop.set()
+        if self._progress_reporter is not None:
+            self._progress_reporter.join()
+            self._progress_reporter = None
+
     def _start_workers(self):
         self._workers = [
             Thread(target=self._process_tasks) for _ in range(self._n_threads)
@@ -84,36 +238,221 @@ class Client:
             worker.join()
 
     def _receive_data(self, connection_socket: socket.socket) -> str:
-        data = []
-        chunk = connection_socket.recv(Client.BUFFER_SIZE).decode('utf-8')
-        while not chunk.endswith('\0'):
-            data.append(chunk)
-            chunk = connection_socket.recv(Client.BUFFER_SIZE).decode('utf-8')
-        data.append(chunk[:-1])
-        data = ''.join(data)
+        data = MessageStream(connection_socket, Client.BUFFER_SIZE).receive()
+        if data is None:
+            raise ConnectionError('Connection closed by server.')
         return data
 
     def _process_url(self, url: str):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        start = time.perf_counter()
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.connect((self._host, self._port))
+                msg = f'{url}\0'
+                sock.sendall(msg.encode('utf-8'))
+                response = self._receive_data(sock)
+        finally:
+            self._task_queue.task_done(url)
+        self._stats.record('request', time.perf_counter() - start)
+        try:
+            result = json.loads(response)
+        except json.decoder.JSONDecodeError:
+            self._stats.count('errors')
+            logger.warning('Bad response from server: %s', response)
+        else:
+            logger.info('%s: %s', url, result)
+
+    def _get_next_url(self, block: bool):
+        try:
+            return self._task_queue.get(block=block)
+        except queue.Empty:
+            return None
+
+    def _open_session(self, url: str):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
             sock.connect((self._host, self._port))
-            msg = f'{url}\0'
-            sock.sendall(msg.encode('utf-8'))
-            response = self._receive_data(sock)
+            stream = MessageStream(sock)
+            stream.send(encode_hello(self._framings, self._compressions))
+            reply = stream.receive()
+        except Exception:
+            sock.close()
+            raise
+        if reply == BUSY_STATUS:
+            sock.close()
+            raise ConnectionRefusedError(BUSY_STATUS)
+        hello = decode_hello(reply) if reply is not None else None
+        if hello is None:
+            sock.close()
+            logger.warning(
+                'Server does not support persistent connections. '
+                'Fall back to one connection per url.'
+            )
+            self._persistent = False
+            self._process_url(url)
+            return None, None
+        stream.set_framing(choose_framing(hello.get('framing', NUL_FRAMING)))
+        stream.set_compression(choose_compression(hello.get('compression')))
+        return sock, stream
+
+    def _open_session_with_retries(self, url: str):
+        # A connection the server was too busy for is opened again after the
+        # backoff of busy replies, (None, None) once the url is given up.
+        retries: List[Tuple[float, str]] = []
+        attempts: Dict[str, int] = {}
+        while True:
+            try:
+                return self._open_session(url)
+            except ConnectionRefusedError as e:
+                if e.args != (BUSY_STATUS,):
+                    raise
+            self._stats.count('busy')
+            self._schedule_retry(retries, attempts, url)
+            if not retries:
+                return None, None
+            retry_at, _ = heapq.heappop(retries)
+            time.sleep(max(0.0, retry_at - time.perf_counter()))
+
+    def _take_batch(self, url: str):
+        batch = [url] + self._task_queue.get_many(self._batch_size - 1)
+        return batch, self._get_next_url(block=False)
+
+    def _send_request(self, stream: MessageStream, request_id: int,
+                      batch: List[str]):
+        if len(batch) == 1:
+            request = {'id': request_id, 'url': batch[0]}
+        else:
+            request = {'id': request_id, 'urls': batch}
+        stream.send(json.dumps(request))
+
+    def _process_session(self, url: str):
+        try:
+            sock, stream = self._open_session_with_retries(url)
+        except Exception:
+            self._task_queue.task_done(url)
+            self._stats.count('errors')
+            raise
+        if stream is None:
+            return
+        in_flight: Dict[int, Tuple[float, Dict[int, str]]] = {}
+        # Urls the server was too busy for: (time of the retry, url), and
+        # the number of busy replies per url.
+        retries: List[Tuple[float, str]] = []
+        attempts: Dict[str, int] = {}
+        request_id = 0
+        with sock:
             try:
-                result = json.loads(response)
-            except json.decoder.JSONDecodeError:
-                logger.warning('Bad response from server: %s', response)
-            else:
-                logger.info('%s: %s', url, result)
+                while url != Client.THREAD_KILLER_TASK or in_flight or retries:
+                    while (
+                            retries
+                            and retries[0][0] <= time.perf_counter()
+                            and len(in_flight) < self._pipeline_depth
+                    ):
+                        _, retry_url = heapq.heappop(retries)
+                        self._start_request(stream, in_flight, request_id, [retry_url])
+                        request_id += 1
+                    while (
+                            url is not None
+                            and url != Client.THREAD_KILLER_TASK
+                            and len(in_flight) < self._pipeline_depth
+                    ):
+                        batch, url = self._take_batch(url)
+                        self._start_request(stream, in_flight, request_id, batch)
+                        request_id += 1
+                    if not in_flight:
+                        if retries:
+                            time.sleep(max(0.0, retries[0][0] - time.perf_counter()))
+                            if url is None:
+                                url = self._get_next_url(block=False)
+                        else:
+                            url = self._get_next_url(block=True)
+                        continue
+                    response = stream.receive()
+                    if response is None:
+                        raise ConnectionError('Connection closed by server.')
+                    busy_url = self._handle_response(in_flight, response, attempts)
+                    if busy_url is not None:
+                        self._schedule_retry(retries, attempts, busy_url)
+                    if url is None:
+                        url = self._get_next_url(block=False)
+            except Exception as e:
+                failed_urls = [
+                    failed_url
+                    for _, pending in in_flight.values()
+                    for failed_url in pending.values()
+                ]
+                failed_urls.extend(retry_url for _, retry_url in retries)
+                if url is not None and url != Client.THREAD_KILLER_TASK:
+                    failed_urls.append(url)
+                for failed_url in failed_urls:
+                    self._task_queue.task_done(failed_url)
+                    self._stats.count('errors')
+                    logger.error(
+                        'Unexpected error occurred while processing url. '
+                        'URL: %s; Exception: %s',
+                        failed_url,
+                        str(e)
+                    )
+            finally:
+                self._stats.count('bytes_sent', stream.n_bytes_sent)
+                self._stats.count('bytes_received', stream.n_bytes_received)
+
+    def _start_request(self, stream: MessageStream,
+                       in_flight: Dict[int, Tuple[float, Dict[int, str]]],
+                       request_id: int, batch: List[str]):
+        # Recorded before sending, so a failed send still releases the urls.
+        in_flight[request_id] = (time.perf_counter(), dict(enumerate(batch)))
+        self._send_request(stream, request_id, batch)
+
+    def _schedule_retry(self, retries: List[Tuple[float, str]],
+                        attempts: Dict[str, int], url: str):
+        attempt = attempts.get(url, 0) + 1
+        if attempt > self.MAX_BUSY_RETRIES:
+            del attempts[url]
+            self._task_queue.task_done(url)
+            self._stats.count('errors')
+            logger.warning('Server is busy, giving up on url: %s', url)
+            return
+        attempts[url] = attempt
+        backoff = self.BUSY_BACKOFF_FACTOR * 2 ** (attempt - 1)
+        heapq.heappush(retries, (time.perf_counter() + backoff, url))
+
+    def _handle_response(self, in_flight: Dict[int, Tuple[float, Dict[int, str]]],
+                         response: str, attempts: Dict[str, int]) -> Optional[str]:
+        # Returns the url the server was busy for: it stays in flight and
+        # is sent again after a backoff.
+        try:
+            message = json.loads(response)
+            sent_at, pending = in_flight[message['id']]
+            url = pending.pop(message.get('index', 0))
+        except (json.decoder.JSONDecodeError, KeyError, TypeError):
+            self._stats.count('errors')
+            logger.warning('Bad response from server: %s', response)
+            return None
+        if not pending:
+            del in_flight[message['id']]
+        if message.get('error') == BUSY_STATUS:
+            self._stats.count('busy')
+            return url
+        attempts.pop(url, None)
+        self._task_queue.task_done(url)
+        self._stats.record('request', time.perf_counter() - sent_at)
+        if 'result' in message:
+            logger.info('%s: %s', url, message['result'])
+        else:
+            self._stats.count('errors')
+            logger.warning('Bad response from server: %s', message.get('error'))
 
     def _process_tasks(self):
         while True:
             url = self._task_queue.get()
             if url == Client.THREAD_KILLER_TASK:
-                self._task_queue.put(Client.THREAD_KILLER_TASK)
                 return
             try:
-                self._process_url(url)
+                if self._persistent:
+                    self._process_session(url)
+                else:
+                    self._process_url(url)
             except Exception as e:
                 logger.error(
                     'Unexpected error occurred while processing url. URL: %s; Exception: %s',
@@ -126,5 +465,18 @@ if __name__ == "__main__":
     parser = get_parser()
     args = parser.parse_args()
 
-    client = Client(args.n_threads, args.filename)
+    client = Client(
+        args.n_threads, args.filename,
+        pipeline_depth=args.pipeline_depth,
+        persistent=args.persistent,
+        batch_size=args.batch_size,
+        framing=args.framing,
+        max_per_host=args.max_per_host,
+        host_rate=args.host_rate,
+        dedup=args.dedup,
+        progress_interval=args.progress_interval,
+        compression=args.compression,
+    )
     client.run()
+    if args.server_stats:
+        logger.info('Server stats: %s', client.get_server_stats())
@@ -0,0 +1,186 @@
+import io
+import queue
+import re
+import tempfile
+import time
+from collections import OrderedDict, deque
+from threading import Condition
+from typing import BinaryIO, Deque, Dict, List, Optional, Tuple
+
+
+# Host and port of an url with or without a scheme, several times faster
+# than urlsplit, which matters for files with millions of urls.
+HOST_PATTERN = re.compile(
+    r'(?:(?:[A-Za-z][A-Za-z0-9+.-]*:)?//)?(?:[^/?#@]*@)?'
+    r'(\[[^\]/?#]*\]|[^/?#:]*)(?::([^/?#]*))?'
+)
+
+
+def get_host(url: str) -> str:
+    host, port = HOST_PATTERN.match(url).groups()
+    host = host.lower()
+    return f'{host}:{int(port)}' if port and port.isdigit() and int(port) else host
+
+
+#  Urls of one host that did not fit into the queue, kept in a temporary
+#  file in arrival order.
+class _Spill:
+    def __init__(self):
+        self.file: BinaryIO = tempfile.TemporaryFile()
+        self.read_pos = 0
+        self.size = 0
+
+    def append(self, url: str):
+        self.file.seek(0, io.SEEK_END)
+        self.file.write(url.encode('utf-8') + b'\n')
+        self.size += 1
+
+    def pop(self) -> str:
+        self.file.seek(self.read_pos)
+        url = self.file.readline()
+        self.read_pos = self.file.tell()
+        self.size -= 1
+        return url[:-1].decode('utf-8')
+
+
+#  Queue of urls that hands them out round-robin across hosts, with at most
+#  `max_per_host` urls of a host in flight and at least 1 / `rate` seconds
+#  between two urls of a host. A url is in flight from get() to task_done().
+#  A host holds at most `max_pending_per_host` of the `maxsize` queued urls,
+#  the rest of its urls wait on disk, so that a slow host does not fill the
+#  queue and block the reader in front of the urls of other hosts.
+class HostScheduler:
+    def __init__(self, stop_task: str, maxsize: int = 0,
+                 max_per_host: Optional[int] = None, rate: Optional[float] = None,
+                 timer=time.monotonic, max_pending_per_host: Optional[int] = None):
+        if max_per_host is not None and max_per_host < 1:
+            raise ValueError(f'Max urls per host must be positive, got {max_per_host}.')
+        if max_pending_per_host is not None and max_pending_per_host < 1:
+            raise ValueError(
+                f'Max pending urls per host must be positive, got {max_pending_per_host}.'
+            )
+        if rate is not None and rate <= 0:
+            raise ValueError(f'Rate must be positive, got {rate}.')
+        self._stop_task = stop_task
+        self._maxsize = maxsize
+        self._max_per_host = max_per_host
+        self._max_pending_per_host = max_pending_per_host
+        self._interval = 1 / rate if rate else 0.0
+        self._timer = timer
+        self._pending: Dict[str, Deque[str]] = OrderedDict()
+        self._in_flight: Dict[str, int] = {}
+        self._next_start: Dict[str, float] = {}
+        self._spills: Dict[str, _Spill] = {}
+        self._size = 0
+        self._closed = False
+        self._condition = Condition()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def put(self, url: str):
+        if url == self._stop_task:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            return
+        self.put_many([url])
+
+    def put_many(self, urls: List[str]):
+        # Takes the lock once per block of urls, not once per url.
+        with self._condition:
+            for url in urls:
+                host = get_host(url)
+                if self._maxsize > 0 and self._size >= self._maxsize:
+                    self._condition.notify_all()
+                    while self._size >= self._maxsize and not self._is_host_full(host):
+                        self._condition.wait()
+                if self._is_host_full(host):
+                    self._spill(host, url)
+                else:
+                    self._append(host, url)
+            self._condition.notify_all()
+
+    def _is_host_full(self, host: str) -> bool:
+        if self._max_pending_per_host is None:
+            return False
+        if host in self._spills:
+            return True
+        return len(self._pending.get(host, ())) >= self._max_pending_per_host
+
+    def _spill(self, host: str, url: str):
+        spill = self._spills.get(host)
+        if spill is None:
+            spill = self._spills[host] = _Spill()
+        spill.append(url)
+
+    def _append(self, host: str, url: str):
+        urls = self._pending.get(host)
+        if urls is None:
+            urls = self._pending[host] = deque()
+        urls.append(url)
+        self._size += 1
+
+    def get(self, block: bool = True) -> str:
+        with self._condition:
+            while True:
+                url, wait = self._pop_ready()
+                if url is not None:
+                    self._condition.notify_all()
+                    return url
+                if self._closed and self._size == 0:
+                    return self._stop_task
+                if not block:
+                    raise queue.Empty
+                self._condition.wait(wait)
+
+    def get_many(self, n: int) -> List[str]:
+        # Up to n urls that can be sent right now, without the stop task.
+        urls = []
+        with self._condition:
+            while len(urls) < n:
+                url, _ = self._pop_ready()
+                if url is None:
+                    break
+                urls.append(url)
+            if urls:
+                self._condition.notify_all()
+        return urls
+
+    def task_done(self, url: str):
+        host = get_host(url)
+        with self._condition:
+            self._in_flight[host] -= 1
+            if not self._in_flight[host]:
+                del self._in_flight[host]
+            self._condition.notify_all()
+
+    def _pop_ready(self) -> Tuple[Optional[str], Optional[float]]:
+        now = self._timer()
+        wait = None
+        for host, urls in self._pending.items():
+            n_in_flight = self._in_flight.get(host, 0)
+            if self._max_per_host is not None and n_in_flight >= self._max_per_host:
+                continue
+            next_start = self._next_start.get(host, now)
+            if next_start > now:
+                wait = next_start - now if wait is None else min(wait, next_start - now)
+                continue
+            url = urls.popleft()
+            spill = self._spills.get(host)
+            if spill is not None:
+                urls.append(spill.pop())
+                self._size += 1
+                if not spill.size:
+                    spill.file.close()
+                    del self._spills[host]
+            if urls:
+                self._pending.move_to_end(host)
+            else:
+                del self._pending[host]
+            self._in_flight[host] = n_in_flight + 1
+            if self._interval:
+                self._next_start[host] = max(next_start, now) + self._interval
+            self._size -= 1
+            return url, None
+        return None, wait
@@ -0,0 +1,182 @@
+#  Text extraction that reproduces BeautifulSoup(doc, 'html.parser').get_text()
+#  without building the tree: strings inside script, style, template, rt and rp
+#  are skipped, whitespace-only strings are collapsed and character references
+#  are resolved the same way bs4 does it.
+
+from html.parser import HTMLParser as StdHTMLParser
+from string import punctuation
+from typing import Iterable, Iterator, List
+
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+PUNCTUATION_TABLE = str.maketrans('', '', punctuation)
+STRING_CONTAINERS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+EMPTY_ELEMENT_TAGS = frozenset(HTMLTreeBuilder.empty_element_tags)
+PRESERVE_WHITESPACE_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+ASCII_SPACES = frozenset('\x20\x0a\x09\x0c\x0d')
+
+
+class TextExtractor(StdHTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings: List[str] = []
+        self._current_data: List[str] = []
+        self._open_tags: List[str] = []
+        self._open_tag_counter = {}
+        self._n_open_containers = 0
+        self._n_open_preserving = 0
+        self._already_closed_empty_element: List[str] = []
+
+    def _end_data(self):
+        if not self._current_data:
+            return
+        data = ''.join(self._current_data)
+        self._current_data = []
+        if not self._n_open_preserving and ASCII_SPACES.issuperset(data):
+            data = '\n' if '\n' in data else ' '
+        if not self._n_open_containers:
+            self.strings.append(data)
+
+    def _push_tag(self, name: str):
+        self._open_tags.append(name)
+        self._open_tag_counter[name] = self._open_tag_counter.get(name, 0) + 1
+        if name in STRING_CONTAINERS:
+            self._n_open_containers += 1
+        if name in PRESERVE_WHITESPACE_TAGS:
+            self._n_open_preserving += 1
+
+    def _pop_to_tag(self, name: str):
+        if not self._open_tag_counter.get(name):
+            return
+        while True:
+            popped = self._open_tags.pop()
+            self._open_tag_counter[popped] -= 1
+            if popped in STRING_CONTAINERS:
+                self._n_open_containers -= 1
+            if popped in PRESERVE_WHITESPACE_TAGS:
+                self._n_open_preserving -= 1
+            if popped == name:
+                return
+
+    def handle_starttag(self, name, attrs, handle_empty_element=True):
+        self._end_data()
+        self._push_tag(name)
+        if handle_empty_element and name in EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(name, check_already_closed=False)
+            self._already_closed_empty_element.append(name)
+
+    def handle_startendtag(self, name, attrs):
+        self.handle_starttag(name, attrs, handle_empty_element=False)
+        self.handle_endtag(name)
+
+    def handle_endtag(self, name, check_already_closed=True):
+        if check_already_closed and name in self._already_closed_empty_element:
+            self._already_closed_empty_element.remove(name)
+            return
+        self._end_data()
+        self._pop_to_tag(name)
+
+    def handle_data(self, data):
+        self._current_data.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(('x', 'X')):
+            code_point = int(name[1:], 16)
+        else:
+            code_point = int(name)
+        data = None
+        if code_point < 256:
+            try:
+                data = bytes([code_point]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code_point)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f'&{name}')
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, data):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith('CDATA['):
+            self.strings.append(data[len('CDATA['):] or ' ')
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+
+def iter_text(doc: str) -> Iterator[str]:
+    extractor = TextExtractor()
+    extractor.feed(doc)
+    extractor.close()
+    yield from extractor.strings
+
+
+def iter_text_selectolax(doc: str) -> Iterator[str]:
+    tree = LexborHTMLParser(doc)
+    tree.strip_tags(list(STRING_CONTAINERS))
+    if tree.root is not None:
+        yield tree.root.text(deep=True, separator='', strip=False)
+
+
+def iter_text_lxml(doc: str) -> Iterator[str]:
+    if not doc.strip():
+        return
+    tree = lxml.html.document_fromstring(doc)
+    etree.strip_elements(tree, *STRING_CONTAINERS, etree.Comment, with_tail=False)
+    yield tree.text_content()
+
+
+TEXT_BACKENDS = {'html.parser': iter_text}
+if LexborHTMLParser is not None:
+    TEXT_BACKENDS['selectolax'] = iter_text_selectolax
+if etree is not None:
+    TEXT_BACKENDS['lxml'] = iter_text_lxml
+
+
+def iter_words(strings: Iterable[str]) -> Iterator[str]:
+    word_start = ''
+    for string in strings:
+        string = string.translate(PUNCTUATION_TABLE)
+        if not string:
+            continue
+        words = string.split()
+        if word_start:
+            if not words or string[0].isspace():
+                yield word_start
+            else:
+                words[0] = word_start + words[0]
+            word_start = ''
+        if words and not string[-1].isspace():
+            word_start = words.pop()
+        yield from words
+    if word_start:
+        yield word_start
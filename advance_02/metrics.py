@@ -0,0 +1,174 @@
+import math
+import time
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Dict, List
+
+
+class LatencyHistogram:
+    # HDR-style buckets of microseconds: exact below 2 ** SUB_BUCKET_BITS,
+    # above that every power of two is split into 2 ** (SUB_BUCKET_BITS - 1)
+    # buckets, so a percentile is off by less than 1 / 64 of its value.
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 2 ** SUB_BUCKET_BITS
+    SUB_BUCKET_HALF_COUNT = SUB_BUCKET_COUNT // 2
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def get_index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return (
+            cls.SUB_BUCKET_COUNT
+            + (shift - 1) * cls.SUB_BUCKET_HALF_COUNT
+            + (value >> shift) - cls.SUB_BUCKET_HALF_COUNT
+        )
+
+    @classmethod
+    def get_upper_bound(cls, index: int) -> int:
+        if index < cls.SUB_BUCKET_COUNT:
+            return index
+        shift, sub_index = divmod(
+            index - cls.SUB_BUCKET_COUNT, cls.SUB_BUCKET_HALF_COUNT
+        )
+        return ((sub_index + cls.SUB_BUCKET_HALF_COUNT + 1) << (shift + 1)) - 1
+
+    def record(self, seconds: float):
+        index = self.get_index(max(0, int(seconds * 1_000_000)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in dict(other.counts).items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def get_percentile(self, percentile: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.get_upper_bound(index) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+        }
+        for percentile in LatencyHistogram.PERCENTILES:
+            summary[f'p{percentile}'] = self.get_percentile(percentile)
+        summary['max'] = self.max
+        return summary
+
+
+class ThreadStats:
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.maxima: Dict[str, float] = {}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+
+    def merge(self, other: 'ThreadStats'):
+        for name, value in dict(other.counters).items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, value in dict(other.maxima).items():
+            self.maxima[name] = max(self.maxima.get(name, value), value)
+        for stage, histogram in dict(other.histograms).items():
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].merge(histogram)
+
+
+class Stats:
+    # Every thread updates only its own ThreadStats, so recording needs no
+    # lock; the lock guards the list of threads and is taken once per thread.
+    def __init__(self):
+        self._local = local()
+        self._threads: List[ThreadStats] = []
+        self._finished = ThreadStats()
+        self._threads_lock = Lock()
+
+    def _get_thread_stats(self) -> ThreadStats:
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = ThreadStats()
+            self._local.stats = stats
+            with self._threads_lock:
+                self._threads.append(stats)
+        return stats
+
+    def release_thread(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return
+        self._local.stats = None
+        with self._threads_lock:
+            self._threads.remove(stats)
+            self._finished.merge(stats)
+
+    def count(self, name: str, n: int = 1):
+        counters = self._get_thread_stats().counters
+        counters[name] = counters.get(name, 0) + n
+
+    def observe_max(self, name: str, value: float):
+        maxima = self._get_thread_stats().maxima
+        if name not in maxima or value > maxima[name]:
+            maxima[name] = value
+
+    def record(self, stage: str, seconds: float):
+        histograms = self._get_thread_stats().histograms
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def _get_threads(self) -> List[ThreadStats]:
+        with self._threads_lock:
+            return self._threads + [self._finished]
+
+    def get_counter(self, name: str) -> int:
+        return sum(stats.counters.get(name, 0) for stats in self._get_threads())
+
+    def get_histogram(self, stage: str) -> LatencyHistogram:
+        merged = LatencyHistogram()
+        for stats in self._get_threads():
+            histogram = stats.histograms.get(stage)
+            if histogram is not None:
+                merged.merge(histogram)
+        return merged
+
+    def snapshot(self) -> Dict[str, Dict]:
+        merged = ThreadStats()
+        for stats in self._get_threads():
+            merged.merge(stats)
+        return {
+            'counters': merged.counters,
+            'maxima': merged.maxima,
+            'latency': {
+                stage: merged.histograms[stage].summary()
+                for stage in sorted(merged.histograms)
+            },
+        }
@@ -0,0 +1,240 @@
+import json
+import socket
+import struct
+import zlib
+from threading import Lock
+from typing import Optional, Dict, Any, Sequence, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BUFFER_SIZE = 4096
+MESSAGE_END = b'\0'
+PROTOCOL_VERSION = 1
+HELLO = 'hello'
+NUL_FRAMING = 'nul'
+LENGTH_FRAMING = 'length'
+FRAMINGS = (LENGTH_FRAMING, NUL_FRAMING)
+FRAME_HEADER = struct.Struct('!I')
+BUSY_STATUS = 'Server is busy.'
+# Largest message accepted, before or after decompression; a peer sending
+# a larger one is dropped instead of growing the buffer without bound.
+MAX_MESSAGE_SIZE = 16 << 20
+
+# With length framing the highest bit of the length marks a compressed
+# payload; messages below the threshold or that do not shrink are sent raw.
+COMPRESSED_FLAG = 1 << 31
+ZLIB_COMPRESSION = 'zlib'
+ZSTD_COMPRESSION = 'zstd'
+COMPRESSION_THRESHOLD = 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def _zstd_decompress(data, max_size: int) -> bytes:
+    try:
+        if zstandard.frame_content_size(data) > max_size:
+            raise ConnectionError(f'Decompressed message exceeds {max_size} bytes.')
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+    except zstandard.ZstdError as e:
+        raise ConnectionError(f'Bad compressed message: {e}.')
+
+
+def _zlib_decompress(data, max_size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    message = decompressor.decompress(data, max_size + 1)
+    if len(message) > max_size:
+        raise ConnectionError(f'Decompressed message exceeds {max_size} bytes.')
+    if not decompressor.eof:
+        raise ConnectionError('Bad compressed message: incomplete stream.')
+    return message
+
+
+CODECS = {}
+if zstandard is not None:
+    CODECS[ZSTD_COMPRESSION] = (
+        lambda data: zstandard.compress(data, ZSTD_LEVEL), _zstd_decompress
+    )
+CODECS[ZLIB_COMPRESSION] = (lambda data: zlib.compress(data, ZLIB_LEVEL), _zlib_decompress)
+COMPRESSIONS = tuple(CODECS)
+
+
+def encode_hello(framing=NUL_FRAMING, compression=None) -> str:
+    hello = {'version': PROTOCOL_VERSION, 'framing': framing}
+    if compression:
+        hello['compression'] = compression
+    return json.dumps({HELLO: hello})
+
+
+def decode_hello(message: str) -> Optional[Dict[str, Any]]:
+    if not message.startswith('{'):
+        return None
+    try:
+        hello = json.loads(message)
+    except json.decoder.JSONDecodeError:
+        return None
+    if not isinstance(hello, dict) or not isinstance(hello.get(HELLO), dict):
+        return None
+    return hello[HELLO]
+
+
+def choose_framing(offered: Union[str, Sequence[str]]) -> str:
+    if not isinstance(offered, list):
+        offered = [offered]
+    for framing in offered:
+        if framing in FRAMINGS:
+            return framing
+    return NUL_FRAMING
+
+
+def choose_compression(offered: Union[str, Sequence[str], None]) -> Optional[str]:
+    if not isinstance(offered, list):
+        offered = [offered]
+    for compression in offered:
+        if compression in CODECS:
+            return compression
+    return None
+
+
+class MessageStream:
+    def __init__(self, sock: socket.socket, buffer_size: int = BUFFER_SIZE,
+                 max_message_size: int = MAX_MESSAGE_SIZE):
+        self._sock = sock
+        self._max_message_size = max_message_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._framing = NUL_FRAMING
+        self._compression = None
+        self._compress = None
+        self._decompress = None
+        self._threshold = COMPRESSION_THRESHOLD
+        self._send_lock = Lock()
+        self.n_bytes_sent = 0
+        self.n_bytes_received = 0
+
+    @property
+    def framing(self) -> str:
+        return self._framing
+
+    def set_framing(self, framing: str):
+        if framing not in FRAMINGS:
+            raise ValueError(f'Unknown framing {framing}. Expected one of {FRAMINGS}.')
+        self._framing = framing
+
+    @property
+    def compression(self) -> Optional[str]:
+        return self._compression
+
+    def set_compression(self, compression: Optional[str],
+                        threshold: int = COMPRESSION_THRESHOLD):
+        if compression is None:
+            self._compression = self._compress = self._decompress = None
+            return
+        if compression not in CODECS:
+            raise ValueError(
+                f'Unknown compression {compression}. Expected one of {COMPRESSIONS}.'
+            )
+        if self._framing != LENGTH_FRAMING:
+            raise ValueError('Compression needs length framing.')
+        self._compression = compression
+        self._compress, self._decompress = CODECS[compression]
+        self._threshold = threshold
+
+    def _reserve(self, size: int):
+        n_buffered = self._end - self._start
+        if size > len(self._buffer):
+            buffer = bytearray(max(size, 2 * len(self._buffer)))
+            buffer[:n_buffered] = self._view[self._start:self._end]
+            self._view.release()
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        else:
+            self._view[:n_buffered] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = n_buffered
+
+    def _fill(self, size: int) -> bool:
+        if self._start + size > len(self._buffer):
+            self._reserve(size)
+        n_received = self._sock.recv_into(self._view[self._end:])
+        self._end += n_received
+        self.n_bytes_received += n_received
+        return n_received > 0
+
+    def _pop(self, start: int, end: int, next_start: int,
+             compressed: bool = False) -> str:
+        if compressed:
+            if self._decompress is None:
+                raise ConnectionError('Compressed message without negotiated compression.')
+            message = str(
+                self._decompress(self._view[start:end], self._max_message_size), 'utf-8'
+            )
+        else:
+            message = str(self._view[start:end], 'utf-8')
+        if next_start == self._end:
+            self._start = self._end = 0
+        else:
+            self._start = next_start
+        return message
+
+    def _receive_delimited(self) -> Optional[str]:
+        n_scanned = 0
+        while True:
+            end = self._buffer.find(MESSAGE_END, self._start + n_scanned, self._end)
+            if end != -1:
+                return self._pop(self._start, end, end + 1)
+            n_scanned = self._end - self._start
+            if n_scanned > self._max_message_size:
+                raise ConnectionError(
+                    f'Message exceeds {self._max_message_size} bytes.'
+                )
+            if not self._fill(n_scanned + BUFFER_SIZE):
+                return None
+
+    def _receive_prefixed(self) -> Optional[str]:
+        header_size = FRAME_HEADER.size
+        while True:
+            n_buffered = self._end - self._start
+            frame_size = header_size
+            if n_buffered >= header_size:
+                length, = FRAME_HEADER.unpack_from(self._buffer, self._start)
+                compressed = length & COMPRESSED_FLAG
+                length &= ~COMPRESSED_FLAG
+                if length > self._max_message_size:
+                    raise ConnectionError(
+                        f'Message of {length} bytes exceeds {self._max_message_size} bytes.'
+                    )
+                frame_size += length
+                if n_buffered >= frame_size:
+                    start = self._start + header_size
+                    return self._pop(
+                        start, start + length, self._start + frame_size, compressed
+                    )
+            if not self._fill(max(frame_size, n_buffered + BUFFER_SIZE)):
+                return None
+
+    def receive(self) -> Optional[str]:
+        if self._framing == LENGTH_FRAMING:
+            return self._receive_prefixed()
+        return self._receive_delimited()
+
+    def send(self, message: str):
+        payload = message.encode('utf-8')
+        if self._framing == LENGTH_FRAMING:
+            header = len(payload)
+            if self._compress is not None and len(payload) >= self._threshold:
+                compressed = self._compress(payload)
+                if len(compressed) < len(payload):
+                    payload = compressed
+                    header = len(payload) | COMPRESSED_FLAG
+            data = FRAME_HEADER.pack(header) + payload
+        else:
+            data = payload + MESSAGE_END
+        with self._send_lock:
+            self._sock.sendall(data)
+            self.n_bytes_sent += len(data)
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+
+CacheEntry = namedtuple(
+    'CacheEntry', ['result', 'etag', 'last_modified', 'expire_at']
+)
+
+
+class ResultCache:
+    MAX_SIZE = 1000
+    TTL = 300.0
+
+    def __init__(self, max_size: int = MAX_SIZE, ttl: float = TTL,
+                 timer=time.monotonic):
+        if max_size < 1:
+            raise ValueError(f'Cache size must be positive, got {max_size}.')
+        self._max_size = max_size
+        self._ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._flights: Dict[str, Future] = {}
+        self._flights_lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def get_fresh(self, url: str) -> Optional[CacheEntry]:
+        entry = self.get(url)
+        if entry is None or entry.expire_at <= self._timer():
+            return None
+        return entry
+
+    def put(self, url: str, result, etag: Optional[str] = None,
+            last_modified: Optional[str] = None) -> CacheEntry:
+        entry = CacheEntry(result, etag, last_modified, self._timer() + self._ttl)
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def refresh(self, url: str, entry: CacheEntry) -> CacheEntry:
+        return self.put(url, entry.result, entry.etag, entry.last_modified)
+
+    @staticmethod
+    def get_validators(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def single_flight(self, url: str, fetch: Callable[[], object]):
+        with self._flights_lock:
+            flight = self._flights.get(url)
+            is_leader = flight is None
+            if is_leader:
+                flight = Future()
+                self._flights[url] = flight
+        if not is_leader:
+            return flight.result()
+        try:
+            result = fetch()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._flights_lock:
+                del self._flights[url]
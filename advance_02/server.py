@@ -1,20 +1,42 @@
 import argparse
+import asyncio
 import socket
 import queue
 import json
+import os
 import re
-from typing import Union, Dict
-from collections import Counter
-from threading import Thread, Lock
-from string import punctuation
+import time
+from typing import Union, Dict, List, Optional
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Thread, Lock, Condition, current_thread, local
 
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 
+from html_text import TEXT_BACKENDS, PUNCTUATION_TABLE, iter_words
 from logger import init_logger
+from metrics import Stats
+from protocol import (
+    MessageStream, encode_hello, decode_hello, choose_framing, choose_compression,
+    NUL_FRAMING, LENGTH_FRAMING, BUSY_STATUS, COMPRESSION_THRESHOLD,
+)
+from result_cache import ResultCache
+from top_words import count_top_words
 
 
 logger = init_logger('logging_conf.yaml', 'server')
+# gzip and deflate, and br when a brotli decoder is installed.
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+
+URL_REGEX = re.compile(
+    r'((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.'
+    r'([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*'
+)
 
 
 def get_parser() -> argparse.ArgumentParser:
@@ -22,36 +44,305 @@ def get_parser() -> argparse.ArgumentParser:
         prog='Server',
         description='Downloads urls',
     )
-    parser.add_argument('-w', type=int, action='store', dest='n_threads')
+    parser.add_argument(
+        '-w', type=int, action='store', dest='n_threads',
+        help='maximum number of thread-workers',
+    )
+    parser.add_argument(
+        '--min-workers', type=int, action='store', dest='min_workers',
+        default=Server.MIN_WORKERS,
+        help='number of thread-workers kept running without load',
+    )
+    parser.add_argument(
+        '--idle-timeout', type=float, action='store', dest='idle_timeout',
+        default=Server.WORKER_IDLE_TIMEOUT,
+        help='seconds without tasks after which an extra worker stops',
+    )
+    parser.add_argument(
+        '--scale-up-wait', type=float, action='store', dest='scale_up_wait',
+        default=Server.SCALE_UP_WAIT,
+        help='queue wait in seconds above which a new worker is started',
+    )
     parser.add_argument('-k', type=int, action='store', dest='n_top')
+    parser.add_argument(
+        '--async', action='store_true', dest='use_async',
+        help='serve clients with asyncio instead of thread-workers',
+    )
+    parser.add_argument(
+        '-c', type=int, action='store', dest='max_concurrency',
+        default=AsyncServer.MAX_CONCURRENCY,
+        help='maximum number of simultaneously processed clients in async mode',
+    )
+    parser.add_argument(
+        '--pool-size', type=int, action='store', dest='pool_size',
+        default=Server.POOL_SIZE,
+        help='number of keep-alive connections per host for each worker',
+    )
+    parser.add_argument(
+        '--fetch-timeout', type=float, action='store', dest='fetch_timeout',
+        default=Server.FETCH_TIMEOUT,
+        help='connect and read timeout of url downloading in seconds',
+    )
+    parser.add_argument(
+        '--retries', type=int, action='store', dest='max_retries',
+        default=Server.MAX_RETRIES,
+        help='number of retries with exponential backoff for failed downloads',
+    )
+    parser.add_argument(
+        '--html-backend', type=str, action='store', dest='html_backend',
+        choices=list(TEXT_BACKENDS), default=HTMLParser.DEFAULT_BACKEND,
+        help='text extractor; html.parser gives the same words as BeautifulSoup, '
+             'selectolax and lxml are faster but may differ on broken markup',
+    )
+    parser.add_argument(
+        '--processes', type=int, action='store', dest='n_processes',
+        nargs='?', const=os.cpu_count(), default=0,
+        help='number of processes parsing downloaded pages '
+             '(number of cores if no value is given); '
+             'by default pages are parsed by the downloading workers',
+    )
+    parser.add_argument(
+        '--error-bound', type=float, action='store', dest='error_bound',
+        default=None,
+        help='count words approximately in memory of 1 / ERROR_BOUND words; '
+             'a count exceeds the true one by at most ERROR_BOUND * page words',
+    )
+    parser.add_argument(
+        '--cache-size', type=int, action='store', dest='cache_size',
+        default=ResultCache.MAX_SIZE,
+        help='number of urls whose top words are cached; 0 disables the cache',
+    )
+    parser.add_argument(
+        '--cache-ttl', type=float, action='store', dest='cache_ttl',
+        default=ResultCache.TTL,
+        help='seconds before a cached result is revalidated with the origin',
+    )
+    parser.add_argument(
+        '--queue-watermark', type=int, action='store', dest='queue_watermark',
+        default=Server.QUEUE_HIGH_WATERMARK,
+        help='number of queued tasks above which new work is rejected as busy',
+    )
+    parser.add_argument(
+        '--client-limit', type=int, action='store', dest='client_limit',
+        default=Server.MAX_CLIENT_REQUESTS,
+        help='number of unanswered urls of one connection; reading waits until '
+             'some are answered, urls of a batch beyond it get busy replies',
+    )
+    parser.add_argument(
+        '--max-connections', type=int, action='store', dest='max_connections',
+        default=Server.MAX_CONNECTIONS,
+        help='number of open persistent connections, each served by a reader thread; '
+             'further connections are rejected as busy',
+    )
+    parser.add_argument(
+        '--no-compression', action='store_false', dest='compression',
+        help='do not compress replies even if the client supports it',
+    )
+    parser.add_argument(
+        '--compression-threshold', type=int, action='store',
+        dest='compression_threshold', default=COMPRESSION_THRESHOLD,
+        help='size in bytes below which replies are sent uncompressed',
+    )
     return parser
 
 
+# Options of the thread-worker server that the async server has no
+# counterpart for: its queue, cache and persistent connections.
+THREADED_ONLY_OPTIONS = {
+    '--min-workers': 'min_workers',
+    '--idle-timeout': 'idle_timeout',
+    '--scale-up-wait': 'scale_up_wait',
+    '--pool-size': 'pool_size',
+    '--retries': 'max_retries',
+    '--cache-size': 'cache_size',
+    '--cache-ttl': 'cache_ttl',
+    '--queue-watermark': 'queue_watermark',
+    '--client-limit': 'client_limit',
+    '--max-connections': 'max_connections',
+    '--no-compression': 'compression',
+    '--compression-threshold': 'compression_threshold',
+}
+
+
+def check_args(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if not args.use_async:
+        return
+    options = [
+        option for option, dest in THREADED_ONLY_OPTIONS.items()
+        if getattr(args, dest) != parser.get_default(dest)
+    ]
+    if options:
+        parser.error(f'{", ".join(options)} cannot be used with --async.')
+
+
 class HTMLParser:
-    def __init__(self, doc: str):
+    DEFAULT_BACKEND = 'html.parser'
+
+    def __init__(self, doc: str, backend: str = DEFAULT_BACKEND):
+        if backend not in TEXT_BACKENDS:
+            raise ValueError(
+                f'Unknown html backend {backend}. '
+                f'Expected one of {list(TEXT_BACKENDS)}.'
+            )
         self.doc = doc
+        self._iter_text = TEXT_BACKENDS[backend]
 
     def get_text(self) -> str:
-        soup = BeautifulSoup(self.doc, features="html.parser")
-        text = soup.get_text()
-        text = text.translate(text.maketrans('', '', punctuation))
+        text = ''.join(self._iter_text(self.doc))
+        text = text.translate(PUNCTUATION_TABLE)
         return text
 
-    def get_top_words(self, n_top: int) -> Dict[str, int]:
-        text = self.get_text()
-        words = text.split()
-        most_common_words = dict(Counter(words).most_common(n_top))
+    def get_top_words(self, n_top: int,
+                      error_bound: Optional[float] = None) -> Dict[str, int]:
+        words = iter_words(self._iter_text(self.doc))
+        most_common_words = count_top_words(words, n_top, error_bound)
         return most_common_words
 
 
+def decode_body(body, encoding: Optional[str]) -> str:
+    try:
+        return str(body, encoding, errors='replace')
+    except (LookupError, TypeError):
+        return str(body, errors='replace')
+
+
+def get_shared_top_words(name: str, size: int, encoding: Optional[str],
+                         n_top: int, backend: str,
+                         error_bound: Optional[float]) -> Dict[str, int]:
+    shared_body = SharedMemory(name=name)
+    try:
+        with shared_body.buf[:size] as body:
+            doc = decode_body(body, encoding)
+    finally:
+        shared_body.close()
+    return HTMLParser(doc, backend).get_top_words(n_top, error_bound)
+
+
+class ParsePool:
+    def __init__(self, n_processes: int, n_top: int,
+                 backend: str = HTMLParser.DEFAULT_BACKEND,
+                 error_bound: Optional[float] = None):
+        self._n_top = n_top
+        self._backend = backend
+        self._error_bound = error_bound
+        # Worker processes must share the tracker of the shared memory blocks,
+        # otherwise each of them unlinks the blocks it has seen on exit.
+        resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(n_processes)
+        # Worker processes are forked on the first submit, do it before
+        # the caller starts its threads.
+        self._executor.submit(int).result()
+
+    def submit(self, body: bytes, encoding: Optional[str]) -> Future:
+        shared_body = SharedMemory(create=True, size=max(1, len(body)))
+        try:
+            shared_body.buf[:len(body)] = body
+            future = self._executor.submit(
+                get_shared_top_words, shared_body.name, len(body), encoding,
+                self._n_top, self._backend, self._error_bound,
+            )
+        except BaseException:
+            ParsePool._release(shared_body)
+            raise
+        future.add_done_callback(lambda _: ParsePool._release(shared_body))
+        return future
+
+    def get_top_words(self, body: bytes, encoding: Optional[str]) -> Dict[str, int]:
+        return self.submit(body, encoding).result()
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+    @staticmethod
+    def _release(shared_body: SharedMemory):
+        shared_body.close()
+        shared_body.unlink()
+
+
+class ClientConnection:
+    def __init__(self, connection_socket: socket.socket, address,
+                 stream: MessageStream, max_pending: Optional[int] = None):
+        self.stream = stream
+        self.address = address
+        self._socket = connection_socket
+        self._pending = 0
+        self._max_pending = max_pending
+        self._reading_done = False
+        self._lock = Condition()
+
+    def start_request(self, n_requests: int = 1) -> int:
+        # Waits until the urls of a message fit under the limit. A batch
+        # larger than the limit is cut to it, the caller rejects the rest.
+        with self._lock:
+            if self._max_pending is not None:
+                n_requests = min(n_requests, self._max_pending)
+                self._lock.wait_for(
+                    lambda: self._pending + n_requests <= self._max_pending
+                )
+            self._pending += n_requests
+        return n_requests
+
+    def finish_request(self, n_requests: int = 1):
+        with self._lock:
+            self._pending -= n_requests
+            self._lock.notify()
+            need_close = self._reading_done and self._pending == 0
+        if need_close:
+            self._socket.close()
+
+    def finish_reading(self):
+        with self._lock:
+            self._reading_done = True
+            need_close = self._pending == 0
+        if need_close:
+            self._socket.close()
+
+    def stop_reading(self):
+        # Wakes the reader blocked in recv, requests already read are answered.
+        try:
+            self._socket.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+
+
 class Server:
     BUFFER_SIZE = 4096
     MAX_THREADS = 500
+    MIN_WORKERS = 4
+    WORKER_IDLE_TIMEOUT = 30.0
+    SCALE_UP_WAIT = 0.01
     MAX_TASKS_IN_QUEUE = 1000
+    QUEUE_HIGH_WATERMARK = 800
+    MAX_CLIENT_REQUESTS = 100
+    MAX_CONNECTIONS = 1000
+    MAX_REJECTIONS_IN_QUEUE = 1000
+    REJECT_TIMEOUT = 1.0
     THREAD_KILLER_TASK = '_STOP'
+    POOL_SIZE = 10
+    FETCH_TIMEOUT = 10.0
+    MAX_RETRIES = 3
+    BACKOFF_FACTOR = 0.3
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
 
     def __init__(self, n_threads: int, n_top: int, host: str = 'localhost',
-                 port: int = 5000, timeout: Union[int, None] = None):
+                 port: int = 5000, timeout: Union[int, None] = None,
+                 pool_size: int = POOL_SIZE,
+                 fetch_timeout: float = FETCH_TIMEOUT,
+                 max_retries: int = MAX_RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR,
+                 html_backend: str = HTMLParser.DEFAULT_BACKEND,
+                 n_processes: int = 0,
+                 error_bound: Optional[float] = None,
+                 cache_size: int = ResultCache.MAX_SIZE,
+                 cache_ttl: float = ResultCache.TTL,
+                 queue_watermark: int = QUEUE_HIGH_WATERMARK,
+                 client_limit: int = MAX_CLIENT_REQUESTS,
+                 max_connections: int = MAX_CONNECTIONS,
+                 min_workers: int = MIN_WORKERS,
+                 idle_timeout: float = WORKER_IDLE_TIMEOUT,
+                 scale_up_wait: float = SCALE_UP_WAIT,
+                 compression: bool = True,
+                 compression_threshold: int = COMPRESSION_THRESHOLD):
         logger.info('Start server application.')
         if n_threads > Server.MAX_THREADS:
             msg = (
@@ -67,16 +358,46 @@ class Server:
         self._n_top = n_top
         self._timeout = timeout
         self._task_queue = queue.Queue(Server.MAX_TASKS_IN_QUEUE)
-        self._workers = None
+        self._queue_watermark = min(queue_watermark, Server.MAX_TASKS_IN_QUEUE)
+        self._client_limit = max(1, client_limit)
+        self._max_connections = max(1, max_connections)
+        self._stats = Stats()
+        self._reject_queue = queue.Queue(Server.MAX_REJECTIONS_IN_QUEUE)
+        self._rejector = None
+        self._min_workers = max(1, min(min_workers, self._n_threads))
+        self._idle_timeout = idle_timeout
+        self._scale_up_wait = scale_up_wait
+        self._workers = []
+        self._workers_lock = Lock()
+        self._stopping = False
         self._alive = True
-        self._task_counter = 0
-        self._task_counter_lock = Lock()
+        self._pool_size = pool_size
+        self._fetch_timeout = fetch_timeout
+        self._max_retries = max_retries
+        self._backoff_factor = backoff_factor
+        self._html_backend = html_backend
+        self._n_processes = n_processes
+        self._parse_pool = None
+        self._error_bound = error_bound
+        self._result_cache = (
+            ResultCache(cache_size, cache_ttl) if cache_size > 0 else None
+        )
+        self._compression = compression
+        self._compression_threshold = compression_threshold
+        self._worker_local = local()
+        self._readers: Dict[Thread, ClientConnection] = {}
+        self._readers_closed = False
+        self._readers_lock = Lock()
 
     def run(self):
+        self._start_parse_pool()
         logger.info('Start workers.')
         self._start_workers()
+        self._rejector = Thread(target=self._reject_connections)
+        self._rejector.start()
         logger.info('Start listening on port %d.', self._port)
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             if self._timeout:
                 server_socket.settimeout(self._timeout)
             server_socket.bind((self._host, self._port))
@@ -87,83 +408,572 @@ class Server:
                 except socket.timeout:
                     self._alive = False
                 else:
-                    self._task_queue.put((conn_socket, address))
+                    self._admit_connection(conn_socket, address)
+        self._reject_queue.put(None)
+        self._rejector.join()
         self._stop_workers()
+        self._stop_parse_pool()
+        logger.info(
+            'Processed %d tasks. Stats: %s', self._task_counter, self.get_stats()
+        )
         logger.info('Server stopped by timeout')
 
+    @property
+    def _task_counter(self) -> int:
+        return self._stats.get_counter('tasks')
+
+    def get_stats(self) -> Dict[str, Dict]:
+        stats = self._stats.snapshot()
+        stats['queue_depth'] = self._task_queue.qsize()
+        stats['workers'] = len(self._workers)
+        return stats
+
+    def _is_overloaded(self) -> bool:
+        return self._task_queue.qsize() >= self._queue_watermark
+
+    def _put_task(self, task, argument):
+        self._task_queue.put((task, argument, time.perf_counter()))
+        self._stats.count('admitted')
+        self._stats.observe_max('queue_depth', self._task_queue.qsize())
+        with self._task_queue.mutex:
+            oldest = self._task_queue.queue[0][2] if self._task_queue.queue else None
+        if oldest is not None:
+            self._scale_up(time.perf_counter() - oldest)
+
+    def _admit_connection(self, conn_socket: socket.socket, address):
+        if not self._is_overloaded():
+            self._put_task(conn_socket, address)
+            return
+        self._stats.count('rejected')
+        try:
+            self._reject_queue.put_nowait(conn_socket)
+        except queue.Full:
+            conn_socket.close()
+
+    def _reject_connections(self):
+        while True:
+            conn_socket = self._reject_queue.get()
+            if conn_socket is None:
+                return
+            with conn_socket:
+                try:
+                    conn_socket.settimeout(Server.REJECT_TIMEOUT)
+                    stream = MessageStream(conn_socket)
+                    if stream.receive() is not None:
+                        stream.send(BUSY_STATUS)
+                except OSError:
+                    pass
+
+    def _start_parse_pool(self):
+        if self._n_processes > 0:
+            logger.info('Start %d parsing processes.', self._n_processes)
+            self._parse_pool = ParsePool(
+                self._n_processes, self._n_top, self._html_backend,
+                self._error_bound,
+            )
+
+    def _stop_parse_pool(self):
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown()
+            self._parse_pool = None
+
     def _start_workers(self):
-        self._workers = [
-            Thread(target=self._handle_connections)
-            for _ in range(self._n_threads)
-        ]
-        for worker in self._workers:
-            worker.start()
+        with self._workers_lock:
+            for _ in range(self._min_workers):
+                self._add_worker()
+
+    def _add_worker(self):
+        worker = Thread(target=self._handle_connections)
+        self._workers.append(worker)
+        self._stats.count('workers_started')
+        self._stats.observe_max('workers', len(self._workers))
+        worker.start()
+
+    def _scale_up(self, wait: float):
+        if wait < self._scale_up_wait or len(self._workers) >= self._n_threads:
+            return
+        with self._workers_lock:
+            if not self._stopping and len(self._workers) < self._n_threads:
+                self._add_worker()
+
+    def _retire_worker(self) -> bool:
+        with self._workers_lock:
+            if len(self._workers) <= self._min_workers:
+                return False
+            self._workers.remove(current_thread())
+        self._stats.count('workers_retired')
+        return True
+
+    def _remove_worker(self):
+        with self._workers_lock:
+            if current_thread() in self._workers:
+                self._workers.remove(current_thread())
 
     def _stop_workers(self):
-        self._task_queue.put((Server.THREAD_KILLER_TASK, None))
-        for worker in self._workers:
+        with self._readers_lock:
+            self._readers_closed = True
+            readers = dict(self._readers)
+        for connection in readers.values():
+            connection.stop_reading()
+        for reader in readers:
+            reader.join()
+        with self._workers_lock:
+            self._stopping = True
+            workers = list(self._workers)
+        self._task_queue.put((Server.THREAD_KILLER_TASK, None, None))
+        for worker in workers:
             worker.join()
 
-    def _receive_data(self, connection_socket: socket.socket) -> str:
-        data = []
-        chunk = connection_socket.recv(Server.BUFFER_SIZE).decode('utf-8')
-        while not chunk.endswith('\0'):
-            data.append(chunk)
-            chunk = connection_socket.recv(Server.BUFFER_SIZE).decode('utf-8')
-        data.append(chunk[:-1])
-        data = ''.join(data)
-        return data
-
-    def _process_query(self, url: str) -> str:
-        url_regex = re.compile(
-            r'((http|https)\:\/\/)?[a-zA-Z0-9\.\/\?\:@\-_=#]+\.'
-            r'([a-zA-Z]){2,6}([a-zA-Z0-9\.\&\/\?\:@\-_=#])*'
+    def _create_http_session(self) -> requests.Session:
+        retry = Retry(
+            total=self._max_retries,
+            backoff_factor=self._backoff_factor,
+            status_forcelist=Server.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
         )
-        if not re.match(url_regex, url):
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_size,
+            pool_maxsize=self._pool_size,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _get_http_session(self) -> requests.Session:
+        session = getattr(self._worker_local, 'http_session', None)
+        if session is None:
+            session = self._create_http_session()
+            self._worker_local.http_session = session
+        return session
+
+    def _close_http_session(self):
+        session = getattr(self._worker_local, 'http_session', None)
+        if session is not None:
+            session.close()
+            self._worker_local.http_session = None
+
+    def _get_top_words(self, url: str) -> Union[Dict[str, int], str]:
+        if not re.match(URL_REGEX, url):
             status = 'Wrong format.'
             logger.warning('Unable to process url %s. %s', url, status)
             return status
-        response = requests.get(url)
+        if self._result_cache is None:
+            return self._fetch_top_words(url)
+        entry = self._result_cache.get_fresh(url)
+        if entry is not None:
+            self._stats.count('cache_hits')
+            return entry.result
+        return self._result_cache.single_flight(
+            url, lambda: self._fetch_top_words(url)
+        )
+
+    def _fetch_top_words(self, url: str) -> Union[Dict[str, int], str]:
+        cache = self._result_cache
+        entry = None
+        if cache is not None:
+            entry = cache.get_fresh(url)
+            if entry is not None:
+                return entry.result
+            entry = cache.get(url)
+        with self._stats.measure('fetch'):
+            response = self._get_http_session().get(
+                url, timeout=self._fetch_timeout,
+                headers=ResultCache.get_validators(entry),
+            )
+        self._stats.count('download_bytes', response.raw.tell())
+        if (
+                entry is not None
+                and response.status_code == requests.status_codes.codes.not_modified
+        ):
+            self._stats.count('cache_revalidations')
+            return cache.refresh(url, entry).result
         if response.status_code != requests.status_codes.codes.ok:
             status = 'Bad response.'
             logger.warning('Unable to process url %s. %s', url, status)
             return status
-        most_common_words = (
-            HTMLParser(response.text)
-            .get_top_words(self._n_top)
-        )
-        result_msg = json.dumps(dict(most_common_words))
+        with self._stats.measure('parse'):
+            if self._parse_pool is not None:
+                encoding = response.encoding or response.apparent_encoding
+                most_common_words = self._parse_pool.get_top_words(
+                    response.content, encoding
+                )
+            else:
+                most_common_words = (
+                    HTMLParser(response.text, self._html_backend)
+                    .get_top_words(self._n_top, self._error_bound)
+                )
+        if cache is not None:
+            cache.put(
+                url, most_common_words,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+            )
+        return dict(most_common_words)
+
+    def _process_query(self, url: str) -> str:
+        result = self._get_top_words(url)
+        if isinstance(result, str):
+            return result
+        result_msg = json.dumps(result)
         return result_msg
 
-    def _process_client(self, connection_socket: socket.socket):
-        url = self._receive_data(connection_socket)
-        result_msg = self._process_query(url)
-        result_msg += '\0'
-        connection_socket.sendall(result_msg.encode('utf-8'))
-        with self._task_counter_lock:
-            self._task_counter += 1
-            logger.info('Total processed: %d tasks', self._task_counter)
+    def _send(self, stream: MessageStream, message: str):
+        with self._stats.measure('send'):
+            stream.send(message)
+
+    def _count_task(self, enqueued_at: float):
+        self._stats.count('tasks')
+        self._stats.record('total', time.perf_counter() - enqueued_at)
+
+    def _process_client(self, connection_socket: socket.socket, address,
+                        enqueued_at: float):
+        stream = MessageStream(connection_socket)
+        message = stream.receive()
+        if message is None:
+            return
+        hello = decode_hello(message)
+        if hello is None:
+            result_msg = self._process_query(message)
+            self._send(stream, result_msg)
+            self._count_task(enqueued_at)
+            return
+        connection = ClientConnection(
+            connection_socket, address, stream, self._client_limit
+        )
+        framing = choose_framing(hello.get('framing', NUL_FRAMING))
+        compression = None
+        if self._compression and framing == LENGTH_FRAMING:
+            compression = choose_compression(hello.get('compression'))
+        # Every persistent connection holds a reader thread, so their number
+        # is bounded and further connections are answered as busy.
+        with self._readers_lock:
+            self._readers = {
+                reader: conn for reader, conn in self._readers.items() if reader.is_alive()
+            }
+            admitted = (
+                not self._readers_closed
+                and len(self._readers) < self._max_connections
+            )
+            if admitted:
+                reader = Thread(
+                    target=self._read_requests, args=(connection, framing, compression),
+                    daemon=True,
+                )
+                self._readers[reader] = connection
+                reader.start()
+        if not admitted:
+            self._stats.count('rejected')
+            with connection_socket:
+                stream.send(BUSY_STATUS)
+
+    def _read_requests(self, connection: ClientConnection, framing: str,
+                       compression: Optional[str]):
+        try:
+            connection.stream.send(encode_hello(framing, compression))
+            connection.stream.set_framing(framing)
+            connection.stream.set_compression(compression, self._compression_threshold)
+            while True:
+                message = connection.stream.receive()
+                if message is None:
+                    return
+                try:
+                    request = json.loads(message)
+                except json.decoder.JSONDecodeError:
+                    request = None
+                if not isinstance(request, dict):
+                    logger.warning(
+                        'Bad request from client %s: %s', connection.address, message
+                    )
+                    continue
+                if request.get('stats'):
+                    connection.stream.send(
+                        json.dumps({'id': request.get('id'), 'stats': self.get_stats()})
+                    )
+                    continue
+                urls = request.get('urls')
+                if isinstance(urls, list):
+                    request_id = request.get('id')
+                    requests = [
+                        {'id': request_id, 'index': index, 'url': url}
+                        for index, url in enumerate(urls)
+                    ]
+                else:
+                    requests = [request]
+                self._admit_requests(connection, requests)
+        except Exception as e:
+            logger.error(
+                'Unexpected error occurred while reading requests. '
+                'Client address: %s; Exception: %s',
+                connection.address,
+                str(e)
+            )
+        finally:
+            connection.finish_reading()
+            self._stats.release_thread()
+
+    def _admit_requests(self, connection: ClientConnection, requests: List[dict]):
+        # The urls of one message are admitted up to the client limit and the
+        # room left under the watermark, the rest get busy replies.
+        n_started = connection.start_request(len(requests))
+        n_admitted = min(
+            n_started, max(0, self._queue_watermark - self._task_queue.qsize())
+        )
+        for request in requests[:n_admitted]:
+            self._put_task(connection, request)
+        rejected = requests[n_admitted:]
+        if not rejected:
+            return
+        self._stats.count('rejected', len(rejected))
+        try:
+            for request in rejected:
+                response = self._make_response(request)
+                response['error'] = BUSY_STATUS
+                connection.stream.send(json.dumps(response))
+        finally:
+            connection.finish_request(n_started - n_admitted)
+
+    @staticmethod
+    def _make_response(request: dict) -> dict:
+        response = {'id': request.get('id')}
+        if 'index' in request:
+            response['index'] = request['index']
+        return response
+
+    def _process_request(self, connection: ClientConnection, request: dict,
+                         enqueued_at: float):
+        response = self._make_response(request)
+        try:
+            result = self._get_top_words(request['url'])
+        except Exception as e:
+            response['error'] = 'Internal error.'
+            logger.error(
+                'Unexpected error occurred while processing request %s. '
+                'Client address: %s; Exception: %s',
+                request,
+                connection.address,
+                str(e)
+            )
+        else:
+            if isinstance(result, str):
+                response['error'] = result
+            else:
+                response['result'] = result
+        try:
+            self._send(connection.stream, json.dumps(response))
+        finally:
+            connection.finish_request()
+        self._count_task(enqueued_at)
 
     def _handle_connections(self):
+        try:
+            self._process_tasks()
+        finally:
+            self._remove_worker()
+            self._close_http_session()
+            self._stats.release_thread()
+
+    def _process_tasks(self):
         while True:
-            connection_socket, address = self._task_queue.get()
-            if connection_socket == Server.THREAD_KILLER_TASK:
-                self._task_queue.put((Server.THREAD_KILLER_TASK, address))
+            try:
+                task, argument, enqueued_at = self._task_queue.get(
+                    timeout=self._idle_timeout
+                )
+            except queue.Empty:
+                if self._retire_worker():
+                    return
+                continue
+            if task == Server.THREAD_KILLER_TASK:
+                self._task_queue.put((Server.THREAD_KILLER_TASK, argument, None))
                 return
+            wait = time.perf_counter() - enqueued_at
+            self._stats.record('queue_wait', wait)
+            self._scale_up(wait)
             try:
-                self._process_client(connection_socket)
+                if isinstance(task, ClientConnection):
+                    self._process_request(task, argument, enqueued_at)
+                else:
+                    self._process_client(task, argument, enqueued_at)
             except Exception as e:
                 logger.error(
                     'Unexpected error occurred while processing client. '
                     'Client address: %s; Exception: %s',
-                    address,
+                    task.address if isinstance(task, ClientConnection) else argument,
                     str(e)
                 )
 
 
+class AsyncServer:
+    MAX_CONCURRENCY = 10_000
+    STREAM_LIMIT = 2 ** 16
+
+    def __init__(self, max_concurrency: int, n_top: int, host: str = 'localhost',
+                 port: int = 5000, timeout: Union[int, None] = None,
+                 n_processes: int = 0, fetch_timeout: float = Server.FETCH_TIMEOUT,
+                 html_backend: str = HTMLParser.DEFAULT_BACKEND,
+                 error_bound: Optional[float] = None):
+        logger.info('Start async server application.')
+        self._max_concurrency = max_concurrency
+        self._fetch_timeout = fetch_timeout
+        self._html_backend = html_backend
+        self._error_bound = error_bound
+        self._host = host
+        self._port = port
+        self._n_top = n_top
+        self._timeout = timeout
+        self._semaphore = None
+        self._session = None
+        self._n_processes = n_processes
+        self._parse_pool = None
+        self._handlers = set()
+        self._last_connection_time = 0.0
+        self._task_counter = 0
+
+    def run(self):
+        if self._n_processes > 0:
+            self._parse_pool = ParsePool(
+                self._n_processes, self._n_top, self._html_backend, self._error_bound,
+            )
+        try:
+            asyncio.run(self._serve())
+        finally:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown()
+                self._parse_pool = None
+        logger.info('Server stopped by timeout')
+
+    async def _serve(self):
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        loop = asyncio.get_running_loop()
+        self._last_connection_time = loop.time()
+        # At most one upstream connection per concurrently served client, and
+        # the same connect and read timeouts as the threaded server.
+        connector = aiohttp.TCPConnector(limit=self._max_concurrency)
+        fetch_timeout = aiohttp.ClientTimeout(
+            total=None, connect=self._fetch_timeout, sock_read=self._fetch_timeout
+        )
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=fetch_timeout
+        ) as session:
+            self._session = session
+            server = await asyncio.start_server(
+                self._handle_client, self._host, self._port,
+                limit=AsyncServer.STREAM_LIMIT,
+            )
+            logger.info('Start listening on port %d.', self._port)
+            async with server:
+                if self._timeout:
+                    await self._wait_for_idle(loop)
+                else:
+                    await server.serve_forever()
+            if self._handlers:
+                await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _wait_for_idle(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            idle_time = loop.time() - self._last_connection_time
+            if idle_time >= self._timeout:
+                return
+            await asyncio.sleep(self._timeout - idle_time)
+
+    async def _process_query(self, url: str) -> str:
+        if not re.match(URL_REGEX, url):
+            status = 'Wrong format.'
+            logger.warning('Unable to process url %s. %s', url, status)
+            return status
+        async with self._session.get(url) as response:
+            if response.status != requests.status_codes.codes.ok:
+                status = 'Bad response.'
+                logger.warning('Unable to process url %s. %s', url, status)
+                return status
+            if self._parse_pool is None:
+                doc = await response.text()
+            else:
+                body = await response.read()
+                encoding = response.get_encoding()
+        if self._parse_pool is None:
+            # Parsing a large page takes a while, off the loop it does not
+            # stall accepts and the other fetches.
+            most_common_words = await asyncio.get_running_loop().run_in_executor(
+                None, self._get_top_words, doc
+            )
+        else:
+            future = self._parse_pool.submit(body, encoding)
+            most_common_words = await asyncio.wrap_future(future)
+        result_msg = json.dumps(dict(most_common_words))
+        return result_msg
+
+    def _get_top_words(self, doc: str) -> Dict[str, int]:
+        return HTMLParser(doc, self._html_backend).get_top_words(
+            self._n_top, self._error_bound
+        )
+
+    async def _process_client(self, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter):
+        data = await reader.readuntil(b'\0')
+        url = data[:-1].decode('utf-8')
+        result_msg = await self._process_query(url)
+        result_msg += '\0'
+        writer.write(result_msg.encode('utf-8'))
+        await writer.drain()
+        self._task_counter += 1
+        logger.info('Total processed: %d tasks', self._task_counter)
+
+    async def _handle_client(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+        self._last_connection_time = asyncio.get_running_loop().time()
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        address = writer.get_extra_info('peername')
+        try:
+            async with self._semaphore:
+                await self._process_client(reader, writer)
+        except Exception as e:
+            logger.error(
+                'Unexpected error occurred while processing client. '
+                'Client address: %s; Exception: %s',
+                address,
+                str(e)
+            )
+        finally:
+            writer.close()
+            self._handlers.discard(handler)
+
+
 if __name__ == "__main__":
     parser = get_parser()
     args = parser.parse_args()
+    check_args(parser, args)
 
-    server = Server(args.n_threads, args.n_top, timeout=5)
+    if args.use_async:
+        server = AsyncServer(
+            args.max_concurrency, args.n_top, timeout=5,
+            n_processes=args.n_processes,
+            fetch_timeout=args.fetch_timeout,
+            html_backend=args.html_backend,
+            error_bound=args.error_bound,
+        )
+    else:
+        server = Server(
+            args.n_threads, args.n_top, timeout=5,
+            pool_size=args.pool_size,
+            fetch_timeout=args.fetch_timeout,
+            max_retries=args.max_retries,
+            html_backend=args.html_backend,
+            n_processes=args.n_processes,
+            error_bound=args.error_bound,
+            cache_size=args.cache_size,
+            cache_ttl=args.cache_ttl,
+            queue_watermark=args.queue_watermark,
+            client_limit=args.client_limit,
+            max_connections=args.max_connections,
+            min_workers=args.min_workers,
+            idle_timeout=args.idle_timeout,
+            scale_up_wait=args.scale_up_wait,
+            compression=args.compression,
+            compression_threshold=args.compression_threshold,
+        )
     server.run()
@@ -1,5 +1,8 @@
+from threading import Thread
 import pytest
 
+from .utils import HTMLRequestHandler, HTMLServer
+
 
 @pytest.fixture
 def test_urls_filename():
@@ -16,3 +19,24 @@ def file_with_10000_fake_urls(tmp_path):
         for i in range(n_urls):
             f.write(f"{sample_url}_{i}\n")
     yield tmp_file
+
+
+def serve_html(handler):
+    http_server = HTMLServer(('localhost', 0), handler)
+    th_server = Thread(target=http_server.serve_forever)
+    th_server.start()
+    yield f'http://localhost:{http_server.server_port}'
+    http_server.shutdown()
+    http_server.server_close()
+    th_server.join()
+
+
+@pytest.fixture
+def html_server_url():
+    yield from serve_html(HTMLRequestHandler)
+
+
+@pytest.fixture
+def slow_html_server_url():
+    handler = type('SlowHandler', (HTMLRequestHandler,), {'delay': 0.2})
+    yield from serve_html(handler)
@@ -1,9 +1,11 @@
+import json
 import socket
 from threading import Thread
 from time import sleep
 import pytest
 
 from client import Client
+from protocol import MessageStream, encode_hello, decode_hello, BUSY_STATUS
 
 
 def test_init(test_urls_filename):
@@ -25,7 +27,7 @@ def test_read_urls(test_urls_filename):
     client._stop_task_queue_constructor()
 
     urls = []
-    while not client._task_queue.empty():
+    while not urls or urls[-1] != Client.THREAD_KILLER_TASK:
         urls.append(client._task_queue.get())
 
     assert urls == check
@@ -71,6 +73,198 @@ def test_max_loaded_urls(file_with_10000_fake_urls):
     sleep(0.3)
     assert client._task_queue.qsize() <= Client.MAX_TASKS_IN_QUEUE + 1
     while True:
-        if client._task_queue.get() == Client.THREAD_KILLER_TASK:
+        url = client._task_queue.get()
+        if url == Client.THREAD_KILLER_TASK:
             break
+        client._task_queue.task_done(url)
     client._stop_task_queue_constructor()
+
+
+def test_streaming_ingestion(tmp_path, caplog):
+    urls = [f'https://host{i % 5}.org/page_{i % 50}' for i in range(200)]
+    urls_filename = tmp_path / 'urls.txt'
+    urls_filename.write_text('\n'.join(urls) + '\n\n')
+    client = Client(1, urls_filename, progress_interval=0.05)
+    client.READ_BLOCK_SIZE = 100
+    client._start_task_queue_constructor()
+    client._start_progress_reporter()
+
+    received = []
+    while not received or received[-1] != Client.THREAD_KILLER_TASK:
+        received.append(client._task_queue.get())
+        if received[-1] != Client.THREAD_KILLER_TASK:
+            client._task_queue.task_done(received[-1])
+        sleep(0.002)
+    client._stop_task_queue_constructor()
+    client._stop_progress_reporter()
+
+    assert sorted(received[:-1]) == sorted(set(urls))
+    assert client._n_urls_read == 50
+    assert client._n_duplicates == 150
+    assert client._bytes_read == urls_filename.stat().st_size
+    progress = [msg for msg in caplog.messages if msg.startswith('Progress')]
+    assert progress
+    client._log_progress()
+    assert caplog.messages[-1].startswith(
+        'Progress: read 100.0% of input, 50 urls queued, 150 duplicates skipped'
+    )
+
+    client = Client(1, urls_filename, dedup=False)
+    client._start_task_queue_constructor()
+    n_received = 0
+    url = client._task_queue.get()
+    while url != Client.THREAD_KILLER_TASK:
+        n_received += 1
+        client._task_queue.task_done(url)
+        url = client._task_queue.get()
+    client._stop_task_queue_constructor()
+    assert n_received == 200
+
+
+def test_legacy_server_fallback(tmp_path):
+    def legacy_server(host, port, requests):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.listen()
+            for reply in ('Wrong format.', '{"alpha": 1}'):
+                connection_socket, _ = sock.accept()
+                with connection_socket:
+                    requests.append(MessageStream(connection_socket).receive())
+                    connection_socket.sendall(f'{reply}\0'.encode('utf-8'))
+
+    host, port = 'localhost', 7005
+    url = 'https://test.com/test1'
+    urls_filename = tmp_path / 'urls.txt'
+    urls_filename.write_text(f'{url}\n')
+    requests = []
+    th_server = Thread(target=legacy_server, args=(host, port, requests))
+    th_server.start()
+
+    sleep(0.3)
+    client = Client(1, urls_filename, host=host, port=port)
+    client.run()
+    th_server.join()
+
+    assert decode_hello(requests[0]) is not None
+    assert requests[1] == url
+    assert not client._persistent
+
+
+def test_busy_server(tmp_path):
+    def busy_server(host, port, requests, n_busy):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.listen()
+            for _ in range(n_busy):
+                connection_socket, _ = sock.accept()
+                with connection_socket:
+                    stream = MessageStream(connection_socket)
+                    requests.append(stream.receive())
+                    stream.send(BUSY_STATUS)
+            if n_busy > 2:
+                return
+            connection_socket, _ = sock.accept()
+            with connection_socket:
+                stream = MessageStream(connection_socket)
+                stream.receive()
+                stream.send(encode_hello())
+                for _ in range(2):
+                    request = json.loads(stream.receive())
+                    requests.append(request['url'])
+                    stream.send(json.dumps({'id': request['id'], 'result': {'alpha': 1}}))
+
+    host, port = 'localhost', 7006
+    urls = ['https://test.com/test1', 'https://test.com/test2']
+    urls_filename = tmp_path / 'urls.txt'
+    urls_filename.write_text('\n'.join(urls) + '\n')
+
+    # Busy connections are opened again after a backoff.
+    requests = []
+    th_server = Thread(target=busy_server, args=(host, port, requests, 2))
+    th_server.start()
+    sleep(0.3)
+    client = Client(1, urls_filename, host=host, port=port)
+    client.BUSY_BACKOFF_FACTOR = 0.01
+    client.run()
+    th_server.join()
+
+    assert all(decode_hello(request) is not None for request in requests[:2])
+    assert requests[2:] == urls
+    assert client._persistent
+    assert client._stats.get_counter('busy') == 2
+    assert client._stats.get_counter('errors') == 0
+    assert client._stats.get_histogram('request').count == 2
+
+    # Urls the server stays busy for are given up and counted as errors.
+    requests = []
+    th_server = Thread(target=busy_server, args=(host, port, requests, 4))
+    th_server.start()
+    sleep(0.3)
+    client = Client(1, urls_filename, host=host, port=port)
+    client.BUSY_BACKOFF_FACTOR = 0.01
+    client.MAX_BUSY_RETRIES = 1
+    client.run()
+    th_server.join()
+
+    assert len(requests) == 4
+    assert client._stats.get_counter('busy') == 4
+    assert client._stats.get_counter('errors') == 2
+    assert client._task_queue.qsize() == 0
+
+
+def test_failed_send_releases_urls(tmp_path):
+    class BrokenStream:
+        n_bytes_sent = 0
+        n_bytes_received = 0
+
+        def send(self, data):
+            raise BrokenPipeError('Broken pipe')
+
+    urls = [f'https://test.com/test{i}' for i in range(3)]
+    urls_filename = tmp_path / 'urls.txt'
+    urls_filename.write_text('\n'.join(urls) + '\n')
+    client = Client(1, urls_filename, max_per_host=1, batch_size=2)
+    client._start_task_queue_constructor()
+    client._stop_task_queue_constructor()
+    client._open_session = lambda url: (socket.socket(), BrokenStream())
+
+    client._process_session(client._task_queue.get())
+
+    assert client._task_queue.get(block=False) == urls[1]
+
+
+def test_busy_reply_retried(tmp_path):
+    def busy_once_server(host, port, requests):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.listen()
+            connection_socket, _ = sock.accept()
+            with connection_socket:
+                stream = MessageStream(connection_socket)
+                stream.receive()
+                stream.send(encode_hello())
+                for reply in ({'error': BUSY_STATUS}, {'result': {'alpha': 1}}):
+                    request = json.loads(stream.receive())
+                    requests.append(request)
+                    stream.send(json.dumps(dict(reply, id=request['id'])))
+
+    host, port = 'localhost', 7008
+    url = 'https://test.com/test1'
+    urls_filename = tmp_path / 'urls.txt'
+    urls_filename.write_text(f'{url}\n')
+    requests = []
+    th_server = Thread(target=busy_once_server, args=(host, port, requests))
+    th_server.start()
+
+    sleep(0.3)
+    client = Client(1, urls_filename, host=host, port=port)
+    client.run()
+    th_server.join()
+
+    assert [request['url'] for request in requests] == [url, url]
+    assert client._stats.get_counter('busy') == 1
+    assert client._stats.get_counter('errors') == 0
+    assert client._stats.get_histogram('request').count == 1
@@ -0,0 +1,170 @@
+from threading import Thread, Lock
+from time import sleep
+import queue
+import pytest
+
+from client import Client
+from host_scheduler import HostScheduler, get_host
+from server import Server
+from .conftest import serve_html
+from .utils import HTMLRequestHandler, FakeTimer
+
+STOP = '_STOP'
+
+
+def test_get_host():
+    assert get_host('https://en.wikipedia.org/wiki/Python') == 'en.wikipedia.org'
+    assert get_host('HTTP://Example.COM:8080/a') == 'example.com:8080'
+    assert get_host('example.com/a') == 'example.com'
+    assert get_host('http://example.com:bad/a') == 'example.com'
+    assert get_host('/page.html') == ''
+
+
+def test_round_robin():
+    scheduler = HostScheduler(STOP)
+    for url in ('http://a/1', 'http://a/2', 'http://a/3', 'http://b/1', 'http://c/1'):
+        scheduler.put(url)
+    scheduler.put(STOP)
+    urls = [scheduler.get() for _ in range(5)]
+    assert urls == ['http://a/1', 'http://b/1', 'http://c/1', 'http://a/2', 'http://a/3']
+    assert scheduler.get() == STOP
+    assert scheduler.get(block=False) == STOP
+
+
+def test_max_per_host():
+    scheduler = HostScheduler(STOP, max_per_host=2)
+    for url in ('http://a/1', 'http://a/2', 'http://a/3', 'http://b/1'):
+        scheduler.put(url)
+    assert [scheduler.get() for _ in range(3)] == ['http://a/1', 'http://b/1', 'http://a/2']
+    with pytest.raises(queue.Empty):
+        scheduler.get(block=False)
+
+    th_release = Thread(target=lambda: (sleep(0.1), scheduler.task_done('http://a/1')))
+    th_release.start()
+    assert scheduler.get() == 'http://a/3'
+    th_release.join()
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP, max_per_host=0)
+
+
+def test_rate():
+    timer = FakeTimer()
+    scheduler = HostScheduler(STOP, rate=10, timer=timer)
+    for url in ('http://a/1', 'http://a/2', 'http://b/1'):
+        scheduler.put(url)
+    assert scheduler.get() == 'http://a/1'
+    assert scheduler.get() == 'http://b/1'
+    with pytest.raises(queue.Empty):
+        scheduler.get(block=False)
+    timer.now = 0.1
+    assert scheduler.get(block=False) == 'http://a/2'
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP, rate=0)
+
+
+def test_maxsize():
+    scheduler = HostScheduler(STOP, maxsize=2)
+    reader = Thread(target=lambda: [scheduler.put(f'http://a/{i}') for i in range(3)])
+    reader.start()
+    sleep(0.1)
+    assert reader.is_alive()
+    assert scheduler.qsize() == 2
+    assert scheduler.get() == 'http://a/0'
+    reader.join(1)
+    assert not reader.is_alive()
+    assert scheduler.qsize() == 2
+
+
+class CountingHandler(HTMLRequestHandler):
+    delay = 0.05
+    lock = Lock()
+    active = 0
+    max_active = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            super().do_GET()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+def test_client_limits_urls_per_host(tmp_path):
+    port = 7007
+    handlers = [type(f'Handler{i}', (CountingHandler,), {}) for i in range(2)]
+    servers = [serve_html(handler) for handler in handlers]
+    slow_url, fast_url = [next(server) for server in servers]
+    urls_filename = tmp_path / 'urls.txt'
+    with open(urls_filename, 'w') as f:
+        for i in range(20):
+            f.write(f'{slow_url}/page_{i}.html\n')
+        for i in range(5):
+            f.write(f'{fast_url}/page_{i}.html\n')
+
+    server = Server(10, 5, port=port, timeout=1, cache_size=0)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+    client = Client(3, urls_filename, port=port, pipeline_depth=4, max_per_host=2)
+    client.run()
+    th_server.join()
+    for http_server in servers:
+        next(http_server, None)
+
+    assert client._stats.get_histogram('request').count == 25
+    assert client._stats.get_counter('errors') == 0
+    assert handlers[0].max_active == 2
+    assert handlers[1].max_active <= 2
+
+
+def test_put_and_get_many():
+    scheduler = HostScheduler(STOP, maxsize=3, max_per_host=2)
+    urls = [f'http://a/{i}' for i in range(4)] + ['http://b/0']
+    reader = Thread(target=scheduler.put_many, args=(urls,))
+    reader.start()
+    sleep(0.1)
+    assert reader.is_alive()
+    assert scheduler.qsize() == 3
+    assert scheduler.get_many(5) == ['http://a/0', 'http://a/1']
+    reader.join(1)
+    assert not reader.is_alive()
+    assert scheduler.get_many(5) == ['http://b/0']
+    scheduler.task_done('http://a/0')
+    scheduler.put(STOP)
+    assert scheduler.get_many(5) == ['http://a/2']
+    assert scheduler.get_many(0) == []
+
+
+def test_max_pending_per_host():
+    scheduler = HostScheduler(STOP, maxsize=4, max_per_host=1, max_pending_per_host=2)
+    slow_urls = [f'http://a/{i}' for i in range(10)]
+    reader = Thread(target=scheduler.put_many, args=(slow_urls + ['http://b/0', 'http://b/1'],))
+    reader.start()
+    reader.join(1)
+    assert not reader.is_alive()
+    assert scheduler.qsize() == 4
+    assert [scheduler.get() for _ in range(2)] == ['http://a/0', 'http://b/0']
+    scheduler.task_done('http://b/0')
+    assert scheduler.get() == 'http://b/1'
+    scheduler.task_done('http://b/1')
+    scheduler.task_done('http://a/0')
+    scheduler.put(STOP)
+
+    urls = []
+    url = scheduler.get()
+    while url != STOP:
+        urls.append(url)
+        scheduler.task_done(url)
+        url = scheduler.get()
+    assert urls == slow_urls[1:]
+    assert scheduler.qsize() == 0
+    assert not scheduler._spills
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP, max_pending_per_host=0)
@@ -0,0 +1,83 @@
+from collections import Counter
+from string import punctuation
+import pytest
+from bs4 import BeautifulSoup
+
+from html_text import iter_text, iter_words, TEXT_BACKENDS
+from server import HTMLParser
+from .utils import TEST_HTML_DOC, TEST_HTML_TOP_WORDS
+
+
+def bs4_text(doc):
+    text = BeautifulSoup(doc, features="html.parser").get_text()
+    return text.translate(text.maketrans('', '', punctuation))
+
+
+EDGE_CASE_DOCS = [
+    '',
+    '   ',
+    'plain text, no tags',
+    TEST_HTML_DOC,
+    '<p>foo<b>bar</b> baz</p>',
+    '<p>alpha<!-- comment -->bravo</p>',
+    '<script>var a = "</b> word";</script>after<style>p {a: b}</style>',
+    '<script>unclosed script text',
+    '<ruby>漢<rt>kan</rt><rp>(</rp></ruby> <template><p>tpl</p></template>',
+    '<rt><b>hidden</rt>shown</b>',
+    '<b><rt>hidden</b>shown',
+    '&amp;&amp &lt;&unknown;&nbsp;x&#150;&#x41;&#65;&#0;&#129;&#1114112;',
+    '<![CDATA[cdata]]>a<![CDATA[]]>b<!DOCTYPE html><?php echo 1 ?>c',
+    '<pre>  </pre>x<textarea> \n </textarea>y<p>  </p>z<p>\n</p>',
+    '<br>a</br>b<br/>c<img src=x>d<p/>e',
+    '<br><br/><rt>x</br>y',
+    '< notatag & <!-- unterminated',
+    '<div class="a b" title="&amp;">O\'Neil e.g. foo-bar x\xa0y Ёж z</div>',
+]
+
+
+@pytest.mark.parametrize("doc", EDGE_CASE_DOCS)
+def test_iter_text_matches_bs4(doc):
+    text = ''.join(iter_text(doc)).translate(str.maketrans('', '', punctuation))
+    assert text == bs4_text(doc)
+    assert list(iter_words(iter_text(doc))) == bs4_text(doc).split()
+    assert HTMLParser(doc).get_text() == bs4_text(doc)
+
+
+@pytest.mark.parametrize(
+    "strings,words",
+    [
+        ([], []),
+        (['alpha'], ['alpha']),
+        (['al', 'pha', ' bravo'], ['alpha', 'bravo']),
+        (['alpha ', 'bravo'], ['alpha', 'bravo']),
+        (['alpha', ' ', 'bravo'], ['alpha', 'bravo']),
+        (['alpha', ',', 'bravo'], ['alphabravo']),
+        (['alpha', ' ', 'bravo '], ['alpha', 'bravo']),
+        (['al', 'ph', 'a'], ['alpha']),
+        (['  ', 'alpha, bravo;', 'charlie  delta', '!'], ['alpha', 'bravocharlie', 'delta']),
+    ]
+)
+def test_iter_words(strings, words):
+    assert list(iter_words(strings)) == words
+    assert list(iter_words(strings)) == ''.join(strings).translate(
+        str.maketrans('', '', punctuation)
+    ).split()
+
+
+@pytest.mark.parametrize("backend", list(TEXT_BACKENDS))
+def test_backends(backend):
+    parser = HTMLParser(TEST_HTML_DOC, backend)
+    assert parser.get_top_words(5) == TEST_HTML_TOP_WORDS
+    doc = ''.join(EDGE_CASE_DOCS[4:6] + EDGE_CASE_DOCS[7:9])
+    assert HTMLParser(doc, backend).get_text().split() == bs4_text(doc).split()
+
+
+def test_top_words_ties():
+    doc = '<p>delta charlie bravo alpha</p><p>charlie bravo</p>'
+    expected = dict(Counter(bs4_text(doc).split()).most_common(3))
+    assert list(HTMLParser(doc).get_top_words(3).items()) == list(expected.items())
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        HTMLParser(TEST_HTML_DOC, 'html5lib')
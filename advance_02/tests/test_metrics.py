@@ -0,0 +1,97 @@
+from threading import Thread
+import random
+import pytest
+
+from metrics import LatencyHistogram, Stats
+
+
+def test_bucket_bounds():
+    previous_index = -1
+    for value in list(range(1000)) + [10 ** power for power in range(3, 10)]:
+        index = LatencyHistogram.get_index(value)
+        assert index >= previous_index
+        previous_index = index
+        upper_bound = LatencyHistogram.get_upper_bound(index)
+        assert value <= upper_bound <= value * (1 + 1 / 64) + 1
+        assert LatencyHistogram.get_index(upper_bound) == index
+        assert LatencyHistogram.get_index(upper_bound + 1) == index + 1
+
+
+def test_percentiles():
+    values = [i / 1000 for i in range(1, 1001)]
+    random.Random(0).shuffle(values)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    summary = histogram.summary()
+    assert summary['count'] == 1000
+    assert summary['mean'] == pytest.approx(0.5005)
+    assert summary['max'] == 1.0
+    for percentile in (50, 95, 99):
+        expected = percentile / 100
+        assert expected <= summary[f'p{percentile}'] <= expected * (1 + 1 / 64)
+    assert LatencyHistogram().summary()['p99'] == 0.0
+
+
+def test_merge():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for i in range(100):
+        first.record(0.001)
+        second.record(0.1)
+    first.merge(second)
+    assert first.count == 200
+    assert first.get_percentile(50) <= 0.0011
+    assert first.get_percentile(51) >= 0.099
+    assert first.max == 0.1
+
+
+def test_stats_per_thread():
+    stats = Stats()
+
+    def work(n):
+        for i in range(n):
+            stats.count('tasks')
+            stats.record('fetch', i / 1000)
+            stats.observe_max('depth', i)
+        with stats.measure('total'):
+            pass
+
+    workers = [Thread(target=work, args=(100 * (i + 1),)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(stats._threads) == 4
+    assert stats.get_counter('tasks') == 1000
+    assert stats.get_counter('missing') == 0
+    snapshot = stats.snapshot()
+    assert snapshot['counters'] == {'tasks': 1000}
+    assert snapshot['maxima'] == {'depth': 399}
+    assert sorted(snapshot['latency']) == ['fetch', 'total']
+    assert snapshot['latency']['fetch']['count'] == 1000
+    assert snapshot['latency']['total']['count'] == 4
+
+
+def test_release_thread():
+    stats = Stats()
+
+    def work():
+        stats.count('tasks', 2)
+        stats.record('fetch', 0.5)
+        stats.observe_max('depth', 3)
+        stats.release_thread()
+        stats.release_thread()
+
+    workers = [Thread(target=work) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert stats._threads == []
+    snapshot = stats.snapshot()
+    assert snapshot['counters'] == {'tasks': 6}
+    assert snapshot['maxima'] == {'depth': 3}
+    assert snapshot['latency']['fetch']['count'] == 3
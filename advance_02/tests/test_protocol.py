@@ -0,0 +1,217 @@
+import json
+import socket
+import pytest
+
+from protocol import (
+    MessageStream, encode_hello, decode_hello, choose_framing, choose_compression,
+    BUFFER_SIZE, FRAME_HEADER, LENGTH_FRAMING, NUL_FRAMING, CODECS,
+    COMPRESSED_FLAG, COMPRESSIONS, ZLIB_COMPRESSION, ZSTD_COMPRESSION,
+)
+
+
+@pytest.fixture
+def socket_pair():
+    sock_a, sock_b = socket.socketpair()
+    yield sock_a, sock_b
+    sock_a.close()
+    sock_b.close()
+
+
+def test_hello():
+    assert decode_hello(encode_hello()) == {'version': 1, 'framing': NUL_FRAMING}
+    assert decode_hello('https://en.wikipedia.org/wiki/Q-analog') is None
+    assert decode_hello('{"id": 1}') is None
+    assert decode_hello('{"hello": 1}') is None
+    assert decode_hello('{not a json') is None
+
+
+def test_choose_framing():
+    assert choose_framing([LENGTH_FRAMING, NUL_FRAMING]) == LENGTH_FRAMING
+    assert choose_framing(['zstd', NUL_FRAMING, LENGTH_FRAMING]) == NUL_FRAMING
+    assert choose_framing(LENGTH_FRAMING) == LENGTH_FRAMING
+    assert choose_framing(['zstd']) == NUL_FRAMING
+    assert choose_framing(None) == NUL_FRAMING
+
+
+@pytest.mark.parametrize("framing", [NUL_FRAMING, LENGTH_FRAMING])
+@pytest.mark.parametrize(
+    "messages",
+    [
+        ['alpha'],
+        ['alpha', 'bravo', '', 'charlie'],
+        ['A' * BUFFER_SIZE, 'B' * (3 * BUFFER_SIZE + 1), 'C'],
+        ['Привет, мир!' * BUFFER_SIZE],
+        ['alpha', 'Ёж' * 100] * 100,
+    ]
+)
+def test_message_stream(socket_pair, framing, messages):
+    sock_a, sock_b = socket_pair
+    sender = MessageStream(sock_a)
+    receiver = MessageStream(sock_b, buffer_size=16)
+    sender.set_framing(framing)
+    receiver.set_framing(framing)
+    for msg in messages:
+        sender.send(msg)
+    sock_a.shutdown(socket.SHUT_WR)
+
+    received = []
+    while (msg := receiver.receive()) is not None:
+        received.append(msg)
+    assert received == messages
+
+
+def test_message_stream_split_multibyte(socket_pair):
+    sock_a, sock_b = socket_pair
+    data = 'Ёж\0'.encode('utf-8')
+    receiver = MessageStream(sock_b)
+    sock_a.sendall(data[:1])
+    sock_a.sendall(data[1:])
+    assert receiver.receive() == 'Ёж'
+
+
+def test_length_framing_with_nul(socket_pair):
+    sock_a, sock_b = socket_pair
+    payload = 'alpha\0bravo'.encode('utf-8')
+    receiver = MessageStream(sock_b)
+    receiver.set_framing(LENGTH_FRAMING)
+    frame = FRAME_HEADER.pack(len(payload)) + payload
+    sock_a.sendall(frame[:2])
+    sock_a.sendall(frame[2:7])
+    sock_a.sendall(frame[7:])
+    assert receiver.receive() == 'alpha\0bravo'
+
+
+def test_max_message_size(socket_pair):
+    sock_a, sock_b = socket_pair
+    sender = MessageStream(sock_a)
+    receiver = MessageStream(sock_b, buffer_size=16, max_message_size=100)
+    sender.send('a' * 100)
+    assert receiver.receive() == 'a' * 100
+    sock_a.sendall(b'a' * 200)
+    with pytest.raises(ConnectionError):
+        receiver.receive()
+
+    sock_a, sock_b = socket.socketpair()
+    with sock_a, sock_b:
+        sender = MessageStream(sock_a)
+        receiver = MessageStream(sock_b, max_message_size=100)
+        for stream in (sender, receiver):
+            stream.set_framing(LENGTH_FRAMING)
+        sender.send('a' * 100)
+        assert receiver.receive() == 'a' * 100
+        sock_a.sendall(FRAME_HEADER.pack(1 << 30))
+        with pytest.raises(ConnectionError):
+            receiver.receive()
+
+
+def test_framing_switch(socket_pair):
+    sock_a, sock_b = socket_pair
+    sender = MessageStream(sock_a)
+    receiver = MessageStream(sock_b)
+    sender.send(encode_hello([LENGTH_FRAMING]))
+    sender.set_framing(LENGTH_FRAMING)
+    sender.send(json.dumps({'id': 0, 'url': 'alpha'}))
+
+    hello = decode_hello(receiver.receive())
+    receiver.set_framing(choose_framing(hello['framing']))
+    assert json.loads(receiver.receive()) == {'id': 0, 'url': 'alpha'}
+    with pytest.raises(ValueError):
+        receiver.set_framing('zstd')
+
+
+def test_choose_compression():
+    assert COMPRESSIONS[-1] == ZLIB_COMPRESSION
+    assert choose_compression(['brotli', ZLIB_COMPRESSION]) == ZLIB_COMPRESSION
+    assert choose_compression(ZLIB_COMPRESSION) == ZLIB_COMPRESSION
+    assert choose_compression(['brotli']) is None
+    assert choose_compression(None) is None
+    assert decode_hello(encode_hello(LENGTH_FRAMING, ZLIB_COMPRESSION)) == {
+        'version': 1, 'framing': LENGTH_FRAMING, 'compression': ZLIB_COMPRESSION
+    }
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        ZLIB_COMPRESSION,
+        pytest.param(ZSTD_COMPRESSION, marks=pytest.mark.skipif(
+            ZSTD_COMPRESSION not in CODECS, reason='zstandard is not installed'
+        )),
+    ]
+)
+def test_compressed_messages(socket_pair, compression):
+    sock_a, sock_b = socket_pair
+    sender = MessageStream(sock_a)
+    receiver = MessageStream(sock_b, buffer_size=16)
+    for stream in (sender, receiver):
+        stream.set_framing(LENGTH_FRAMING)
+        stream.set_compression(compression, threshold=100)
+    messages = [
+        'alpha' * 10,
+        json.dumps({'id': 0, 'result': {f'word{i}': i for i in range(1000)}}),
+        ''.join(chr(ord('a') + i * 7 % 26) + str(i) for i in range(100)),
+        'Ёж' * BUFFER_SIZE,
+    ]
+    n_bytes_sent = 0
+    for msg in messages:
+        sender.send(msg)
+        payload_size = sender.n_bytes_sent - n_bytes_sent - FRAME_HEADER.size
+        n_bytes_sent = sender.n_bytes_sent
+        if msg == messages[0]:
+            assert payload_size == len(msg)
+        elif msg == messages[-1]:
+            assert payload_size < len(msg) // 10
+    sock_a.shutdown(socket.SHUT_WR)
+
+    received = []
+    while (msg := receiver.receive()) is not None:
+        received.append(msg)
+    assert received == messages
+    assert receiver.n_bytes_received == sender.n_bytes_sent
+
+
+def test_compression_errors(socket_pair):
+    sock_a, sock_b = socket_pair
+    stream = MessageStream(sock_a)
+    with pytest.raises(ValueError):
+        stream.set_compression(ZLIB_COMPRESSION)
+    stream.set_framing(LENGTH_FRAMING)
+    with pytest.raises(ValueError):
+        stream.set_compression('brotli')
+    stream.set_compression(ZLIB_COMPRESSION)
+    assert stream.compression == ZLIB_COMPRESSION
+    stream.set_compression(None)
+    assert stream.compression is None
+
+    receiver = MessageStream(sock_b)
+    receiver.set_framing(LENGTH_FRAMING)
+    payload = CODECS[ZLIB_COMPRESSION][0](b'alpha')
+    sock_a.sendall(FRAME_HEADER.pack(len(payload) | COMPRESSED_FLAG) + payload)
+    with pytest.raises(ConnectionError):
+        receiver.receive()
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        ZLIB_COMPRESSION,
+        pytest.param(ZSTD_COMPRESSION, marks=pytest.mark.skipif(
+            ZSTD_COMPRESSION not in CODECS, reason='zstandard is not installed'
+        )),
+    ]
+)
+def test_decompression_limit(compression):
+    compress = CODECS[compression][0]
+    for size in (1000, 1001, 10 ** 6):
+        sock_a, sock_b = socket.socketpair()
+        with sock_a, sock_b:
+            receiver = MessageStream(sock_b, max_message_size=1000)
+            receiver.set_framing(LENGTH_FRAMING)
+            receiver.set_compression(compression)
+            payload = compress(b'a' * size)
+            sock_a.sendall(FRAME_HEADER.pack(len(payload) | COMPRESSED_FLAG) + payload)
+            if size <= 1000:
+                assert receiver.receive() == 'a' * size
+            else:
+                with pytest.raises(ConnectionError, match='exceeds 1000 bytes'):
+                    receiver.receive()
@@ -0,0 +1,152 @@
+from http.server import BaseHTTPRequestHandler
+from threading import Thread, Event
+from time import sleep
+import json
+import pytest
+
+from result_cache import ResultCache
+from server import Server
+from .utils import HTMLServer, FakeTimer, TEST_HTML_DOC, TEST_HTML_TOP_WORDS
+
+
+def test_size_limit():
+    cache = ResultCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a').result == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a').result == 1
+    assert cache.get('c').result == 3
+
+    with pytest.raises(ValueError):
+        ResultCache(max_size=0)
+
+
+def test_ttl_and_validators():
+    timer = FakeTimer()
+    cache = ResultCache(ttl=10, timer=timer)
+    entry = cache.put('a', 1, etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+    assert cache.get_fresh('a') is entry
+    timer.now = 10
+    assert cache.get_fresh('a') is None
+    assert cache.get('a') is entry
+    assert ResultCache.get_validators(entry) == {
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT',
+    }
+    assert ResultCache.get_validators(None) == {}
+    assert ResultCache.get_validators(cache.put('b', 2)) == {}
+
+    refreshed = cache.refresh('a', entry)
+    assert refreshed.expire_at == 20
+    assert cache.get_fresh('a') is refreshed
+
+
+def test_single_flight():
+    cache = ResultCache()
+    calls = []
+    started = Event()
+    release = Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'result'
+
+    results = []
+    leader = Thread(target=lambda: results.append(cache.single_flight('a', fetch)))
+    leader.start()
+    started.wait()
+    followers = [
+        Thread(target=lambda: results.append(cache.single_flight('a', fetch)))
+        for _ in range(5)
+    ]
+    for follower in followers:
+        follower.start()
+    sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert results == ['result'] * 6
+    assert len(calls) == 1
+
+    assert cache.single_flight('a', lambda: 'next') == 'next'
+    with pytest.raises(ZeroDivisionError):
+        cache.single_flight('a', lambda: 1 / 0)
+
+
+class RevalidatingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    etag = '"v1"'
+    delay = 0.0
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('If-None-Match'))
+        sleep(self.delay)
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = TEST_HTML_DOC.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def revalidating_server():
+    handler = type('Handler', (RevalidatingHandler,), {'requests': []})
+    http_server = HTMLServer(('localhost', 0), handler)
+    th_server = Thread(target=http_server.serve_forever)
+    th_server.start()
+    yield handler, f'http://localhost:{http_server.server_port}/page.html'
+    http_server.shutdown()
+    http_server.server_close()
+    th_server.join()
+
+
+def test_server_revalidates_expired_results(revalidating_server):
+    handler, url = revalidating_server
+    server = Server(1, 5, cache_ttl=0)
+    for _ in range(3):
+        assert json.loads(server._process_query(url)) == TEST_HTML_TOP_WORDS
+    assert handler.requests == [None, '"v1"', '"v1"']
+
+    handler.etag = '"v2"'
+    assert json.loads(server._process_query(url)) == TEST_HTML_TOP_WORDS
+    assert handler.requests[-1] == '"v1"'
+    assert server._result_cache.get(url).etag == '"v2"'
+
+    server = Server(1, 5)
+    for _ in range(3):
+        assert json.loads(server._process_query(url)) == TEST_HTML_TOP_WORDS
+    assert len(handler.requests) == 5
+
+
+def test_server_coalesces_concurrent_fetches(revalidating_server):
+    handler, url = revalidating_server
+    handler.delay = 0.3
+    server = Server(10, 5)
+    results = []
+    workers = [
+        Thread(target=lambda: results.append(server._process_query(url)))
+        for _ in range(10)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [json.loads(result) for result in results] == [TEST_HTML_TOP_WORDS] * 10
+    assert handler.requests == [None]
@@ -1,10 +1,19 @@
 from multiprocessing import Process
+from threading import Thread
+from time import sleep
 import json
+import socket
 import requests_mock
 import pytest
 
 from client import Client
-from server import Server
+from server import Server, AsyncServer, ParsePool, ClientConnection, get_parser, check_args
+from protocol import (
+    MessageStream, encode_hello, decode_hello, LENGTH_FRAMING, NUL_FRAMING,
+    BUSY_STATUS, ZLIB_COMPRESSION,
+)
+from .conftest import serve_html
+from .utils import HTMLRequestHandler, TEST_HTML_DOC, TEST_HTML_TOP_WORDS
 
 
 def test_init():
@@ -16,7 +25,7 @@ def test_init():
 
 
 def test_process_query():
-    server = Server(1, 5, timeout=2)
+    server = Server(1, 5, timeout=2, cache_size=0)
     url = 'https://test.com/test1'
     doc = '''
     <!DOCTYPE html>
@@ -69,3 +78,462 @@ def test_communication(test_urls_filename):
         th_server.join()
     except Exception:
         pytest.fail("Unexpected Error")
+
+
+def send_url(url, port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        sock.sendall(f'{url}\0'.encode('utf-8'))
+        return Client(1, None)._receive_data(sock)
+
+
+@pytest.mark.parametrize("n_processes,port", [(0, 7100), (2, 7109)])
+def test_async_server(html_server_url, n_processes, port):
+    server = AsyncServer(100, 5, port=port, timeout=1, n_processes=n_processes)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    results = []
+    senders = [
+        Thread(target=lambda url: results.append(send_url(url, port)), args=(url,))
+        for url in [f'{html_server_url}/page_{i}.html' for i in range(10)]
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    bad_response = send_url(f'{html_server_url}/missing.txt', port)
+    wrong_format = send_url('htssds;/asds', port)
+    th_server.join()
+
+    assert [json.loads(result) for result in results] == [TEST_HTML_TOP_WORDS] * 10
+    assert bad_response == 'Bad response.'
+    assert wrong_format == 'Wrong format.'
+
+
+def test_async_server_parses_off_loop(html_server_url):
+    port = 7118
+    server = AsyncServer(10, 5, port=port, timeout=1)
+    get_top_words = server._get_top_words
+    n_parsed = []
+
+    def slow_get_top_words(doc):
+        n_parsed.append(doc)
+        if len(n_parsed) == 1:
+            sleep(1)
+        return get_top_words(doc)
+
+    server._get_top_words = slow_get_top_words
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    results = []
+    th_slow = Thread(
+        target=lambda: results.append(send_url(f'{html_server_url}/page_0.html', port))
+    )
+    th_slow.start()
+    sleep(0.2)
+    results.append(send_url(f'{html_server_url}/page_1.html', port))
+    assert th_slow.is_alive()
+    th_slow.join()
+    th_server.join()
+
+    assert [json.loads(result) for result in results] == [TEST_HTML_TOP_WORDS] * 2
+
+
+def test_check_args():
+    parser = get_parser()
+    check_args(parser, parser.parse_args([
+        '--async', '-k', '5', '--html-backend', 'html.parser', '--error-bound', '0.01',
+    ]))
+    check_args(parser, parser.parse_args(['-w', '4', '--cache-size', '0']))
+    for option in (['--cache-size', '0'], ['--queue-watermark', '10'], ['--no-compression']):
+        with pytest.raises(SystemExit):
+            check_args(parser, parser.parse_args(['--async', *option]))
+
+
+def test_async_server_fetch_timeout(slow_html_server_url):
+    port = 7117
+    server = AsyncServer(10, 5, port=port, timeout=1, fetch_timeout=0.05)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    with pytest.raises(ConnectionError):
+        send_url(f'{slow_html_server_url}/page.html', port)
+    th_server.join()
+
+    assert server._task_counter == 0
+
+
+def test_http_session_per_worker(html_server_url):
+    server = Server(1, 5, pool_size=2, max_retries=1)
+    session = server._get_http_session()
+    assert server._get_http_session() is session
+    adapter = session.get_adapter(html_server_url)
+    assert adapter.max_retries.total == 1
+
+    for i in range(3):
+        result = server._process_query(f'{html_server_url}/page_{i}.html')
+        assert json.loads(result) == TEST_HTML_TOP_WORDS
+    assert server._get_http_session() is session
+
+    sessions = []
+    th_worker = Thread(target=lambda: sessions.append(server._get_http_session()))
+    th_worker.start()
+    th_worker.join()
+    assert sessions[0] is not session
+
+    server._close_http_session()
+    assert server._get_http_session() is not session
+
+
+def test_parse_pool():
+    doc = TEST_HTML_DOC.replace('India', 'Индия Индия Индия Индия')
+    pool = ParsePool(2, 3)
+    try:
+        futures = [
+            (body, pool.submit(body, encoding))
+            for body, encoding in [
+                (doc.encode('utf-8'), 'utf-8'),
+                (doc.encode('cp1251'), 'cp1251'),
+                (doc.encode('utf-8'), None),
+                (b'', 'utf-8'),
+                (doc.encode('utf-8'), 'unknown-encoding'),
+            ]
+        ]
+        assert futures[0][1].result() == {'Индия': 4, 'alpha': 3, 'bravo': 2}
+        for body, future in futures:
+            assert future.result() == futures[0][1].result() or not body
+        assert futures[3][1].result() == {}
+    finally:
+        pool.shutdown()
+
+
+def test_process_query_in_parse_pool(html_server_url):
+    server = Server(1, 5, n_processes=2)
+    server._start_parse_pool()
+    try:
+        results = [
+            server._process_query(f'{html_server_url}/page_{i}.html')
+            for i in range(5)
+        ]
+        missing = server._process_query(f'{html_server_url}/missing.txt')
+    finally:
+        server._stop_parse_pool()
+    assert [json.loads(result) for result in results] == [TEST_HTML_TOP_WORDS] * 5
+    assert missing == 'Bad response.'
+
+
+@pytest.mark.parametrize(
+    "hello,framing,port",
+    [
+        ('{"hello": {"version": 1}}', NUL_FRAMING, 7101),
+        (encode_hello([LENGTH_FRAMING, NUL_FRAMING]), LENGTH_FRAMING, 7107),
+        (encode_hello(['zstd']), NUL_FRAMING, 7108),
+    ]
+)
+def test_persistent_session(html_server_url, hello, framing, port):
+    server = Server(4, 5, port=port, timeout=1)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    urls = [f'{html_server_url}/page_{i}.html' for i in range(10)]
+    urls += [f'{html_server_url}/missing.txt', 'htssds;/asds']
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        stream = MessageStream(sock)
+        stream.send(hello)
+        assert decode_hello(stream.receive())['framing'] == framing
+        stream.set_framing(framing)
+        for i, url in enumerate(urls):
+            stream.send(json.dumps({'id': i, 'url': url}))
+        responses = [json.loads(stream.receive()) for _ in urls]
+    th_server.join()
+
+    responses = {response.pop('id'): response for response in responses}
+    assert sorted(responses) == list(range(len(urls)))
+    for i in range(10):
+        assert responses[i] == {'result': TEST_HTML_TOP_WORDS}
+    assert responses[10] == {'error': 'Bad response.'}
+    assert responses[11] == {'error': 'Wrong format.'}
+    assert server._task_counter == len(urls)
+
+
+def test_idle_persistent_connections():
+    port = 7116
+    server = Server(2, 5, port=port, timeout=0.5, max_connections=1)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        stream = MessageStream(sock)
+        stream.send(encode_hello())
+        assert decode_hello(stream.receive()) is not None
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as busy_sock:
+            busy_sock.connect(('localhost', port))
+            busy_stream = MessageStream(busy_sock)
+            busy_stream.send(encode_hello())
+            assert busy_stream.receive() == BUSY_STATUS
+        th_server.join(3)
+        assert not th_server.is_alive()
+        assert stream.receive() is None
+    assert server.get_stats()['counters']['rejected'] == 1
+
+
+def test_batch_request(html_server_url):
+    port = 7105
+    server = Server(4, 5, port=port, timeout=1)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    urls = [f'{html_server_url}/page_{i}.html' for i in range(20)]
+    urls.append('htssds;/asds')
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        stream = MessageStream(sock)
+        stream.send(encode_hello())
+        assert decode_hello(stream.receive()) is not None
+        stream.send(json.dumps({'id': 0, 'urls': urls}))
+        stream.send(json.dumps({'id': 1, 'url': urls[0]}))
+        stream.send(json.dumps({'id': 2, 'urls': []}))
+        responses = [json.loads(stream.receive()) for _ in range(len(urls) + 1)]
+    th_server.join()
+
+    batch_responses = {
+        response.pop('index'): response
+        for response in responses if response['id'] == 0
+    }
+    assert sorted(batch_responses) == list(range(len(urls)))
+    for i in range(20):
+        assert batch_responses[i] == {'id': 0, 'result': TEST_HTML_TOP_WORDS}
+    assert batch_responses[20] == {'id': 0, 'error': 'Wrong format.'}
+    assert {'id': 1, 'result': TEST_HTML_TOP_WORDS} in responses
+    assert server._task_counter == len(urls) + 1
+
+
+@pytest.mark.parametrize(
+    "persistent,pipeline_depth,batch_size,framing,port",
+    [
+        (True, 1, 1, LENGTH_FRAMING, 7102),
+        (True, 4, 1, NUL_FRAMING, 7103),
+        (False, 1, 1, LENGTH_FRAMING, 7104),
+        (True, 2, 7, LENGTH_FRAMING, 7106),
+    ]
+)
+def test_client_server(html_server_url, tmp_path, persistent, pipeline_depth,
+                       batch_size, framing, port):
+    n_urls = 30
+    urls_filename = tmp_path / 'urls.txt'
+    with open(urls_filename, 'w') as f:
+        for i in range(n_urls):
+            f.write(f'{html_server_url}/page_{i}.html\n')
+
+    server = Server(4, 5, port=port, timeout=1)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+    client = Client(
+        3, urls_filename, port=port,
+        pipeline_depth=pipeline_depth, persistent=persistent,
+        batch_size=batch_size, framing=framing,
+    )
+    client.run()
+    th_server.join()
+
+    assert server._task_counter == n_urls
+    assert client._stats.get_histogram('request').count == n_urls
+
+
+def test_compressed_session(html_server_url):
+    port = 7115
+    server = Server(4, 5, port=port, timeout=1, compression_threshold=0)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    urls = [f'{html_server_url}/page_{i}.html' for i in range(5)]
+    hellos = [
+        (encode_hello([LENGTH_FRAMING], ['brotli', ZLIB_COMPRESSION]), ZLIB_COMPRESSION),
+        (encode_hello([LENGTH_FRAMING]), None),
+        (encode_hello([NUL_FRAMING], [ZLIB_COMPRESSION]), None),
+    ]
+    for hello, compression in hellos:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.connect(('localhost', port))
+            stream = MessageStream(sock)
+            stream.send(hello)
+            reply = decode_hello(stream.receive())
+            assert reply.get('compression') == compression
+            stream.set_framing(reply['framing'])
+            stream.set_compression(compression, threshold=0)
+            stream.send(json.dumps({'id': 0, 'urls': urls}))
+            responses = [json.loads(stream.receive()) for _ in urls]
+        assert all(response['result'] == TEST_HTML_TOP_WORDS for response in responses)
+    th_server.join()
+
+
+def test_gzip_download(tmp_path):
+    body = (TEST_HTML_DOC * 50).encode('utf-8')
+    handler = type('GzipHandler', (HTMLRequestHandler,), {'body': body, 'use_gzip': True})
+    for html_server_url in serve_html(handler):
+        server = Server(1, 5, cache_size=0)
+        result = json.loads(server._process_query(f'{html_server_url}/page.html'))
+        assert result == {word: 50 * count for word, count in TEST_HTML_TOP_WORDS.items()}
+        assert 0 < server._stats.get_counter('download_bytes') < len(body) // 10
+
+
+def test_client_connection_limit():
+    sock, peer = socket.socketpair()
+    with sock, peer:
+        connection = ClientConnection(sock, None, MessageStream(sock), max_pending=2)
+        assert connection.start_request(5) == 2
+        th_reader = Thread(target=connection.start_request)
+        th_reader.start()
+        sleep(0.1)
+        assert th_reader.is_alive()
+        connection.finish_request()
+        th_reader.join(1)
+        assert not th_reader.is_alive()
+
+        th_reader = Thread(target=connection.start_request, args=(2,))
+        th_reader.start()
+        connection.finish_request()
+        sleep(0.1)
+        assert th_reader.is_alive()
+        connection.finish_request()
+        th_reader.join(1)
+        assert not th_reader.is_alive()
+        connection.finish_request(2)
+        assert connection.start_request(3) == 2
+
+
+def test_overloaded_server_rejects_connections(slow_html_server_url):
+    port = 7111
+    server = Server(1, 5, port=port, timeout=1, queue_watermark=2, cache_size=0)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    results = []
+    senders = [
+        Thread(target=lambda url: results.append(send_url(url, port)), args=(url,))
+        for url in [f'{slow_html_server_url}/page_{i}.html' for i in range(8)]
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    th_server.join()
+
+    n_busy = results.count(BUSY_STATUS)
+    assert 1 <= n_busy <= 5
+    assert [
+        json.loads(result) for result in results if result != BUSY_STATUS
+    ] == [TEST_HTML_TOP_WORDS] * (8 - n_busy)
+    stats = server.get_stats()
+    assert stats['counters']['rejected'] == n_busy
+    assert stats['counters']['admitted'] == 8 - n_busy
+    assert stats['maxima']['queue_depth'] <= 2
+    assert stats['latency']['queue_wait']['max'] > 0
+
+
+def test_overloaded_server_rejects_requests(slow_html_server_url):
+    port = 7112
+    server = Server(
+        1, 5, port=port, timeout=1, queue_watermark=2, client_limit=4, cache_size=0
+    )
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    urls = [f'{slow_html_server_url}/page_{i}.html' for i in range(6)]
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        stream = MessageStream(sock)
+        stream.send(encode_hello())
+        assert decode_hello(stream.receive()) is not None
+        stream.send(json.dumps({'id': 0, 'urls': urls}))
+        responses = [json.loads(stream.receive()) for _ in range(6)]
+    th_server.join()
+
+    busy = [response for response in responses if 'error' in response]
+    assert all(response['error'] == BUSY_STATUS for response in busy)
+    assert sorted(response['index'] for response in busy) == [2, 3, 4, 5]
+    assert server._task_counter == 2
+    stats = server.get_stats()
+    assert stats['counters']['rejected'] == 4
+    assert stats['maxima']['queue_depth'] <= 2
+
+
+def test_stats_request(html_server_url):
+    port = 7113
+    server = Server(2, 5, port=port, timeout=1)
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.connect(('localhost', port))
+        stream = MessageStream(sock)
+        stream.send(encode_hello())
+        assert decode_hello(stream.receive()) is not None
+        urls = [f'{html_server_url}/page_{i % 3}.html' for i in range(6)]
+        stream.send(json.dumps({'id': 0, 'urls': urls}))
+        for _ in urls:
+            stream.receive()
+        stream.send(json.dumps({'id': 1, 'stats': True}))
+        reply = json.loads(stream.receive())
+    client_stats = Client(1, None, port=port).get_server_stats()
+    th_server.join()
+
+    assert reply['id'] == 1
+    stats = reply['stats']
+    assert stats['counters']['tasks'] == 6
+    assert stats['counters']['admitted'] == 7
+    assert stats['latency']['fetch']['count'] == 3
+    assert stats['counters'].get('cache_hits', 0) <= 3
+    assert stats['queue_depth'] == 0
+    for stage in ('queue_wait', 'fetch', 'parse', 'send', 'total'):
+        latency = stats['latency'][stage]
+        assert latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+    assert stats['latency']['total']['count'] == 6
+    assert client_stats['counters']['tasks'] == 6
+
+
+def test_elastic_workers(slow_html_server_url):
+    port = 7114
+    server = Server(
+        20, 5, port=port, timeout=2, cache_size=0,
+        min_workers=2, idle_timeout=0.3, scale_up_wait=0.01,
+    )
+    th_server = Thread(target=server.run)
+    th_server.start()
+    sleep(0.3)
+    assert len(server._workers) == 2
+
+    results = []
+    senders = [
+        Thread(target=lambda url: results.append(send_url(url, port)), args=(url,))
+        for url in [f'{slow_html_server_url}/page_{i}.html' for i in range(20)]
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    stats = server.get_stats()
+    sleep(1)
+    n_idle_workers = len(server._workers)
+    retired = server.get_stats()['counters']['workers_retired']
+    th_server.join()
+
+    assert [json.loads(result) for result in results] == [TEST_HTML_TOP_WORDS] * 20
+    assert 2 < stats['maxima']['workers'] <= 20
+    assert n_idle_workers == 2
+    assert retired == stats['maxima']['workers'] - 2
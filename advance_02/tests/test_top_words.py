@@ -0,0 +1,72 @@
+from collections import Counter
+import random
+import pytest
+
+from server import HTMLParser
+from top_words import SpaceSaving, count_top_words
+from .utils import TEST_HTML_DOC, TEST_HTML_TOP_WORDS
+
+
+def zipf_words(n_words, vocabulary_size=5000, seed=0):
+    rnd = random.Random(seed)
+    vocabulary = [f'word{i}' for i in range(vocabulary_size)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+    return rnd.choices(vocabulary, weights, k=n_words)
+
+
+def test_space_saving_guarantees():
+    words = zipf_words(50_000)
+    true_counts = Counter(words)
+    summary = SpaceSaving(200)
+    summary.update(iter(words))
+
+    assert summary.n_items == len(words)
+    assert summary.max_error == len(words) // 200
+    most_common = summary.most_common()
+    assert len(most_common) == 200
+    for word, count in most_common:
+        assert true_counts[word] <= count <= true_counts[word] + summary.error(word)
+        assert summary.error(word) <= summary.max_error
+    monitored = dict(most_common)
+    for word, count in true_counts.items():
+        if count > summary.max_error:
+            assert word in monitored
+
+
+def test_space_saving_exact_when_vocabulary_fits():
+    words = zipf_words(10_000, vocabulary_size=100)
+    summary = SpaceSaving(100)
+    summary.update(words)
+    assert summary.most_common(10) == Counter(words).most_common(10)
+    assert summary.error('word0') == 0
+
+
+def test_count_top_words():
+    words = zipf_words(20_000)
+    assert count_top_words(iter(words), 5) == dict(Counter(words).most_common(5))
+    approximate = count_top_words(iter(words), 5, error_bound=0.01)
+    assert list(approximate) == ['word0', 'word1', 'word2', 'word3', 'word4']
+    assert count_top_words([], 5, error_bound=0.5) == {}
+    assert len(count_top_words(iter(words), 20, error_bound=0.5)) == 20
+
+
+@pytest.mark.parametrize("error_bound", [0, -1, 1.5])
+def test_wrong_error_bound(error_bound):
+    with pytest.raises(ValueError):
+        count_top_words(['a'], 1, error_bound)
+
+
+def test_wrong_capacity():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+
+def test_html_parser_error_bound():
+    parser = HTMLParser(TEST_HTML_DOC)
+    assert parser.get_top_words(5, error_bound=0.01) == TEST_HTML_TOP_WORDS
+    true_counts = parser.get_top_words(100)
+    n_words = sum(true_counts.values())
+    approximate = parser.get_top_words(5, error_bound=0.2)
+    assert len(approximate) == 5
+    for word, count in approximate.items():
+        assert true_counts[word] <= count <= true_counts[word] + n_words * 0.2
@@ -0,0 +1,30 @@
+import io
+import pytest
+
+from url_stream import FingerprintSet, read_url_blocks
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 7, 64, 1 << 20])
+def test_read_url_blocks(block_size):
+    urls = ['http://a/1', 'http://b/ünïcode', 'http://c/3', 'http://a/1', 'http://d/4']
+    data = '\n'.join(urls[:2]) + '\r\n\n  \n' + '\n'.join(urls[2:])
+    blocks = list(read_url_blocks(io.BytesIO(data.encode('utf-8')), block_size))
+    assert all(blocks)
+    assert [url for block in blocks for url in block] == urls
+    if block_size == 1 << 20:
+        assert len(blocks) == 2
+
+    assert list(read_url_blocks(io.BytesIO(b''), block_size)) == []
+    assert list(read_url_blocks(io.BytesIO(b'\n\n'), block_size)) == []
+
+
+def test_fingerprint_set():
+    fingerprints = FingerprintSet(capacity=4)
+    urls = [f'http://host/{i}' for i in range(1000)]
+    assert all(fingerprints.add(url) for url in urls)
+    assert len(fingerprints) == 1000
+    assert not any(fingerprints.add(url) for url in urls)
+    assert len(fingerprints) == 1000
+    assert all(url in fingerprints for url in urls)
+    assert 'http://host/1000' not in fingerprints
+    assert len(fingerprints._slots) == 2048
@@ -0,0 +1,57 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+import gzip
+
+
+TEST_HTML_DOC = '''
+<!DOCTYPE html>
+<html>
+    <body>
+        <h1>alpha bravo charlie!</h1>
+        <p>alpha alpha, bravo;; delta Hotel foxtrot charlie@
+        Echo delta delta1</p>
+        <p>Hotel India</p>
+    </body>
+</html>
+'''
+TEST_HTML_TOP_WORDS = {
+    'alpha': 3, 'bravo': 2, 'charlie': 2, 'delta': 2, 'Hotel': 2
+}
+
+
+class HTMLRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 0.0
+    body = TEST_HTML_DOC.encode('utf-8')
+    use_gzip = False
+
+    def do_GET(self):
+        sleep(self.delay)
+        if not self.path.endswith('.html'):
+            self.send_error(404)
+            return
+        body = self.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if self.use_gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTMLServer(ThreadingHTTPServer):
+    request_queue_size = 128
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
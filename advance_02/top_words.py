@@ -0,0 +1,77 @@
+import heapq
+import math
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+#  Space-Saving summary (Metwally et al.) of the most frequent items of a stream.
+#  At most `capacity` items are counted. The count of a monitored item exceeds
+#  its true count by at most n_items / capacity, and every item that occurs
+#  more often than that is monitored.
+class SpaceSaving:
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f'Capacity must be positive, got {capacity}.')
+        self.capacity = capacity
+        self.n_items = 0
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        # One (count, item) entry per monitored item. The count of an entry
+        # may lag behind the real one and is refreshed on eviction only.
+        self._heap: List[Tuple[int, str]] = []
+
+    @classmethod
+    def from_error_bound(cls, error_bound: float, min_capacity: int = 1):
+        if not 0 < error_bound <= 1:
+            raise ValueError(f'Error bound must be in (0, 1], got {error_bound}.')
+        return cls(max(min_capacity, math.ceil(1 / error_bound)))
+
+    @property
+    def max_error(self) -> int:
+        return self.n_items // self.capacity
+
+    def update(self, items: Iterable[str]):
+        counts = self._counts
+        for item in items:
+            self.n_items += 1
+            count = counts.get(item)
+            if count is not None:
+                counts[item] = count + 1
+            elif len(counts) < self.capacity:
+                counts[item] = 1
+                self._errors[item] = 0
+                heapq.heappush(self._heap, (1, item))
+            else:
+                self._replace_min(item)
+
+    def _replace_min(self, item: str):
+        heap = self._heap
+        while True:
+            min_count, min_item = heap[0]
+            count = self._counts[min_item]
+            if count == min_count:
+                break
+            heapq.heapreplace(heap, (count, min_item))
+        del self._counts[min_item]
+        del self._errors[min_item]
+        self._counts[item] = min_count + 1
+        self._errors[item] = min_count
+        heapq.heapreplace(heap, (min_count + 1, item))
+
+    def error(self, item: str) -> int:
+        return self._errors.get(item, self.max_error)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        if n is None:
+            return sorted(self._counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(n, self._counts.items(), key=itemgetter(1))
+
+
+def count_top_words(words: Iterable[str], n_top: int,
+                    error_bound: Optional[float] = None) -> Dict[str, int]:
+    if error_bound is None:
+        return dict(Counter(words).most_common(n_top))
+    summary = SpaceSaving.from_error_bound(error_bound, min_capacity=n_top)
+    summary.update(words)
+    return dict(summary.most_common(n_top))
@@ -0,0 +1,86 @@
+from array import array
+from typing import BinaryIO, Iterator, List
+
+
+BLOCK_SIZE = 1 << 20
+
+
+def read_url_blocks(f: BinaryIO, block_size: int = BLOCK_SIZE) -> Iterator[List[str]]:
+    # Reads the file in large blocks and decodes every block at once;
+    # a block is cut after its last newline, the rest goes to the next one.
+    tail = b''
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        cut = block.rfind(b'\n') + 1
+        if not cut:
+            tail += block
+            continue
+        data = tail + block[:cut]
+        tail = block[cut:]
+        urls = [url for url in map(str.strip, data.decode('utf-8').split('\n')) if url]
+        if urls:
+            yield urls
+    url = tail.decode('utf-8').strip()
+    if url:
+        yield [url]
+
+
+class FingerprintSet:
+    # Open addressing set of 64-bit url hashes in one array of 8-byte slots,
+    # kept a quarter to half full by doubling: 16-32 bytes per url instead of
+    # ~100 bytes per url of a set of strings.
+    # Two different urls share a fingerprint with probability ~n^2 / 2^65.
+    INITIAL_CAPACITY = 1 << 16
+    HASH_MASK = (1 << 64) - 1
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        capacity = 1 << max(1, capacity - 1).bit_length()
+        self._slots = array('Q', bytes(8 * capacity))
+        self._mask = capacity - 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _fingerprint(url: str) -> int:
+        return (hash(url) & FingerprintSet.HASH_MASK) or 1
+
+    def add(self, url: str) -> bool:
+        # Returns False if the url is already in the set.
+        if not self._insert(self._slots, self._mask, self._fingerprint(url)):
+            return False
+        self._size += 1
+        if 2 * self._size > len(self._slots):
+            self._grow()
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        fingerprint = self._fingerprint(url)
+        slots, mask = self._slots, self._mask
+        index = fingerprint & mask
+        while slots[index]:
+            if slots[index] == fingerprint:
+                return True
+            index = (index + 1) & mask
+        return False
+
+    @staticmethod
+    def _insert(slots: array, mask: int, fingerprint: int) -> bool:
+        index = fingerprint & mask
+        while slots[index]:
+            if slots[index] == fingerprint:
+                return False
+            index = (index + 1) & mask
+        slots[index] = fingerprint
+        return True
+
+    def _grow(self):
+        slots = array('Q', bytes(16 * len(self._slots)))
+        mask = len(slots) - 1
+        for fingerprint in self._slots:
+            if fingerprint:
+                self._insert(slots, mask, fingerprint)
+        self._slots, self._mask = slots, mask
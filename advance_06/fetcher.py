@@ -1,10 +1,11 @@
-from typing import Optional
+from typing import Optional, Union
 import os
 import argparse
 import asyncio
 import aiohttp
 import aiofiles
 
+from host_scheduler import HostScheduler
 from logger import init_logger
 
 
@@ -14,6 +15,8 @@ logger = init_logger("logging_conf.yaml", "fetcher")
 MAX_TASK_QUEUE_SIZE = 1000
 STOP_TASK = "STOP_TASK"
 RESPONSE_OK = 200
+MAX_PER_HOST = 10
+MAX_PENDING_PER_HOST = MAX_TASK_QUEUE_SIZE // 4
 
 
 async def fetch_url(session: aiohttp.ClientSession, url: str) -> Optional[str]:
@@ -35,7 +38,9 @@ async def save_html(url: str, html: str, output_dir_name: str) -> None:
         await f.write(html)
 
 
-async def coro_fetcher(task_queue: asyncio.Queue, output_dir_name: str) -> None:
+async def coro_fetcher(
+    task_queue: Union[asyncio.Queue, HostScheduler], output_dir_name: str
+) -> None:
     async with aiohttp.ClientSession() as session:
         while True:
             url = await task_queue.get()
@@ -89,10 +94,28 @@ def get_parser():
         required=True,
         help="Path to the directory for storing loaded files.",
     )
+    parser.add_argument(
+        "--max-per-host",
+        action="store",
+        dest="max_per_host",
+        type=int,
+        default=MAX_PER_HOST,
+        help="Maximum number of simultaneous requests to one host, 0 for no limit.",
+    )
+    parser.add_argument(
+        "--host-rate",
+        action="store",
+        dest="host_rate",
+        type=float,
+        default=None,
+        help="Maximum number of requests to one host per second.",
+    )
     return parser
 
 
-async def coro_reader(task_queue: asyncio.Queue, input_filename: str):
+async def coro_reader(
+    task_queue: Union[asyncio.Queue, HostScheduler], input_filename: str
+):
     try:
         async with aiofiles.open(input_filename, "r") as f:
             async for line in f:
@@ -105,7 +128,13 @@ async def coro_reader(task_queue: asyncio.Queue, input_filename: str):
 
 async def main(args):
     logger.info("Start async url fetcher.")
-    task_queue = asyncio.Queue(maxsize=MAX_TASK_QUEUE_SIZE)
+    task_queue = HostScheduler(
+        STOP_TASK,
+        maxsize=MAX_TASK_QUEUE_SIZE,
+        max_per_host=args.max_per_host or None,
+        rate=args.host_rate,
+        max_pending_per_host=MAX_PENDING_PER_HOST,
+    )
 
     workers = [
         asyncio.create_task(coro_fetcher(task_queue, args.output_dir_name))
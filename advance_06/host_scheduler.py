@@ -0,0 +1,185 @@
+from typing import BinaryIO, Deque, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+import asyncio
+import io
+import tempfile
+import time
+
+
+def get_host(url: str) -> str:
+    parts = urlsplit(url if "//" in url else f"//{url}")
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    host = (parts.hostname or "").lower()
+    return f"{host}:{port}" if port else host
+
+
+# Urls of one host that did not fit into the queue, kept in a temporary
+# file in arrival order.
+class _Spill:
+    def __init__(self):
+        self.file: BinaryIO = tempfile.TemporaryFile()
+        self.read_pos = 0
+        self.size = 0
+
+    def append(self, url: str) -> None:
+        self.file.seek(0, io.SEEK_END)
+        self.file.write(url.encode("utf-8") + b"\n")
+        self.size += 1
+
+    def pop(self) -> str:
+        self.file.seek(self.read_pos)
+        url = self.file.readline()
+        self.read_pos = self.file.tell()
+        self.size -= 1
+        return url[:-1].decode("utf-8")
+
+
+# Drop-in replacement of asyncio.Queue for the fetchers: urls are handed out
+# round-robin across hosts, with at most `max_per_host` urls of a host in
+# flight and at least 1 / `rate` seconds between two urls of a host.
+# A url is in flight from get() until the same task calls task_done().
+# A host holds at most `max_pending_per_host` of the `maxsize` queued urls,
+# the rest of its urls wait on disk, so that a slow host does not fill the
+# queue and block the reader in front of the urls of other hosts.
+class HostScheduler:
+    def __init__(
+        self,
+        stop_task: str,
+        maxsize: int = 0,
+        max_per_host: Optional[int] = None,
+        rate: Optional[float] = None,
+        timer=time.monotonic,
+        max_pending_per_host: Optional[int] = None,
+    ):
+        if max_per_host is not None and max_per_host < 1:
+            raise ValueError(
+                f"Max urls per host must be positive, got {max_per_host}."
+            )
+        if max_pending_per_host is not None and max_pending_per_host < 1:
+            raise ValueError(
+                "Max pending urls per host must be positive, "
+                f"got {max_pending_per_host}."
+            )
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}.")
+        self._stop_task = stop_task
+        self._maxsize = maxsize
+        self._max_per_host = max_per_host
+        self._max_pending_per_host = max_pending_per_host
+        self._interval = 1 / rate if rate else 0.0
+        self._timer = timer
+        self._pending: Dict[str, Deque[str]] = OrderedDict()
+        self._in_flight: Dict[str, int] = {}
+        self._next_start: Dict[str, float] = {}
+        self._assigned: Dict[asyncio.Task, str] = {}
+        self._spills: Dict[str, _Spill] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._size = 0
+        self._closed = False
+
+    def qsize(self) -> int:
+        return self._size
+
+    async def put(self, url: str) -> None:
+        if url == self._stop_task:
+            self._closed = True
+            self._wake()
+            return
+        host = get_host(url)
+        while (
+            self._maxsize > 0
+            and self._size >= self._maxsize
+            and not self._is_host_full(host)
+        ):
+            await self._wait()
+        if self._is_host_full(host):
+            self._spill(host, url)
+            return
+        urls = self._pending.get(host)
+        if urls is None:
+            urls = self._pending[host] = deque()
+        urls.append(url)
+        self._size += 1
+        self._wake()
+
+    def _is_host_full(self, host: str) -> bool:
+        if self._max_pending_per_host is None:
+            return False
+        if host in self._spills:
+            return True
+        return len(self._pending.get(host, ())) >= self._max_pending_per_host
+
+    def _spill(self, host: str, url: str) -> None:
+        spill = self._spills.get(host)
+        if spill is None:
+            spill = self._spills[host] = _Spill()
+        spill.append(url)
+
+    async def get(self) -> str:
+        while True:
+            url, wait = self._pop_ready()
+            if url is not None:
+                self._assigned[asyncio.current_task()] = url
+                return url
+            if self._closed and self._size == 0:
+                return self._stop_task
+            await self._wait(wait)
+
+    def task_done(self) -> None:
+        url = self._assigned.pop(asyncio.current_task(), None)
+        if url is None:
+            return
+        host = get_host(url)
+        self._in_flight[host] -= 1
+        if not self._in_flight[host]:
+            del self._in_flight[host]
+        self._wake()
+
+    async def _wait(self, timeout: Optional[float] = None) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _wake(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _pop_ready(self) -> Tuple[Optional[str], Optional[float]]:
+        now = self._timer()
+        wait = None
+        for host, urls in self._pending.items():
+            n_in_flight = self._in_flight.get(host, 0)
+            if self._max_per_host is not None and n_in_flight >= self._max_per_host:
+                continue
+            next_start = self._next_start.get(host, now)
+            if next_start > now:
+                wait = next_start - now if wait is None else min(wait, next_start - now)
+                continue
+            url = urls.popleft()
+            spill = self._spills.get(host)
+            if spill is not None:
+                urls.append(spill.pop())
+                self._size += 1
+                if not spill.size:
+                    spill.file.close()
+                    del self._spills[host]
+            if urls:
+                self._pending.move_to_end(host)
+            else:
+                del self._pending[host]
+            self._in_flight[host] = n_in_flight + 1
+            if self._interval:
+                self._next_start[host] = max(next_start, now) + self._interval
+            self._size -= 1
+            self._wake()
+            return url, None
+        return None, wait
@@ -14,6 +14,7 @@ from fetcher import (
     main,
     STOP_TASK,
     RESPONSE_OK,
+    MAX_PER_HOST,
 )
 from .utils import get_mocked_file_content, get_mocked_filename, check_saved_files
 
@@ -180,6 +181,8 @@ async def test_main(
         n_simultaneous_requests=n_simultaneous_requests,
         input_filename=str(input_file),
         output_dir_name=str(tmp_path),
+        max_per_host=MAX_PER_HOST,
+        host_rate=None,
     )
 
     with patch.object(
@@ -0,0 +1,167 @@
+from contextlib import asynccontextmanager
+from unittest.mock import Mock, patch
+import asyncio
+
+import pytest
+import aiohttp
+
+from fetcher import main, STOP_TASK, RESPONSE_OK
+from host_scheduler import HostScheduler, get_host
+from .utils import get_mocked_file_content, FakeTimer
+
+
+def test_get_host():
+    assert get_host("https://en.wikipedia.org/wiki/Python") == "en.wikipedia.org"
+    assert get_host("HTTP://Example.COM:8080/a") == "example.com:8080"
+    assert get_host("en.wikipedia.org/wiki/Python") == "en.wikipedia.org"
+    assert get_host("1312url") == "1312url"
+
+
+@pytest.mark.asyncio
+async def test_round_robin():
+    scheduler = HostScheduler(STOP_TASK)
+    for url in ("http://a/1", "http://a/2", "http://a/3", "http://b/1", "http://c/1"):
+        await scheduler.put(url)
+    await scheduler.put(STOP_TASK)
+    urls = [await scheduler.get() for _ in range(5)]
+    assert urls == ["http://a/1", "http://b/1", "http://c/1", "http://a/2", "http://a/3"]
+    assert await scheduler.get() == STOP_TASK
+    assert await scheduler.get() == STOP_TASK
+
+
+@pytest.mark.asyncio
+async def test_max_per_host():
+    scheduler = HostScheduler(STOP_TASK, max_per_host=1)
+    for url in ("http://a/1", "http://a/2", "http://b/1"):
+        await scheduler.put(url)
+
+    async def take():
+        url = await scheduler.get()
+        await asyncio.sleep(0.05)
+        scheduler.task_done()
+        return url
+
+    first = asyncio.create_task(take())
+    second = asyncio.create_task(take())
+    third = asyncio.create_task(take())
+    await asyncio.sleep(0.01)
+    assert scheduler.qsize() == 1
+    assert await asyncio.gather(first, second, third) == [
+        "http://a/1", "http://b/1", "http://a/2"
+    ]
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP_TASK, max_per_host=0)
+
+
+@pytest.mark.asyncio
+async def test_rate():
+    timer = FakeTimer()
+    scheduler = HostScheduler(STOP_TASK, rate=10, timer=timer)
+    for url in ("http://a/1", "http://a/2"):
+        await scheduler.put(url)
+    assert await scheduler.get() == "http://a/1"
+    second = asyncio.create_task(scheduler.get())
+    await asyncio.sleep(0.01)
+    assert not second.done()
+    timer.now = 0.1
+    assert await asyncio.wait_for(second, 1) == "http://a/2"
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP_TASK, rate=-1)
+
+
+@pytest.mark.asyncio
+async def test_maxsize():
+    scheduler = HostScheduler(STOP_TASK, maxsize=2)
+    reader = asyncio.gather(*(scheduler.put(f"http://a/{i}") for i in range(3)))
+    await asyncio.sleep(0.01)
+    assert not reader.done()
+    assert scheduler.qsize() == 2
+    assert await scheduler.get() == "http://a/0"
+    await asyncio.wait_for(reader, 1)
+    assert scheduler.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_max_pending_per_host():
+    scheduler = HostScheduler(
+        STOP_TASK, maxsize=4, max_per_host=1, max_pending_per_host=2
+    )
+    slow_urls = [f"http://a/{i}" for i in range(10)]
+    for url in slow_urls + ["http://b/0", "http://b/1"]:
+        await asyncio.wait_for(scheduler.put(url), 1)
+    assert scheduler.qsize() == 4
+
+    async def take():
+        url = await scheduler.get()
+        scheduler.task_done()
+        return url
+
+    assert await scheduler.get() == "http://a/0"
+    assert await asyncio.gather(take(), take()) == ["http://b/0", "http://b/1"]
+    scheduler.task_done()
+    await scheduler.put(STOP_TASK)
+
+    urls = []
+    url = await scheduler.get()
+    while url != STOP_TASK:
+        urls.append(url)
+        scheduler.task_done()
+        url = await scheduler.get()
+    assert urls == slow_urls[1:]
+    assert scheduler.qsize() == 0
+    assert not scheduler._spills
+
+    with pytest.raises(ValueError):
+        HostScheduler(STOP_TASK, max_pending_per_host=0)
+
+
+class MockResponse:
+    status = RESPONSE_OK
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def text(self) -> str:
+        return get_mocked_file_content(self.url)
+
+
+class RequestCounter:
+    def __init__(self):
+        self.active = {}
+        self.max_active = {}
+
+    @asynccontextmanager
+    async def get(self, url, ssl=True):
+        host = get_host(url)
+        self.active[host] = self.active.get(host, 0) + 1
+        self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+        try:
+            await asyncio.sleep(0.01)
+            yield MockResponse(url)
+        finally:
+            self.active[host] -= 1
+
+
+@pytest.mark.parametrize("max_per_host", [1, 3])
+@pytest.mark.asyncio
+async def test_main_limits_requests_per_host(max_per_host, tmp_path):
+    urls = [f"https://slow.org/page_{i}" for i in range(20)]
+    urls += [f"https://fast.org/page_{i}" for i in range(5)]
+    input_file = tmp_path / "urls.txt"
+    input_file.write_text("\n".join(urls))
+    args_mock = Mock(
+        n_simultaneous_requests=10,
+        input_filename=str(input_file),
+        output_dir_name=str(tmp_path),
+        max_per_host=max_per_host,
+        host_rate=None,
+    )
+
+    counter = RequestCounter()
+    with patch.object(aiohttp.ClientSession, "get", counter.get):
+        await main(args_mock)
+
+    assert counter.max_active == {"slow.org": max_per_host, "fast.org": max_per_host}
+    assert len(list(tmp_path.glob("page_*"))) == 20
@@ -21,3 +21,11 @@ def check_saved_files(
 
         data = path.read_text()
         assert data == content
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now